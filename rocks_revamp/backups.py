@@ -0,0 +1,221 @@
+"""Online backups of economy.db and shop.db.
+
+Copying the files while the bot runs can miss whatever is still in the
+-wal file and catch a page half written. These are taken with SQLite's
+backup API instead, from a connection of their own on a background thread,
+a few pages at a time with a short pause in between. The writer keeps going
+the whole time.
+
+Every snapshot is a folder in config.BACKUP_DIR named after the time it was
+taken, with one gzipped copy per file and a manifest.json. With partitioned
+databases (see partitions.py) the partition files and directory.db are in
+it too. Every copy passes PRAGMA integrity_check before it is compressed.
+Only the newest config.BACKUP_KEEP snapshots are kept.
+
+Each file is a consistent copy on its own, the files are copied one after
+another. To restore one, stop the bot and unzip it over the original:
+
+    gunzip -c backups/20261017-120000/economy.db.gz > economy.db
+"""
+import os
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from partitions import partition_paths, DIRECTORY_NAME
+
+# How often a backup is taken, in seconds, and how many are kept.
+BACKUP_INTERVAL = 6 * 3600
+BACKUP_KEEP = 8
+# Pages copied per step and the pause after each one. 256 pages is 1 MB with the default page size.
+STEP_PAGES = 256
+STEP_PAUSE = 0.002
+# A write from another connection makes the copy start over. After this many
+# restarts the rest is copied in one step: that is one read transaction, which
+# never blocks the writer in WAL mode, it only holds back checkpoints for a moment.
+MAX_RESTARTS = 3
+COMPRESS_LEVEL = 6
+_PARTIAL = ".partial"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+class BackupManager:
+    """Takes scheduled and on-demand snapshots of every database file.
+
+    The copying and compressing runs on a thread of its own, one backup at a time.
+    """
+
+    def __init__(self, db, directory: str, interval: float = BACKUP_INTERVAL, keep: int = BACKUP_KEEP,
+                 step_pages: int = STEP_PAGES, step_pause: float = STEP_PAUSE):
+        self.db = db
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.step_pages = step_pages
+        self.step_pause = step_pause
+        self.last = None  # manifest of the last backup
+        self._lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-backup")
+        self._stopping = False
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._backup_loop())
+
+    async def _backup_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.backup()
+            except Exception as e:
+                print(f"Error backing up the databases: {e}")
+
+    def sources(self) -> list:
+        """(path, name in the snapshot) of every database file."""
+        files = [(self.db.economy_db_path, "economy.db"), (self.db.shop_db_path, "shop.db")]
+        partitions = self.db.partitions
+        if partitions is not None:
+            folder = os.path.basename(partitions.directory)
+            files.append((os.path.join(partitions.directory, DIRECTORY_NAME), f"{folder}/{DIRECTORY_NAME}"))
+            for key in partitions.keys():
+                for path in partition_paths(partitions.directory, key):
+                    files.append((path, f"{folder}/{os.path.basename(path)}"))
+        return files
+
+    async def backup(self) -> dict:
+        """Takes a snapshot now and returns its manifest. Raises BackupError if one is already running."""
+        if self._lock.locked():
+            raise BackupError("A backup is already running.")
+        async with self._lock:
+            started = time.perf_counter()
+            # Rewards still in the user cache would be missing from the copy.
+            await self.db.users.flush()
+            loop = asyncio.get_running_loop()
+            manifest = await loop.run_in_executor(self._executor, self._backup_sync, self.sources())
+            manifest["seconds"] = time.perf_counter() - started
+            self.last = manifest
+        print(f"Backed up {len(manifest['files'])} database file(s) to {manifest['path']} in {manifest['seconds']:.2f}s "
+              f"({manifest['bytes'] / 1e6:.1f} MB, {manifest['compressed_bytes'] / 1e6:.1f} MB compressed)")
+        return manifest
+
+    def _backup_sync(self, sources: list) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        name = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, name)
+        suffix = 1
+        while os.path.exists(path):
+            # Two backups within a second, e.g. /backup right after the scheduled one.
+            suffix += 1
+            path = os.path.join(self.directory, f"{name}-{suffix:02d}")
+        # Only renamed once everything is in it, so a crash never leaves something that looks complete.
+        partial = path + _PARTIAL
+        os.makedirs(partial)
+        try:
+            files = []
+            for source, target in sources:
+                if os.path.exists(source):
+                    files.append(self._copy_file(source, os.path.join(partial, target)))
+                    files[-1]["file"] = target
+            manifest = {"path": path, "taken_at": time.time(), "files": files,
+                        "bytes": sum(f["bytes"] for f in files), "compressed_bytes": sum(f["compressed_bytes"] for f in files)}
+            with open(os.path.join(partial, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(partial, path)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        manifest["removed"] = self._rotate()
+        return manifest
+
+    def _copy_file(self, source_path: str, target_path: str) -> dict:
+        """Copies one database in steps, checks the copy and gzips it."""
+        started = time.perf_counter()
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        copy_path = target_path + ".tmp"
+        state = {"remaining": None, "restarts": 0, "pages": 0}
+
+        def progress(status, remaining, total):
+            if self._stopping:
+                raise BackupError("The bot is shutting down.")
+            # A restart shows as no progress, or as more pages left than before.
+            if state["remaining"] is not None and remaining >= state["remaining"]:
+                state["restarts"] += 1
+                if state["restarts"] > MAX_RESTARTS:
+                    raise _Restarted()
+            state["remaining"], state["pages"] = remaining, total
+            if remaining:
+                time.sleep(self.step_pause)
+
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(copy_path)
+        try:
+            try:
+                source.backup(target, pages=self.step_pages, progress=progress)
+            except _Restarted:
+                source.backup(target, pages=-1)
+                state["pages"] = target.execute("PRAGMA page_count").fetchone()[0]
+            result = target.execute("PRAGMA integrity_check").fetchall()
+            if [row[0] for row in result] != ["ok"]:
+                raise BackupError(f"The copy of {os.path.basename(source_path)} failed integrity_check: {result[:3]}")
+        except BaseException:
+            target.close()
+            os.remove(copy_path)
+            raise
+        finally:
+            source.close()
+        target.close()
+
+        with open(copy_path, "rb") as raw, gzip.open(target_path + ".gz", "wb", compresslevel=COMPRESS_LEVEL) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+        size = os.path.getsize(copy_path)
+        os.remove(copy_path)
+        return {"bytes": size, "compressed_bytes": os.path.getsize(target_path + ".gz"), "pages": state["pages"],
+                "restarts": state["restarts"], "integrity": "ok", "seconds": time.perf_counter() - started}
+
+    def snapshots(self) -> list:
+        """Complete snapshot folders, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        taken = {}
+        for name in os.listdir(self.directory):
+            manifest_path = os.path.join(self.directory, name, "manifest.json")
+            if not name.endswith(_PARTIAL) and os.path.isfile(manifest_path):
+                # By the time in the manifest, a name can come round again within one second.
+                with open(manifest_path) as f:
+                    taken[name] = json.load(f)["taken_at"]
+        return sorted(taken, key=taken.get)
+
+    def _rotate(self) -> list:
+        names = self.snapshots()
+        removed = names[:max(0, len(names) - self.keep)]
+        for name in removed:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        # Left behind by a backup that was killed half way.
+        for name in os.listdir(self.directory):
+            if name.endswith(_PARTIAL):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return removed
+
+    async def close(self):
+        """Stops the schedule and cuts short a backup that is still copying."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._stopping = True
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
@@ -0,0 +1,199 @@
+"""Checks that every storage backend behaves the same, then compares their speed.
+
+Run from the rocks_revamp folder:  python bench/bench_backends.py
+The parity check replays one scripted session of DatabaseManager calls on each
+backend, on fresh databases, and exits with an error if any result or the
+final table contents differ, or if the ledger doesn't add up to the balances
+before and after a compaction. The comparison then times raw reads and writes
+and the chat traffic from bench_traffic.py on each backend.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import tempfile
+import subprocess
+import dataclasses
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+from harness import percentile  # noqa: E402
+from storage import BACKENDS  # noqa: E402
+
+USERS = 200
+OPS = 20000
+CONCURRENCY = 64
+
+
+async def scripted_session(db) -> list:
+    """Calls every public DatabaseManager method, returns everything they returned."""
+    rng = random.Random(3)
+    results = []
+    guild = 1
+
+    for user_id in range(USERS):
+        results.append(await db.get_user_data(user_id, guild))
+    for user_id in range(USERS):
+        db.accrue_user_rewards(user_id, guild, rng.randint(1, 50), {"xp": rng.randint(0, 99), "last_coin_claim": 1000.0 + user_id})
+    await db.users.flush()
+    for user_id in range(0, USERS, 3):
+        await db.update_user_data(user_id, guild, {"daily_streak": user_id % 7, "last_daily": "2026-01-01"})
+        results.append(await db.add_balance(user_id, guild, 100))
+        results.append(await db.remove_balance(user_id, guild, 30))
+        results.append(await db.debit_balance(user_id, guild, 10 ** 6))
+        results.append(await db.debit_balance(user_id, guild, 5))
+    # The second claim of the day, sent at the same time as the first, must not pay again.
+    for user_id in range(0, USERS, 7):
+        claims = await asyncio.gather(*(db.claim_daily(user_id, guild, 50, 1, "2026-01-02") for _ in range(3)))
+        if sum(claim is not None for claim in claims) != 1:
+            sys.exit(f"Three claims of the same day paid out {sum(claim is not None for claim in claims)} times: {claims}")
+        results.extend(claims)
+
+    items = []
+    for n in range(60):
+        item = await db.add_item_to_shop(
+            n % 5, guild, f"Item {n}", ["Node", "Capcut"][n % 2], ["CC", "FX"][n % 3 % 2], rng.randint(0, 400),
+            f"https://example.com/{n}", f"https://example.com/{n}.png", None, None
+        )
+        items.append(item)
+    results.extend(items)
+    results.append(await db.get_categories_for_app(guild, "Node"))
+    results.append(await db.get_items_in_category(guild, "Node", "CC"))
+    page = await db.get_items_page(guild, "Capcut", "FX", limit=7)
+    results.append(page)
+    results.append(await db.get_items_page(guild, "Capcut", "FX", after=page["items"][-1]["item_id"], limit=7))
+    results.append(await db.get_creator_uploads_page(2, guild, limit=4))
+    await db.update_item_details(items[0]["item_id"], {"price": 1})
+    await db.delete_item(items[1]["item_id"])
+    results.append(await db.get_item_details(items[0]["item_id"]))
+    results.append(await db.get_item_details(items[1]["item_id"]))
+
+    for user_id in range(0, USERS, 5):
+        item = items[user_id % len(items)]
+        purchase = await db.purchase_item(user_id, guild, item["item_id"], f"key-{user_id}")
+        results.append(dataclasses.asdict(purchase))
+        results.append(dataclasses.asdict(await db.purchase_item(user_id, guild, item["item_id"], f"key-{user_id}")))
+        if purchase.status == "completed" and user_id % 2:
+            results.append(await db.refund_purchase(user_id, guild, purchase.purchase_id))
+            results.append(await db.refund_purchase(user_id, guild, purchase.purchase_id))
+
+    # The same calls fired concurrently have to give the same answers too.
+    results.extend(await asyncio.gather(*(db.add_balance(user_id, guild, 1) for user_id in range(USERS))))
+    results.append(await db.get_shop_schema())
+    return results
+
+
+def dump_tables(tmp: str) -> dict:
+    tables = {}
+    for filename, table, order in (("economy.db", "users", "user_id, guild_id"), ("economy.db", "purchases", "purchase_id"), ("economy.db", "ledger", "entry_id"), ("shop.db", "items", "item_id")):
+        con = sqlite3.connect(os.path.join(tmp, filename))
+        rows = con.execute(f"SELECT * FROM {table} ORDER BY {order}").fetchall()
+        columns = [column[0] for column in con.execute(f"SELECT * FROM {table} LIMIT 0").description]
+        con.close()
+        # created_at is a wall clock time, the rest has to match exactly.
+        tables[table] = [{k: v for k, v in zip(columns, row) if k != "created_at"} for row in rows]
+    return tables
+
+
+def strip_times(value):
+    if isinstance(value, dict):
+        return {k: strip_times(v) for k, v in value.items() if k != "created_at"}
+    if isinstance(value, list):
+        return [strip_times(v) for v in value]
+    return value
+
+
+def check_ledger(tmp: str, label: str, filename: str = "economy.db"):
+    """Every balance has to equal its snapshot plus the ledger entries after it."""
+    con = sqlite3.connect(os.path.join(tmp, filename))
+    wrong = con.execute("""
+        SELECT u.user_id, u.balance, COALESCE(s.balance, 0) + COALESCE(SUM(l.amount), 0)
+        FROM users u
+        LEFT JOIN balance_snapshots s ON s.user_id = u.user_id AND s.guild_id = u.guild_id
+        LEFT JOIN ledger l ON l.user_id = u.user_id AND l.guild_id = u.guild_id AND l.entry_id > COALESCE(s.as_of_entry_id, 0)
+        GROUP BY u.user_id, u.guild_id
+        HAVING u.balance != COALESCE(s.balance, 0) + COALESCE(SUM(l.amount), 0)
+    """).fetchall()
+    con.close()
+    if wrong:
+        sys.exit(f"Ledger doesn't match the balances {label}: {wrong[:5]}")
+
+
+async def parity_run(backend: str, tmp: str):
+    bot = harness.make_bot(tmp, backend)
+    results = await scripted_session(bot.db)
+    await bot.db.users.flush()
+    check_ledger(tmp, "before compacting")
+    tables = dump_tables(tmp)
+    # Compact with no retention window, so everything covered by a snapshot is archived.
+    bot.db.ledger.retention_days = 0
+    bot.db.ledger.archive_path = os.path.join(tmp, "ledger_archive.db")
+    compacted = await bot.db.ledger.compact()
+    check_ledger(tmp, "after compacting")
+    results.append({k: v for k, v in compacted.items() if k != "seconds"})
+    await bot.db.close()
+    return strip_times(results), tables
+
+
+def check_parity():
+    outputs = {}
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs[backend] = asyncio.run(parity_run(backend, tmp))
+
+    (reference_name, reference), *others = outputs.items()
+    for name, output in others:
+        for n, (expected, got) in enumerate(zip(reference[0], output[0])):
+            if expected != got:
+                sys.exit(f"Backend {name!r} differs from {reference_name!r} at result {n}:\n  {expected}\n  {got}")
+        if len(reference[0]) != len(output[0]):
+            sys.exit(f"Backend {name!r} returned {len(output[0])} results, {reference_name!r} returned {len(reference[0])}")
+        for table, rows in reference[1].items():
+            if rows != output[1][table]:
+                sys.exit(f"Backend {name!r} left different rows in {table} than {reference_name!r}")
+        print(f"ok  {name} matches {reference_name}: {len(reference[0])} results, "
+              + ", ".join(f"{len(rows)} {table}" for table, rows in reference[1].items()))
+
+
+async def timed_ops(db, label, make_call):
+    rng = random.Random(5)
+    latencies = []
+
+    async def worker(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            await make_call(rng.randrange(USERS))
+            latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(OPS // CONCURRENCY) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12} {len(latencies) / elapsed:>9,.0f} ops/s  p50 {percentile(latencies, 50) * 1000:6.3f} ms  p99 {percentile(latencies, 99) * 1000:6.3f} ms")
+
+
+async def compare(backend: str, tmp: str):
+    bot = harness.make_bot(tmp, backend)
+    db = bot.db
+    await asyncio.gather(*(db.get_user_data(user_id, 1) for user_id in range(USERS)))
+    print(f"{backend}:")
+    # Straight to the backend, past the user cache, so every call is a database round trip.
+    await timed_ops(db, "reads", lambda user_id: db._run_read(db.economy_pool, db._get_user_data_sync, user_id, 1))
+    await timed_ops(db, "writes", lambda user_id: db.add_balance(user_id, 1, 1))
+    await timed_ops(db, "mixed", lambda user_id: db._run_read(db.economy_pool, db._get_user_data_sync, user_id, 1) if user_id % 2 else db.add_balance(user_id, 1, 1))
+    await db.close()
+
+
+def main():
+    check_parity()
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(compare(backend, tmp))
+    print("chat traffic (python bench/bench_traffic.py chat --backend NAME):")
+    for backend in BACKENDS:
+        subprocess.run([sys.executable, os.path.join(harness.BENCH_DIR, "bench_traffic.py"), "chat", "--events", "10000", "--backend", backend], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Checks the online backups (backups.py) and what they cost the writer.
+
+Run from the rocks_revamp folder:  python bench/bench_backups.py [--users 300000]
+Everything happens in temp folders.
+
+1. Round trip: after bench_backends.scripted_session a backup is unzipped
+   and has to hold exactly the rows of the live files, with a ledger that
+   adds up. The same with partitioned files (bench_partitions.guild_session).
+2. Rotation: more backups than BACKUP_KEEP leave only the newest ones, and
+   a second backup while one runs is refused.
+3. Under load: balance writes run back to back on an economy.db with --users
+   rows while it is backed up. Shows their latency with no backup, with the
+   stepped backup and with a copy made inside one writer job, which is what
+   a consistent copy costs without the backup running on its own thread.
+   The snapshot taken under load has to pass integrity_check and its
+   ledger has to add up.
+"""
+import io
+import os
+import sys
+import gzip
+import time
+import shutil
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+from harness import percentile  # noqa: E402
+from bench_backends import scripted_session, dump_tables, check_ledger  # noqa: E402
+import bench_partitions  # noqa: E402
+import config  # noqa: E402
+from backups import BackupError  # noqa: E402
+
+
+def restore(snapshot: str, target: str):
+    """Unzips every file of a snapshot into target, in the same layout as the live files."""
+    for root, _, names in os.walk(snapshot):
+        for name in names:
+            if name.endswith(".gz"):
+                path = os.path.join(target, os.path.relpath(os.path.join(root, name), snapshot))[:-3]
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with gzip.open(os.path.join(root, name), "rb") as compressed, open(path, "wb") as raw:
+                    shutil.copyfileobj(compressed, raw)
+
+
+async def quiet_backup(db) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await db.backup()
+
+
+# --- ROUND TRIP ---
+
+async def round_trip_run(tmp: str, restored: str) -> dict:
+    bot = harness.make_bot(tmp)
+    bot.db.backups.directory = os.path.join(tmp, "backups")
+    await scripted_session(bot.db)
+    manifest = await quiet_backup(bot.db)
+    restore(manifest["path"], restored)
+    live = dump_tables(tmp)
+    await bot.db.close()
+    return manifest, live
+
+
+async def partitioned_run(tmp: str, restored: str) -> dict:
+    bot = harness.make_bot(tmp, partitioning="guild")
+    bot.db.backups.directory = os.path.join(tmp, "backups")
+    await bench_partitions.guild_session(bot.db, bench_partitions.GUILDS)
+    manifest = await quiet_backup(bot.db)
+    restore(manifest["path"], restored)
+    live = bench_partitions.dump_tables(tmp, True, keep_ids=True)
+    await bot.db.close()
+    return manifest, live
+
+
+def check_round_trip():
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as restored:
+        manifest, live = asyncio.run(round_trip_run(tmp, restored))
+        if dump_tables(restored) != live:
+            sys.exit("The restored backup doesn't hold the rows of the live files")
+        check_ledger(restored, "in the restored backup")
+        print(f"ok  backup of {len(manifest['files'])} files restores every row: {manifest['bytes'] / 1e3:,.0f} KB, "
+              f"{manifest['compressed_bytes'] / 1e3:,.0f} KB compressed, {manifest['seconds'] * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as restored:
+        manifest, live = asyncio.run(partitioned_run(tmp, restored))
+        if bench_partitions.dump_tables(restored, True, keep_ids=True) != live:
+            sys.exit("The restored partitioned backup doesn't hold the rows of the live files")
+        bench_partitions.check_ledgers(restored, True, "in the restored backup")
+        print(f"ok  partitioned backup of {len(manifest['files'])} files restores every row")
+
+
+# --- ROTATION ---
+
+async def rotation_run(tmp: str, keep: int) -> tuple:
+    bot = harness.make_bot(tmp)
+    backups = bot.db.backups
+    backups.directory, backups.keep = os.path.join(tmp, "backups"), keep
+    await bot.db.add_balance(1, 1, 10)
+    taken = [(await quiet_backup(bot.db))["path"] for _ in range(keep + 2)]
+    # Two at once: the second one has to be refused, not queued behind the first.
+    results = await asyncio.gather(quiet_backup(bot.db), quiet_backup(bot.db), return_exceptions=True)
+    taken.append(next(r["path"] for r in results if isinstance(r, dict)))
+    refused = sum(isinstance(r, BackupError) for r in results)
+    left = backups.snapshots()
+    await bot.db.close()
+    return taken, left, refused, os.listdir(backups.directory)
+
+
+def check_rotation():
+    keep = 3
+    with tempfile.TemporaryDirectory() as tmp:
+        taken, left, refused, listing = asyncio.run(rotation_run(tmp, keep))
+    if left != [os.path.basename(path) for path in taken[-keep:]]:
+        sys.exit(f"Expected the newest {keep} snapshots to be kept, found {left}")
+    if sorted(listing) != sorted(left):
+        sys.exit(f"Something besides the snapshots was left in the backup folder: {listing}")
+    if refused != 1:
+        sys.exit("A second backup while one was running wasn't refused")
+    print(f"ok  {len(taken)} backups taken, the newest {keep} kept, a concurrent one refused")
+
+
+# --- UNDER LOAD ---
+
+def fill(tmp: str, users: int):
+    bot = harness.make_bot(tmp)
+    asyncio.run(bot.db.close())
+    con = sqlite3.connect(os.path.join(tmp, "economy.db"))
+    with con:
+        con.executemany("INSERT INTO users (user_id, guild_id, balance, xp, level) VALUES (?, 1, 100, ?, ?)",
+                        ((user_id, user_id % 997, user_id % 40) for user_id in range(users)))
+        con.executemany("INSERT INTO ledger (user_id, guild_id, amount, reason, created_at) VALUES (?, 1, 100, 'chat', 0)",
+                        ((user_id,) for user_id in range(users)))
+    con.close()
+
+
+def _copy_in_writer_job_sync(con, source_path, path):
+    # The whole copy is one writer job, so every write waits for it. The writer's
+    # own connection can't be the source, it is inside the job's transaction.
+    source, target = sqlite3.connect(source_path), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+
+
+async def load_run(tmp: str, users: int, mode: str) -> dict:
+    bot = harness.make_bot(tmp)
+    db = bot.db
+    db.backups.directory = os.path.join(tmp, "backups")
+    latencies = []
+
+    async def writes(until):
+        n = 0
+        while not until.done():
+            started = time.perf_counter()
+            await db.add_balance(n % users, 1, 1)
+            latencies.append(time.perf_counter() - started)
+            n += 1
+
+    started = time.perf_counter()
+    if mode == "none":
+        job = asyncio.ensure_future(asyncio.sleep(1.0))
+    elif mode == "stepped":
+        job = asyncio.ensure_future(quiet_backup(db))
+    else:
+        job = asyncio.ensure_future(db._run_write(db.economy_pool, _copy_in_writer_job_sync, db.economy_db_path, os.path.join(tmp, "copy.db")))
+    await asyncio.gather(writes(job), job)
+    result = {"seconds": time.perf_counter() - started, "latencies": latencies}
+    if mode == "stepped":
+        manifest = job.result()
+        result["restarts"] = next(f["restarts"] for f in manifest["files"] if f["file"] == "economy.db")
+        result["path"] = manifest["path"]
+    await db.close()
+    return result
+
+
+def check_load(users: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        fill(tmp, users)
+        print(f"economy.db with {users:,} users, {os.path.getsize(os.path.join(tmp, 'economy.db')) / 1e6:.1f} MB")
+        for mode, label in (("none", "no backup"), ("stepped", "stepped backup"), ("writer", "copy in a writer job")):
+            result = asyncio.run(load_run(tmp, users, mode))
+            latencies = result["latencies"]
+            line = (f"{label:<20} {result['seconds']:6.2f} s  {len(latencies):6,} writes meanwhile  "
+                    f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:8.2f} ms  "
+                    f"max {max(latencies) * 1000:8.2f} ms")
+            if mode == "stepped":
+                line += f"  {result['restarts']} restarts"
+                with tempfile.TemporaryDirectory() as restored:
+                    restore(result["path"], restored)
+                    check_ledger(restored, "in the backup taken under load")
+            print(line)
+    print("ok  the backup taken under load passed integrity_check and its ledger adds up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300000, help="rows in economy.db for the run under load")
+    args = parser.parse_args()
+    config.DATABASE_PARTITION_BUCKETS = bench_partitions.BUCKETS
+    check_round_trip()
+    check_rotation()
+    check_load(args.users)
+
+
+if __name__ == "__main__":
+    main()
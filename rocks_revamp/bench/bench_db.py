@@ -0,0 +1,99 @@
+"""Compares DatabaseManager throughput against the old connection-per-call code.
+
+Run from the rocks_revamp folder:  python bench/bench_db.py
+Everything happens in a temporary folder, the real databases are never touched.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import tempfile
+import functools
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import database, percentile  # noqa: E402
+
+USERS = 1000
+MESSAGES = 20000
+CONCURRENCY = 32
+
+
+class PerCallDatabase:
+    """The old behaviour: a fresh connection for every call, all on the default executor."""
+
+    def __init__(self, economy_db_path):
+        self.economy_db_path = economy_db_path
+
+    def _run_sync(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+    def _get_user_data_sync(self, user_id, guild_id):
+        with sqlite3.connect(self.economy_db_path) as con:
+            con.row_factory = sqlite3.Row
+            cur = con.cursor()
+            cur.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
+            user_data = cur.fetchone()
+            if not user_data:
+                cur.execute("INSERT INTO users (user_id, guild_id) VALUES (?, ?)", (user_id, guild_id))
+                con.commit()
+                cur.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
+                user_data = cur.fetchone()
+            return dict(user_data)
+
+    async def get_user_data(self, user_id, guild_id):
+        return await self._run_sync(self._get_user_data_sync, user_id, guild_id)
+
+    def _update_user_data_sync(self, user_id, guild_id, data):
+        with sqlite3.connect(self.economy_db_path, timeout=30) as con:
+            cur = con.cursor()
+            set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
+            values = list(data.values()) + [user_id, guild_id]
+            cur.execute(f"UPDATE users SET {set_clause} WHERE user_id = ? AND guild_id = ?", tuple(values))
+            con.commit()
+
+    async def update_user_data(self, user_id, guild_id, data):
+        await self._run_sync(self._update_user_data_sync, user_id, guild_id, data)
+
+
+async def run(db, label):
+    """Replays the on_message pattern, one read and one write per message, from many concurrent tasks."""
+    rng = random.Random(42)
+    latencies = []
+    errors = 0
+
+    async def worker(count):
+        nonlocal errors
+        for _ in range(count):
+            user_id = rng.randrange(USERS)
+            started = time.perf_counter()
+            try:
+                player = await db.get_user_data(user_id, 1)
+                await db.update_user_data(user_id, 1, {"balance": player["balance"] + 1, "last_coin_claim": time.time()})
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(MESSAGES // CONCURRENCY) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22} {len(latencies) / elapsed:>8,.0f} msg/s  {2 * len(latencies) / elapsed:>8,.0f} ops/s  "
+        f"p50 {percentile(latencies, 50) * 1000:6.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  errors {errors}"
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = database.DatabaseManager(None, os.path.join(tmp, "economy.db"), os.path.join(tmp, "shop.db"))
+        # Warm up the table so both runs see the same rows.
+        await asyncio.gather(*(manager.get_user_data(user_id, 1) for user_id in range(USERS)))
+
+        await run(PerCallDatabase(manager.economy_db_path), "connection per call")
+        await run(manager, "DatabaseManager")
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,167 @@
+"""Checks the in-memory leaderboards against SQL and times them.
+
+Run from the rocks_revamp folder:  python bench/bench_leaderboard.py
+A few guilds get random users, then a random mix of chat rewards, /daily,
+coin changes and purchases runs against them. After every round the top 10
+and a sample of ranks for each board are compared with a plain ORDER BY over
+the database, and the script exits with an error on the first difference.
+Then coin changes for users who aren't cached land while a board is loading,
+and the board has to match SQL afterwards. It then times /leaderboard reads from the boards and from SQL.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+from harness import percentile  # noqa: E402
+from leaderboards import METRICS  # noqa: E402
+
+GUILDS = 3
+USERS_PER_GUILD = 3000
+ROUNDS = 20
+CHANGES_PER_ROUND = 2000
+READS = 5000
+
+
+def seed(db, rng):
+    rows = [
+        (user_id, guild_id, rng.randrange(5000), rng.randrange(100), rng.randrange(40), rng.randrange(60))
+        for guild_id in range(1, GUILDS + 1) for user_id in range(USERS_PER_GUILD)
+    ]
+    con = db.economy_pool.writer()
+    con.executemany("INSERT INTO users (user_id, guild_id, balance, xp, level, daily_streak) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def expected(tmp: str, guild_id: int, metric: str) -> list:
+    """Every user of the guild in leaderboard order, straight from the database."""
+    con = sqlite3.connect(os.path.join(tmp, "economy.db"))
+    columns = METRICS[metric]
+    rows = con.execute(
+        f"SELECT user_id, {', '.join(columns)} FROM users WHERE guild_id = ? ORDER BY "
+        + ", ".join(f"{column} DESC" for column in columns) + ", user_id",
+        (guild_id,)
+    ).fetchall()
+    con.close()
+    return [(row[0], tuple(row[1:])) for row in rows]
+
+
+async def random_change(db, rng):
+    guild_id = rng.randrange(1, GUILDS + 1)
+    # Most changes hit a few active users, like a real chat.
+    user_id = int(rng.paretovariate(1.2)) % USERS_PER_GUILD
+    player = await db.get_user_data(user_id, guild_id)
+    kind = rng.random()
+    if kind < 0.6:
+        level = player['level'] + (rng.random() < 0.05)
+        db.accrue_user_rewards(user_id, guild_id, rng.randint(1, 40), {"xp": rng.randrange(100), "level": level})
+    elif kind < 0.75:
+        await db.update_user_data(user_id, guild_id, {"daily_streak": rng.choice([0, player['daily_streak'] + 1])})
+    elif kind < 0.85:
+        await db.add_balance(user_id, guild_id, rng.randint(1, 3000))
+    elif kind < 0.95:
+        await db.debit_balance(user_id, guild_id, rng.randint(1, 3000))
+    else:
+        await db.remove_balance(user_id, guild_id, rng.randint(1000, 100000))
+
+
+async def check(db, tmp: str, rng):
+    # The boards follow the flush, so compare once everything is written.
+    await db.users.flush()
+    for guild_id in range(1, GUILDS + 1):
+        for metric in METRICS:
+            order = expected(tmp, guild_id, metric)
+            top = await db.get_leaderboard(guild_id, metric, limit=10)
+            if top != order[:10]:
+                sys.exit(f"Top 10 of {metric} in guild {guild_id} differs:\n  {top}\n  {order[:10]}")
+            for position in rng.sample(range(len(order)), 20) + [0, len(order) - 1]:
+                user_id = order[position][0]
+                rank = await db.get_rank(user_id, guild_id, metric)
+                if rank != position + 1:
+                    sys.exit(f"User {user_id} is #{position + 1} on {metric} in guild {guild_id}, the board says #{rank}")
+
+
+async def check_invalidated_during_load(db, tmp: str):
+    """Writes for uncached users that land between a board's SELECT and its caching must not be lost."""
+    guild_id, metric = 1, "balance"
+    read_economy = db._read_economy
+    new_users = iter(range(USERS_PER_GUILD, USERS_PER_GUILD + 100))
+    writes_left = 0
+
+    async def slow_read_economy(guild, func, *args):
+        nonlocal writes_left
+        rows = await read_economy(guild, func, *args)
+        if func == db._get_leaderboard_sync and writes_left:
+            # After the read, before the board is built: a new user jumps to the top.
+            writes_left -= 1
+            await db.add_balance(next(new_users), guild_id, 10 ** 9)
+        return rows
+
+    db._read_economy = slow_read_economy
+    try:
+        # Once: the load reads again and caches a correct board.
+        # Every read: the load returns what it has and leaves the board uncached.
+        for writes in (1, 2):
+            db.leaderboards.invalidate(guild_id)
+            writes_left = writes
+            await db.get_leaderboard(guild_id, metric)
+            if writes == 1 and (guild_id, metric) not in db.leaderboards._boards:
+                sys.exit("The board read again after an invalidation wasn't cached")
+            top = await db.get_leaderboard(guild_id, metric)
+            order = expected(tmp, guild_id, metric)
+            if top != order[:10]:
+                sys.exit(f"A write during the board load was lost ({writes} write(s)):\n  {top}\n  {order[:10]}")
+    finally:
+        db._read_economy = read_economy
+    print("ok  writes for uncached users during a board load reach the board")
+
+
+async def timed(label, make_call):
+    latencies = []
+    start = time.perf_counter()
+    for n in range(READS):
+        started = time.perf_counter()
+        await make_call(n)
+        latencies.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<26} {READS / elapsed:>9,.0f} reads/s  p50 {percentile(latencies, 50) * 1000:6.3f} ms  p99 {percentile(latencies, 99) * 1000:6.3f} ms")
+
+
+async def run(tmp: str):
+    rng = random.Random(11)
+    bot = harness.make_bot(tmp)
+    db = bot.db
+    seed(db, rng)
+
+    for _ in range(ROUNDS):
+        for _ in range(CHANGES_PER_ROUND):
+            await random_change(db, rng)
+        await check(db, tmp, rng)
+    print(f"ok  {ROUNDS * CHANGES_PER_ROUND:,} changes, boards match SQL after every round ({db.leaderboards.stats()})")
+    await check_invalidated_during_load(db, tmp)
+
+    guild = lambda n: n % GUILDS + 1  # noqa: E731
+    print(f"{GUILDS} guilds x {USERS_PER_GUILD:,} users:")
+    await timed("top 10 from the boards", lambda n: db.get_leaderboard(guild(n), "level"))
+    await timed("top 10 from SQL", lambda n: db._run_read(db.economy_pool, db._get_leaderboard_sync, guild(n), METRICS["level"], 10))
+    on_board = {guild_id: [user_id for user_id, _ in await db.get_leaderboard(guild_id, "balance", limit=50)] for guild_id in range(1, GUILDS + 1)}
+    off_board = {guild_id: [user_id for user_id, _ in expected(tmp, guild_id, "balance")][1000:2000] for guild_id in range(1, GUILDS + 1)}
+    await timed("rank on the board", lambda n: db.get_rank(on_board[guild(n)][n % 50], guild(n), "balance"))
+    await timed("rank off the board (COUNT)", lambda n: db.get_rank(off_board[guild(n)][n % 1000], guild(n), "balance"))
+    # What a naive /leaderboard did: sort the whole guild and find the user in it.
+    await timed("naive ORDER BY + scan", lambda n: db._run_read(db.economy_pool, lambda con: con.execute(
+        "SELECT user_id FROM users WHERE guild_id = ? ORDER BY balance DESC", (guild(n),)).fetchall()))
+    await db.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Checks the migration runner and times startup with and without pending migrations.
+
+Run from the rocks_revamp folder:  python bench/bench_migrations.py
+It migrates new databases and an old shop.db without the extra screenshot
+columns, and exits with an error if they don't end up with the same schema.
+It then times startup on up-to-date databases against running the CREATE
+statements every time, and shows how long a big data migration keeps other
+writers waiting, as one statement and as a Chunked step.
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import migrations  # noqa: E402
+
+STARTUPS = 2000
+ROWS = 500000
+
+
+def connect(path: str):
+    con = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    return con
+
+
+def schema(con) -> list:
+    return sorted(row for row in con.execute("SELECT type, name, tbl_name FROM sqlite_master"))
+
+
+def columns(con, table: str) -> list:
+    return [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate(path: str, steps, baseline):
+    con = connect(path)
+    version = migrations.run_migrations(con, steps, os.path.basename(path), baseline)
+    return con, version
+
+
+def check_migrations(tmp: str):
+    new, version = migrate(os.path.join(tmp, "new_shop.db"), migrations.SHOP_MIGRATIONS, migrations.SHOP_BASELINE)
+
+    # What the very first shop.db looked like: no extra screenshots and no user_version.
+    old = connect(os.path.join(tmp, "old_shop.db"))
+    old.execute("""CREATE TABLE items (
+        item_id INTEGER PRIMARY KEY AUTOINCREMENT, creator_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL, item_name TEXT NOT NULL, application TEXT NOT NULL,
+        category TEXT NOT NULL, price INTEGER NOT NULL, product_link TEXT NOT NULL,
+        screenshot_link TEXT
+    )""")
+    old.execute("INSERT INTO items (creator_id, guild_id, item_name, application, category, price, product_link) VALUES (1, 1, 'Old Glow', 'Node', 'FX', 5, 'x')")
+    old.close()
+    old, old_version = migrate(os.path.join(tmp, "old_shop.db"), migrations.SHOP_MIGRATIONS, migrations.SHOP_BASELINE)
+
+    if version != old_version or schema(new) != schema(old):
+        sys.exit(f"Old shop.db migrated to a different schema:\n  {schema(new)}\n  {schema(old)}")
+    if set(columns(new, "items")) != set(columns(old, "items")):
+        sys.exit(f"Old shop.db is missing columns: {set(columns(new, 'items')) - set(columns(old, 'items'))}")
+    if old.execute("SELECT rowid FROM items_fts WHERE items_fts MATCH 'glow'").fetchall() != [(1,)]:
+        sys.exit("Existing items were not indexed for search")
+    print(f"ok  old and new shop.db both at version {version} with the same schema")
+
+    economy, version = migrate(os.path.join(tmp, "economy.db"), migrations.ECONOMY_MIGRATIONS, migrations.ECONOMY_BASELINE)
+    if migrations.run_migrations(economy, migrations.ECONOMY_MIGRATIONS, "economy.db", migrations.ECONOMY_BASELINE) != version:
+        sys.exit("Running the migrations twice changed the version")
+    print(f"ok  economy.db at version {version}, a second run is a no-op")
+    return economy, new
+
+
+def time_startup(economy, shop):
+    started = time.perf_counter()
+    for _ in range(STARTUPS):
+        migrations.run_migrations(economy, migrations.ECONOMY_MIGRATIONS, "economy.db", migrations.ECONOMY_BASELINE)
+        migrations.run_migrations(shop, migrations.SHOP_MIGRATIONS, "shop.db", migrations.SHOP_BASELINE)
+    fast = (time.perf_counter() - started) / STARTUPS
+
+    # What _init_sync did before: every CREATE ... IF NOT EXISTS on every start.
+    started = time.perf_counter()
+    for _ in range(STARTUPS):
+        for statement in migrations.ECONOMY_BASELINE:
+            economy.execute(statement)
+        for statement in migrations.SHOP_BASELINE:
+            if isinstance(statement, str):
+                shop.execute(statement)
+        for con, steps in ((economy, migrations.ECONOMY_MIGRATIONS), (shop, migrations.SHOP_MIGRATIONS)):
+            for statement in (step for _, _, step_list in steps for step in step_list):
+                if statement.lstrip().upper().startswith("CREATE"):
+                    con.execute(statement)
+    every_time = (time.perf_counter() - started) / STARTUPS
+    print(f"startup, up to date:  version check {fast * 1e6:7.1f} us   vs CREATE IF NOT EXISTS every start {every_time * 1e6:7.1f} us")
+
+
+def longest_wait(path: str, step) -> tuple:
+    """Runs a migration step while another connection keeps writing, returns (migration seconds, worst writer wait)."""
+    con = connect(path)
+    con.execute("DROP TABLE IF EXISTS big")
+    con.execute("CREATE TABLE big (id INTEGER PRIMARY KEY, value INTEGER, doubled INTEGER)")
+    con.execute("BEGIN")
+    con.executemany("INSERT INTO big (id, value) VALUES (?, ?)", ((n, n) for n in range(1, ROWS + 1)))
+    con.execute("COMMIT")
+
+    waits = []
+    done = threading.Event()
+
+    def writer():
+        other = connect(path)
+        other.execute("PRAGMA busy_timeout = 60000")
+        other.execute("CREATE TABLE IF NOT EXISTS heartbeat (at REAL)")
+        while not done.is_set():
+            started = time.perf_counter()
+            other.execute("INSERT INTO heartbeat VALUES (?)", (started,))
+            waits.append(time.perf_counter() - started)
+            time.sleep(0.001)
+        other.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.05)
+    started = time.perf_counter()
+    con.execute("BEGIN IMMEDIATE")
+    migrations._run_step(con, step)
+    con.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+    done.set()
+    thread.join()
+    if con.execute("SELECT COUNT(*) FROM big WHERE doubled IS NULL OR doubled != value * 2").fetchone()[0]:
+        sys.exit("Data migration left rows behind")
+    con.close()
+    return elapsed, max(waits)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        economy, shop = check_migrations(tmp)
+        time_startup(economy, shop)
+        economy.close()
+        shop.close()
+
+        path = os.path.join(tmp, "big.db")
+        sql = "UPDATE big SET doubled = value * 2"
+        # A waiting writer's busy handler sleeps a few ms between retries, so the pause has to be
+        # at least that long for it to get in between two chunks.
+        for label, step in (
+            ("one statement", sql),
+            ("Chunked, 5000 rows", migrations.Chunked("big", sql + " WHERE id >= :start AND id < :end", chunk_size=5000, pause=0.005)),
+        ):
+            elapsed, wait = longest_wait(path, step)
+            print(f"{ROWS:,}-row backfill, {label:<18} took {elapsed:6.2f} s, longest wait for another writer {wait * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
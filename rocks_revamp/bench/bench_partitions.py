@@ -0,0 +1,339 @@
+"""Checks the partitioned databases (partitions.py) against the unpartitioned ones.
+
+Run from the rocks_revamp folder:  python bench/bench_partitions.py
+Everything happens in temp folders.
+
+1. Parity: one session of calls over several guilds on economy.db/shop.db,
+   on one file pair per guild and on hash buckets (some guilds share one)
+   has to return the same results and leave the same rows, apart from the
+   ledger and purchase ids, which every partition counts on its own.
+   The ledger has to add up in every partition before and after a compaction.
+2. Split: the same session on economy.db/shop.db, then `partitions.py split`.
+   The partitions have to hold exactly the old rows, ids included, and a
+   partitioned DatabaseManager has to read back what the old one did.
+3. Isolation: one guild floods the writer while the others write now and then.
+   Shows how long the quiet guilds wait, unpartitioned and per guild.
+4. LRU: more guilds than DATABASE_MAX_OPEN_PARTITIONS, used one by one and
+   all at once. Idle partitions have to be closed and reopen with their data.
+"""
+import io
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+import dataclasses
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+from harness import percentile  # noqa: E402
+from bench_backends import strip_times, check_ledger  # noqa: E402
+import config  # noqa: E402
+import partitions  # noqa: E402
+from storage import BACKENDS  # noqa: E402
+
+# Snowflakes, so the hash buckets are spread the way real guilds would be. With
+# 4 buckets the first and fifth guild share a bucket, and so do the second and sixth.
+GUILDS = [(10 ** 17 >> 22 << 22) + (n << 22) for n in range(6)]
+BUCKETS = 4
+USERS = 40
+# Per partition each of these counts on its own, so they can't match between layouts.
+LOCAL_IDS = ("entry_id", "purchase_id", "reference", "as_of_entry_id", "taken_at")
+
+
+def strip_ids(value):
+    if isinstance(value, dict):
+        return {k: strip_ids(v) for k, v in value.items() if k not in LOCAL_IDS}
+    if isinstance(value, (list, tuple)):
+        return type(value)(strip_ids(v) for v in value)
+    return value
+
+
+async def guild_session(db, guilds: list) -> list:
+    """Calls every public per-guild DatabaseManager method for each guild, returns what they returned."""
+    rng = random.Random(5)
+    results = []
+
+    for guild_id in guilds:
+        for user_id in range(USERS):
+            results.append(await db.get_user_data(user_id, guild_id))
+    for guild_id in guilds:
+        for user_id in range(USERS):
+            db.accrue_user_rewards(user_id, guild_id, rng.randint(1, 50), {"xp": rng.randint(0, 99), "last_coin_claim": 1000.0 + user_id})
+    await db.users.flush()
+    for guild_id in guilds:
+        for user_id in range(0, USERS, 3):
+            await db.update_user_data(user_id, guild_id, {"daily_streak": user_id % 7, "last_daily": "2026-01-01"})
+            results.append(await db.add_balance(user_id, guild_id, 100))
+            results.append(await db.remove_balance(user_id, guild_id, 30))
+            results.append(await db.debit_balance(user_id, guild_id, 10 ** 6))
+
+    items = {guild_id: [] for guild_id in guilds}
+    for n in range(12):
+        # Round robin, so the item ids of a guild aren't one contiguous run.
+        for guild_id in guilds:
+            items[guild_id].append(await db.add_item_to_shop(
+                n % 3, guild_id, f"Item {n} {rng.choice(['glow', 'preset', 'pack'])}", ["Node", "Capcut"][n % 2],
+                ["CC", "FX"][n % 3 % 2], rng.randint(0, 200), f"https://example.com/{guild_id}/{n}", None, None, None
+            ))
+    for guild_id in guilds:
+        guild_items = items[guild_id]
+        results.extend(guild_items)
+        await db.update_item_details(guild_items[0]["item_id"], {"price": 1})
+        await db.delete_item(guild_items[1]["item_id"])
+        results.append(await db.get_item_details(guild_items[0]["item_id"]))
+        results.append(await db.get_item_details(guild_items[1]["item_id"]))
+        results.append(await db.get_categories_for_app(guild_id, "Node"))
+        results.append(await db.get_items_in_category(guild_id, "Node", "CC"))
+        results.append(await db.get_items_page(guild_id, "Capcut", "FX", limit=3))
+        results.append(await db.get_creator_uploads_page(1, guild_id, limit=4))
+        results.append(await db.search_items(guild_id, "pre"))
+
+    for guild_id in guilds:
+        for user_id in range(0, USERS, 4):
+            item = items[guild_id][2 + user_id % 10]
+            purchase = await db.purchase_item(user_id, guild_id, item["item_id"], f"key-{guild_id}-{user_id}")
+            results.append(dataclasses.asdict(purchase))
+            if purchase.status == "completed" and user_id % 8:
+                results.append(await db.refund_purchase(user_id, guild_id, purchase.purchase_id))
+
+    # Every guild at once, so the partitions are written side by side.
+    results.extend(await asyncio.gather(*(db.add_balance(user_id, guild_id, 1) for guild_id in guilds for user_id in range(USERS))))
+    for guild_id in guilds:
+        for metric in ("balance", "level", "streak"):
+            results.append(await db.get_leaderboard(guild_id, metric))
+            results.append(await db.get_rank(USERS - 1, guild_id, metric))
+        results.append(await db.get_ledger_entries(3, guild_id))
+        results.append(await db.get_coin_flow(guild_id, 0))
+    return results
+
+
+def database_files(tmp: str, partitioned: bool) -> list:
+    """(economy path, shop path) pairs holding the data."""
+    if not partitioned:
+        return [(os.path.join(tmp, "economy.db"), os.path.join(tmp, "shop.db"))]
+    directory = os.path.join(tmp, config.DATABASE_PARTITION_DIR)
+    return [partitions.partition_paths(directory, match.group(1))
+            for match in map(partitions._ECONOMY_FILE.match, sorted(os.listdir(directory))) if match]
+
+
+def dump_tables(tmp: str, partitioned: bool, keep_ids: bool = False) -> dict:
+    """Every row of every file, merged and in guild order. Within a guild the rows keep the order they were written in."""
+    tables = {}
+    for economy_path, shop_path in database_files(tmp, partitioned):
+        for path, table, order in ((economy_path, "users", "guild_id, user_id"), (economy_path, "purchases", "guild_id, purchase_id"),
+                                   (economy_path, "ledger", "guild_id, entry_id"), (economy_path, "balance_snapshots", "guild_id, user_id"),
+                                   (shop_path, "items", "item_id")):
+            con = sqlite3.connect(path)
+            con.row_factory = sqlite3.Row
+            rows = [{k: row[k] for k in row.keys() if k != "created_at"} for row in con.execute(f"SELECT * FROM {table} ORDER BY {order}")]
+            con.close()
+            tables.setdefault(table, []).extend(rows if keep_ids else strip_ids(rows))
+    for table, rows in tables.items():
+        rows.sort(key=lambda row: row["item_id"] if table == "items" else row["guild_id"])
+    return tables
+
+
+def check_ledgers(tmp: str, partitioned: bool, label: str):
+    for economy_path, _ in database_files(tmp, partitioned):
+        check_ledger(os.path.dirname(economy_path), f"{label} in {os.path.basename(economy_path)}", os.path.basename(economy_path))
+
+
+# --- PARITY ---
+
+async def parity_run(tmp: str, partitioning: str):
+    bot = harness.make_bot(tmp, partitioning=partitioning)
+    results = await guild_session(bot.db, GUILDS)
+    await bot.db.users.flush()
+    check_ledgers(tmp, partitioning is not None, "before compacting")
+    tables = dump_tables(tmp, partitioning is not None)
+    bot.db.ledger.retention_days = 0
+    bot.db.ledger.archive_path = os.path.join(tmp, "ledger_archive.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        compacted = await bot.db.ledger.compact()
+    check_ledgers(tmp, partitioning is not None, "after compacting")
+    results.append({k: v for k, v in compacted.items() if k != "seconds"})
+    stats = bot.db.partitions.stats() if bot.db.partitions is not None else None
+    await bot.db.close()
+    return strip_ids(strip_times(results)), tables, stats
+
+
+def compare(label: str, expected: tuple, got: tuple):
+    for n, (a, b) in enumerate(zip(expected[0], got[0])):
+        if a != b:
+            sys.exit(f"{label} differs from economy.db/shop.db at result {n}:\n  {a}\n  {b}")
+    if len(expected[0]) != len(got[0]):
+        sys.exit(f"{label} returned {len(got[0])} results, economy.db/shop.db {len(expected[0])}")
+    for table, rows in expected[1].items():
+        if rows != got[1][table]:
+            sys.exit(f"{label} left different rows in {table}")
+
+
+def check_parity():
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = asyncio.run(parity_run(tmp, None))
+    for partitioning in partitions.MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            got = asyncio.run(parity_run(tmp, partitioning))
+            files = len(database_files(tmp, True))
+        compare(f"{partitioning!r} partitioning", expected, got)
+        print(f"ok  {partitioning!r} partitioning matches: {len(got[0])} results over {len(GUILDS)} guilds in {files} partitions, "
+              + ", ".join(f"{len(rows)} {table}" for table, rows in got[1].items()))
+
+
+# --- SPLIT ---
+
+async def read_back(db, guilds: list) -> list:
+    results = []
+    for guild_id in guilds:
+        results.extend([await db.get_user_data(user_id, guild_id) for user_id in range(USERS)])
+        results.append(await db.get_items_in_category(guild_id, "Node", "CC"))
+        results.append(await db.get_leaderboard(guild_id, "balance"))
+        results.append(await db.get_ledger_entries(3, guild_id))
+        results.append(await db.search_items(guild_id, "glow"))
+    results.append(await db.get_item_details(1))
+    # An old purchase key is still known after the split.
+    results.append(dataclasses.asdict(await db.purchase_item(0, guilds[0], 3, f"key-{guilds[0]}-0")))
+    return strip_times(results)
+
+
+async def unpartitioned_run(tmp: str) -> list:
+    bot = harness.make_bot(tmp)
+    await guild_session(bot.db, GUILDS)
+    await bot.db.close()
+    bot = harness.make_bot(tmp)
+    results = await read_back(bot.db, GUILDS)
+    await bot.db.close()
+    return results
+
+
+async def split_run(tmp: str, partitioning: str, last_item_id: int) -> list:
+    bot = harness.make_bot(tmp, partitioning=partitioning)
+    results = await read_back(bot.db, GUILDS)
+    item = await bot.db.add_item_to_shop(1, GUILDS[-1], "New", "Node", "CC", 5, "https://example.com/new", None, None, None)
+    if item["item_id"] != last_item_id + 1:
+        sys.exit(f"A new item got id {item['item_id']} after the split, expected {last_item_id + 1}")
+    await bot.db.close()
+    return results
+
+
+def check_split():
+    for partitioning in partitions.MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            expected = asyncio.run(unpartitioned_run(tmp))
+            before = dump_tables(tmp, False, keep_ids=True)
+            con = sqlite3.connect(os.path.join(tmp, "shop.db"))
+            last_item_id = con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'items'").fetchone()[0]
+            con.close()
+
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                partitions.split_databases(os.path.join(tmp, "economy.db"), os.path.join(tmp, "shop.db"), partitioning, BUCKETS)
+            elapsed = time.perf_counter() - started
+            after = dump_tables(tmp, True, keep_ids=True)
+            for table, rows in before.items():
+                if rows != after[table]:
+                    sys.exit(f"Splitting by {partitioning!r} changed the rows of {table}")
+            check_ledgers(tmp, True, "after the split")
+            got = asyncio.run(split_run(tmp, partitioning, last_item_id))
+            for n, (a, b) in enumerate(zip(expected, got)):
+                if a != b:
+                    sys.exit(f"After splitting by {partitioning!r} result {n} differs:\n  {a}\n  {b}")
+            try:
+                partitions.split_databases(os.path.join(tmp, "economy.db"), os.path.join(tmp, "shop.db"), partitioning, BUCKETS)
+                sys.exit("Splitting into a folder that has partitions didn't fail")
+            except ValueError:
+                pass
+        print(f"ok  split by {partitioning!r} in {elapsed:.2f}s: every row kept with its id, {len(got)} reads match")
+
+
+# --- ISOLATION ---
+
+async def isolation_run(tmp: str, backend: str, partitioning: str, hot_writes: int) -> list:
+    bot = harness.make_bot(tmp, backend, partitioning)
+    db = bot.db
+    hot, quiet = GUILDS[0], GUILDS[1:]
+    for guild_id in GUILDS:
+        for user_id in range(USERS):
+            await db.get_user_data(user_id, guild_id)
+
+    flood = [asyncio.ensure_future(db.add_balance(n % USERS, hot, 1)) for n in range(hot_writes)]
+    latencies = []
+    n = 0
+    while not all(task.done() for task in flood):
+        started = time.perf_counter()
+        await db.add_balance(n % USERS, quiet[n % len(quiet)], 1)
+        latencies.append(time.perf_counter() - started)
+        n += 1
+    await asyncio.gather(*flood)
+    await db.close()
+    return latencies
+
+
+def check_isolation(hot_writes: int):
+    for backend in BACKENDS:
+        for partitioning in (None, "guild"):
+            with tempfile.TemporaryDirectory() as tmp:
+                started = time.perf_counter()
+                latencies = asyncio.run(isolation_run(tmp, backend, partitioning, hot_writes))
+                elapsed = time.perf_counter() - started
+            print(f"{backend:<9} {partitioning or 'none':<6} {hot_writes:,} hot writes in {elapsed:5.2f}s, "
+                  f"{len(latencies):5,} quiet writes meanwhile  p50 {percentile(latencies, 50) * 1000:8.2f} ms  "
+                  f"p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+
+
+# --- LRU ---
+
+async def lru_run(tmp: str, max_open: int, guilds: list) -> dict:
+    config.DATABASE_MAX_OPEN_PARTITIONS, saved = max_open, config.DATABASE_MAX_OPEN_PARTITIONS
+    try:
+        bot = harness.make_bot(tmp, partitioning="guild")
+    finally:
+        config.DATABASE_MAX_OPEN_PARTITIONS = saved
+    db = bot.db
+    rounds = 3
+    for _ in range(rounds):
+        for guild_id in guilds:
+            await db.add_balance(1, guild_id, 10)
+            if db.partitions.stats()["open"] > max_open:
+                sys.exit(f"{db.partitions.stats()['open']} partitions open one at a time, the limit is {max_open}")
+    # All at once: the busy ones stay open past the limit and are closed when released.
+    balances = await asyncio.gather(*(db.add_balance(1, guild_id, 10) for guild_id in guilds))
+    if balances != [10 * (rounds + 1)] * len(guilds):
+        sys.exit(f"Balances after reopening partitions: {balances}")
+    # Closing happens off the loop, let it finish before looking.
+    await asyncio.sleep(0.2)
+    stats = db.partitions.stats()
+    if stats["open"] > max_open:
+        sys.exit(f"{stats['open']} partitions still open after the burst, the limit is {max_open}")
+    await db.close()
+    return stats
+
+
+def check_lru():
+    max_open, guilds = 3, [(10 ** 17 >> 22 << 22) + (n << 22) for n in range(12)]
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        stats = asyncio.run(lru_run(tmp, max_open, guilds))
+        elapsed = time.perf_counter() - started
+    print(f"ok  {len(guilds)} guilds with at most {max_open} partitions open: opened {stats['opened']} times, "
+          f"closed {stats['closed']} times in {elapsed:.2f}s, no coins lost")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hot-writes", type=int, default=5000, help="writes the busy guild queues in the isolation run")
+    args = parser.parse_args()
+    config.DATABASE_PARTITION_BUCKETS = BUCKETS
+    check_parity()
+    check_split()
+    check_isolation(args.hot_writes)
+    check_lru()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Times the chat reward roll: the old inline math against the drop tables.
+
+Run from the rocks_revamp folder:  python bench/bench_rewards.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rewards  # noqa: E402
+
+ROLLS = 500000
+
+
+def old_inline(level, streak):
+    """What on_message did per message before the drop tables."""
+    luck_multiplier = min(1 + (0.5 * (streak / 7)), 10.0)
+    max_coins = 20 + (level * 5)
+    low_tier_cap = int(max_coins * 0.80)
+    high_tier_chance = min(0.05 * luck_multiplier, 1.0)
+    coins = random.randint(low_tier_cap + 1, max_coins) if random.random() < high_tier_chance else random.randint(1, low_tier_cap)
+
+    luck_multiplier = min(1 + (0.5 * (streak / 7)), 10.0)
+    max_xp = 25 + (level * 5)
+    low_tier_cap = int(max_xp * 0.80)
+    high_tier_chance = min(0.20 * luck_multiplier, 1.0)
+    xp = random.randint(low_tier_cap + 1, max_xp) if random.random() < high_tier_chance else random.randint(1, low_tier_cap)
+    return coins, xp
+
+
+def drop_tables(level, streak):
+    drops = rewards.drop_table(level, streak)
+    return drops.roll_coins(), drops.roll_xp()
+
+
+def main():
+    rng = random.Random(9)
+    players = [(rng.randrange(60), rng.randrange(200)) for _ in range(ROLLS)]
+
+    for label, func in (("inline", old_inline), ("drop tables", drop_tables)):
+        start = time.perf_counter()
+        for level, streak in players:
+            func(level, streak)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<14} {ROLLS / elapsed:>12,.0f} rolls/s  {elapsed / ROLLS * 1e9:6.0f} ns per message")
+
+    start = time.perf_counter()
+    rewards.roll_many(players)
+    elapsed = time.perf_counter() - start
+    print(f"{'roll_many':<14} {ROLLS / elapsed:>12,.0f} rolls/s  {elapsed / ROLLS * 1e9:6.0f} ns per message")
+    print(f"drop table cache: {rewards._build_drop_table.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
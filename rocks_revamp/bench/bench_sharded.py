@@ -0,0 +1,234 @@
+"""Runs the multi-process mode on one machine and checks that it stays consistent.
+
+Run from the rocks_revamp folder:  python bench/bench_sharded.py [--workers 4]
+Everything happens in a temp folder with a real storage_service.py process.
+
+1. Parity: bench_backends.scripted_session goes through RemoteDatabase and
+   has to return the same results and leave the same rows as an in-process
+   DatabaseManager.
+2. Chat traffic: the guilds are split over --shards shards the way Discord
+   does it, and each of --workers processes replays chat messages through
+   EconomyCog.on_message for the guilds on its shards. After the storage
+   process shut down, the coins in economy.db have to add up to what the
+   workers handed out, and the ledger has to match the balances.
+   The same traffic in one process with a local DatabaseManager is the baseline.
+   Without --rate the messages are fired as fast as possible, which measures
+   throughput. With --rate the latencies show what a user would wait.
+"""
+import os
+import sys
+import json
+import time
+import types
+import random
+import signal
+import asyncio
+import argparse
+import sqlite3
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+from bench_backends import scripted_session, dump_tables, strip_times, check_ledger  # noqa: E402
+from fakes import FakeBot, FakeUser, FakeGuild, FakeChannel, FakeMessage  # noqa: E402
+from outbound import OutboundDispatcher  # noqa: E402
+from profiles import ProfileCache  # noqa: E402
+from storage_service import RemoteDatabase  # noqa: E402
+from cogs.economy import EconomyCog  # noqa: E402
+
+PACKAGE_DIR = os.path.dirname(harness.BENCH_DIR)
+
+
+def guild_ids(count: int) -> list:
+    """Snowflakes whose shard, (id >> 22) % shard_count, cycles through every shard."""
+    return [(10 ** 17 >> 22 << 22) + (n << 22) for n in range(count)]
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    return (guild_id >> 22) % shard_count
+
+
+def start_storage(tmp: str) -> tuple:
+    socket_path = os.path.join(tmp, "storage.sock")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PACKAGE_DIR, "storage_service.py"), "--socket", socket_path,
+         "--economy-db", os.path.join(tmp, "economy.db"), "--shop-db", os.path.join(tmp, "shop.db")],
+        cwd=tmp, stdout=subprocess.PIPE, text=True
+    )
+    while not os.path.exists(socket_path):
+        if process.poll() is not None:
+            sys.exit("The storage service didn't start")
+        time.sleep(0.05)
+    return process, socket_path
+
+
+def stop_storage(process) -> str:
+    process.send_signal(signal.SIGTERM)
+    output = process.communicate(timeout=60)[0]
+    if process.returncode != 0:
+        sys.exit(f"The storage service exited with code {process.returncode}")
+    return output
+
+
+def normalize(results: list) -> list:
+    # Tuples come back from the socket as lists, compare both sides the way JSON sees them.
+    return json.loads(json.dumps(strip_times(results)))
+
+
+# --- PARITY ---
+
+async def remote_session(socket_path: str) -> list:
+    db = RemoteDatabase(None, socket_path)
+    await db.start()
+    # scripted_session flushes the user cache, which lives in the storage process.
+    db.users = types.SimpleNamespace(flush=db.flush)
+    results = await scripted_session(db)
+    await db.flush()
+    await db.close()
+    return results
+
+
+async def local_session(tmp: str) -> list:
+    bot = harness.make_bot(tmp)
+    results = await scripted_session(bot.db)
+    await bot.db.close()
+    return results
+
+
+def check_parity():
+    with tempfile.TemporaryDirectory() as local_tmp, tempfile.TemporaryDirectory() as remote_tmp:
+        expected = normalize(asyncio.run(local_session(local_tmp)))
+        process, socket_path = start_storage(remote_tmp)
+        got = normalize(asyncio.run(remote_session(socket_path)))
+        stop_storage(process)
+        for n, (a, b) in enumerate(zip(expected, got)):
+            if a != b:
+                sys.exit(f"RemoteDatabase differs from DatabaseManager at result {n}:\n  {a}\n  {b}")
+        if len(expected) != len(got):
+            sys.exit(f"RemoteDatabase returned {len(got)} results, DatabaseManager {len(expected)}")
+        local_tables, remote_tables = dump_tables(local_tmp), dump_tables(remote_tmp)
+        for table, rows in local_tables.items():
+            if rows != remote_tables[table]:
+                sys.exit(f"RemoteDatabase left different rows in {table}")
+        check_ledger(remote_tmp, "after the remote session")
+        print(f"ok  RemoteDatabase matches DatabaseManager: {len(got)} results, "
+              + ", ".join(f"{len(rows)} {table}" for table, rows in remote_tables.items()))
+
+
+# --- CHAT TRAFFIC ---
+
+async def replay_chat(bot, guilds: list, users: int, events: int, seed: int, rate: float = None) -> dict:
+    """Chat messages from `users` people spread over `guilds`, returns the timing and the coins handed out."""
+    rng = random.Random(seed)
+    handed_out = {"coins": 0}
+    accrue = bot.db.accrue_user_rewards
+
+    def counted_accrue(user_id, guild_id, coins=0, data=None):
+        handed_out["coins"] += coins
+        accrue(user_id, guild_id, coins, data)
+    bot.db.accrue_user_rewards = counted_accrue
+
+    people = [FakeUser(user_id) for user_id in range(1, users + 1)]
+    places = [FakeGuild(guild_id) for guild_id in guilds]
+    channel = FakeChannel()
+    cog = EconomyCog(bot)
+    messages = (FakeMessage(rng.choice(people), rng.choice(places), channel) for _ in range(events))
+    latencies, elapsed = await harness.replay(messages, cog.on_message, rate)
+    return {"events": len(latencies), "elapsed": elapsed, "p50": harness.percentile(latencies, 50),
+            "p99": harness.percentile(latencies, 99), "coins": handed_out["coins"]}
+
+
+async def worker(socket_path: str, shard_ids: list, shard_count: int, args) -> dict:
+    bot = FakeBot()
+    bot.db = RemoteDatabase(bot, socket_path)
+    bot.outbound = OutboundDispatcher(bot, period=0)
+    bot.profiles = ProfileCache(bot)
+    await bot.db.start()
+    guilds = [guild_id for guild_id in guild_ids(args.guilds) if shard_of(guild_id, shard_count) in shard_ids]
+    result = await replay_chat(bot, guilds, args.users, args.events // args.workers, seed=shard_ids[0], rate=args.rate / args.workers if args.rate else None)
+    result["batches"], result["calls"] = bot.db.batches, bot.db.calls
+    await bot.outbound.close()
+    await bot.db.close()
+    return result
+
+
+async def in_process(tmp: str, args) -> dict:
+    bot = harness.make_bot(tmp)
+    result = await replay_chat(bot, guild_ids(args.guilds), args.users, args.events // args.workers * args.workers, seed=0, rate=args.rate)
+    await bot.outbound.close()
+    await bot.db.close()
+    return result
+
+
+def total_coins(tmp: str) -> int:
+    con = sqlite3.connect(os.path.join(tmp, "economy.db"))
+    coins = con.execute("SELECT COALESCE(SUM(balance), 0) FROM users").fetchone()[0]
+    con.close()
+    return coins
+
+
+def show(label: str, results: list):
+    # The workers replay side by side, so the slowest one sets the pace. Process startup isn't counted.
+    elapsed = max(result["elapsed"] for result in results)
+    events = sum(result["events"] for result in results)
+    p50 = max(result["p50"] for result in results)
+    p99 = max(result["p99"] for result in results)
+    line = f"{label:<26} {events:>7,} events  {events / elapsed:>9,.0f} ev/s  p50 {p50 * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms"
+    calls = sum(result.get("calls", 0) for result in results)
+    if calls:
+        line += f"  {calls / sum(result['batches'] for result in results):5.1f} calls/batch"
+    print(line)
+
+
+def check_traffic(args):
+    shard_count = args.shards or args.workers
+    splits = [list(range(shard_count))[n::args.workers] for n in range(args.workers)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(in_process(tmp, args))
+        show("1 process, local database", [result])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process, socket_path = start_storage(tmp)
+        command = [sys.executable, os.path.abspath(__file__), "--socket", socket_path, "--shards", str(shard_count),
+                   "--workers", str(args.workers), "--events", str(args.events), "--users", str(args.users), "--guilds", str(args.guilds)]
+        if args.rate:
+            command += ["--rate", str(args.rate)]
+        workers = [subprocess.Popen(command + ["--shard-ids", ",".join(map(str, shard_ids))], stdout=subprocess.PIPE, text=True) for shard_ids in splits]
+        results = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+        if any(w.returncode for w in workers):
+            sys.exit("A worker process failed")
+        print(stop_storage(process).strip().splitlines()[-1])
+        show(f"{args.workers} processes, storage socket", results)
+
+        handed_out, stored = sum(result["coins"] for result in results), total_coins(tmp)
+        if handed_out != stored:
+            sys.exit(f"Workers handed out {handed_out:,} coins but economy.db holds {stored:,}")
+        check_ledger(tmp, "after the sharded run")
+        print(f"ok  {handed_out:,} coins handed out by {args.workers} processes, all of them in economy.db and the ledger")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--shards", type=int, default=None, help="total shard count (default: one per worker)")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=None, help="messages per second over all processes (default: as fast as possible)")
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    parser.add_argument("--shard-ids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.shard_ids is not None:
+        shard_ids = [int(shard_id) for shard_id in args.shard_ids.split(",")]
+        print(json.dumps(asyncio.run(worker(args.socket, shard_ids, args.shards, args))))
+        return
+
+    check_parity()
+    check_traffic(args)
+
+
+if __name__ == "__main__":
+    main()
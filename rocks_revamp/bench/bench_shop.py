@@ -0,0 +1,172 @@
+"""Seeds a large shop and measures the /shop browse queries.
+
+Run from the rocks_revamp folder:  python bench/bench_shop.py
+It first checks that every browse query is answered from an index (and exits
+with an error if not), then times the browse path from the in-memory catalog
+and straight from SQL, with and without the indexes. Finally it checks that
+the full-text index follows inserts, renames and deletes, and times
+/shopsearch autocomplete lookups for prefixes of every length.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import database, percentile  # noqa: E402
+
+ITEMS = 100000
+GUILDS = 500
+CREATORS_PER_GUILD = 20
+BROWSES = 2000
+APPLICATIONS = ["After Effects", "Alight Motion", "Node", "Capcut", "Blurr"]
+CATEGORIES = ["CC", "FX", "Overlays", "Project File"]
+NAME_WORDS = ["Glitch", "Shake", "Smooth", "Velocity", "Flash", "Neon", "Retro", "Zoom", "Blur", "Warp",
+              "Pack", "Preset", "Transition", "Edit", "Grain", "Color", "Anime", "Lyric", "Text", "Glow"]
+SEARCHES = 5000
+
+# Every browse query and the index it has to use.
+EXPECTED_PLANS = [
+    ("SELECT DISTINCT category FROM items WHERE guild_id = ? AND application = ?", (1, "Node"), "idx_items_browse"),
+    ("SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? ORDER BY item_id", (1, "Node", "CC"), "idx_items_browse"),
+    ("SELECT * FROM items WHERE creator_id = ? AND guild_id = ? ORDER BY item_id", (1, 1), "idx_items_creator"),
+    ("SELECT * FROM items WHERE guild_id = ? ORDER BY application, category, item_id", (1,), "idx_items_browse"),
+    ("SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? AND item_id > ? ORDER BY item_id LIMIT ?", (1, "Node", "CC", 0, 26), "idx_items_browse"),
+    ("SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? AND item_id < ? ORDER BY item_id DESC LIMIT ?", (1, "Node", "CC", 10**9, 26), "idx_items_browse"),
+    ("SELECT * FROM items WHERE guild_id = ? AND creator_id = ? AND item_id > ? ORDER BY item_id LIMIT ?", (1, 1, 0, 11), "idx_items_creator"),
+]
+
+
+def seed(manager):
+    rng = random.Random(7)
+    rows = []
+    for n in range(ITEMS):
+        guild_id = rng.randrange(GUILDS)
+        rows.append((
+            guild_id * 1000 + rng.randrange(CREATORS_PER_GUILD), guild_id, f"{' '.join(rng.sample(NAME_WORDS, 3))} {n}",
+            rng.choice(APPLICATIONS), rng.choice(CATEGORIES), rng.randrange(10, 5000),
+            "https://example.com/download", "https://example.com/shot.png", None, None
+        ))
+    con = manager.shop_pool.writer()
+    con.execute("BEGIN")
+    con.executemany(
+        "INSERT INTO items (creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    con.execute("COMMIT")
+    con.execute("ANALYZE")
+
+
+def check_query_plans(manager):
+    con = manager.shop_pool.reader()
+    for sql, params, index in EXPECTED_PLANS:
+        plan = " | ".join(row["detail"] for row in con.execute("EXPLAIN QUERY PLAN " + sql, params))
+        if index not in plan or "TEMP B-TREE" in plan:
+            sys.exit(f"Query does not use {index}: {sql}\n  plan: {plan}")
+        print(f"ok  {index:<18} {plan}")
+
+
+class SqlBrowser:
+    """The browse calls without the catalog, straight to shop.db."""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def get_categories_for_app(self, guild_id, application):
+        return await self.manager._run_read(self.manager.shop_pool, self.manager._get_categories_for_app_sync, guild_id, application)
+
+    async def get_items_in_category(self, guild_id, application, category):
+        return await self.manager._run_read(self.manager.shop_pool, self.manager._get_items_in_category_sync, guild_id, application, category)
+
+    async def get_item_details(self, item_id):
+        return await self.manager._run_read(self.manager.shop_pool, self.manager._get_item_details_sync, item_id)
+
+
+async def browse(manager, label):
+    """One /shop walk: application -> categories -> items in the first category -> item details."""
+    rng = random.Random(11)
+    latencies = []
+    for _ in range(BROWSES):
+        guild_id = rng.randrange(GUILDS)
+        application = rng.choice(APPLICATIONS)
+        started = time.perf_counter()
+        categories = await manager.get_categories_for_app(guild_id, application)
+        if categories:
+            items = await manager.get_items_in_category(guild_id, application, categories[0])
+            if items:
+                await manager.get_item_details(items[0]["item_id"])
+        latencies.append(time.perf_counter() - started)
+    print(f"{label:<18} p50 {percentile(latencies, 50) * 1000:7.2f} ms  p95 {percentile(latencies, 95) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms")
+
+
+async def check_search(manager):
+    """Search has to see every kind of change to items, through the triggers."""
+    item = await manager.add_item_to_shop(1, 1, "Zzyzx Swirl", "Node", "FX", 10, "https://example.com", None, None, None)
+    found = await manager.search_items(1, "zzy sw")
+    if [row["item_id"] for row in found] != [item["item_id"]]:
+        sys.exit(f"New item not found by a prefix search: {found}")
+    if await manager.search_items(2, "zzyzx"):
+        sys.exit("Search returned an item from another guild")
+    await manager.update_item_details(item["item_id"], {"item_name": "Qwfp Swirl"})
+    if await manager.search_items(1, "zzyzx") or not await manager.search_items(1, "qwfp"):
+        sys.exit("Renamed item is still found by its old name")
+    await manager.update_item_details(item["item_id"], {"price": 20})
+    if not await manager.search_items(1, "qwfp"):
+        sys.exit("Item lost from search after a price change")
+    await manager.delete_item(item["item_id"])
+    if await manager.search_items(1, "qwfp"):
+        sys.exit("Deleted item is still found")
+    if (await manager.search_items(1, str(first_item_id(manager, 1))))[0]["item_id"] != first_item_id(manager, 1):
+        sys.exit("Searching for an item ID doesn't return that item first")
+    print("ok  items_fts follows inserts, renames, price changes and deletes")
+
+
+def first_item_id(manager, guild_id):
+    return manager.shop_pool.reader().execute("SELECT MIN(item_id) FROM items WHERE guild_id = ?", (guild_id,)).fetchone()[0]
+
+
+async def search(manager):
+    """What autocomplete sends while someone types: every prefix of one or two words."""
+    rng = random.Random(13)
+    by_length = {}
+    for _ in range(SEARCHES):
+        text = " ".join(rng.sample(NAME_WORDS, rng.choice([1, 2])))
+        typed = text[:rng.randrange(1, len(text) + 1)]
+        started = time.perf_counter()
+        items = await manager.search_items(rng.randrange(GUILDS), typed)
+        by_length.setdefault(min(len(typed), 6), []).append(time.perf_counter() - started)
+        if len(items) > 25:
+            sys.exit("Search returned more than one select menu of items")
+    for length, latencies in sorted(by_length.items()):
+        label = f"{length}{'+' if length == 6 else ''} chars typed"
+        print(f"  {label:<16} p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  ({len(latencies)} searches)")
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = database.DatabaseManager(None, os.path.join(tmp, "economy.db"), os.path.join(tmp, "shop.db"))
+        seed(manager)
+        print(f"Seeded {ITEMS:,} items across {GUILDS} guilds.")
+        check_query_plans(manager)
+
+        await browse(manager, "catalog (cold)")
+        await browse(manager, "catalog (warm)")
+        stats = manager.catalog.stats()
+        print(f"catalog: {stats['guilds']} guilds, {stats['items']:,} items, {stats['memory_bytes'] / 1e6:.1f} MB, hit ratio {stats['hit_ratio']:.1%}")
+
+        await check_search(manager)
+        print("search (autocomplete):")
+        await search(manager)
+
+        await browse(SqlBrowser(manager), "sql, indexes")
+        con = manager.shop_pool.writer()
+        con.execute("DROP INDEX idx_items_browse")
+        con.execute("DROP INDEX idx_items_creator")
+        await browse(SqlBrowser(manager), "sql, no indexes")
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Measures startup and time-to-first-command across restarts.
+
+Run from the rocks_revamp folder:  python bench/bench_startup.py
+Every run is a fresh Python process started in a temp folder. It imports
+main.py (which opens the databases there), loads the cogs, syncs the command
+tree and then answers a /balance, and reports each phase. Logging in and the
+gateway can't run offline, so tree.sync() is replaced by a sleep of
+--sync-seconds standing in for its REST round trips.
+
+The first run is a first boot (new databases, first sync). The restarts then
+show the startup pipeline, with an unchanged tree, against the old one, which
+loaded the cogs one by one and synced on every start.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+
+
+async def child(old: bool, sync_seconds: float):
+    sys.path.insert(0, PACKAGE_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    import io
+    import contextlib
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        import config
+        import startup
+        from fakes import FakeUser, FakeGuild, FakeChannel, FakeInteraction
+    bot, timer = main.bot, main.startup_timer
+
+    async def fake_sync(*args, **kwargs):
+        await asyncio.sleep(sync_seconds)
+        return bot.tree.get_commands()
+    bot.tree.sync = fake_sync
+    bot._connection.application_id = 1
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if old:
+            # As if started from the rocks_revamp folder, which the old os.listdir("cogs") needed.
+            for filename in os.listdir(os.path.join(PACKAGE_DIR, "cogs")):
+                if filename.endswith(".py"):
+                    await bot.load_extension(f"cogs.{filename[:-3]}")
+            timer.mark("cogs")
+            await bot.tree.sync()
+        else:
+            await startup.load_cogs(bot, startup.find_cogs())
+            timer.mark("cogs")
+            await startup.sync_commands(bot, config.COMMAND_SYNC_HASH_PATH)
+        timer.mark("command sync")
+
+        cog = bot.get_cog("EconomyCog")
+        interaction = FakeInteraction(FakeUser(), FakeGuild(1), FakeChannel())
+        await cog.balance.callback(cog, interaction)
+        timer.mark("first command")
+        await bot.db.close()
+    print(json.dumps({"phases": timer.phases, "total": timer.elapsed()}))
+
+
+def run(tmp: str, old: bool, sync_seconds: float) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--sync-seconds", str(sync_seconds)] + (["--old"] if old else [])
+    output = subprocess.run(command, cwd=tmp, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def show(label: str, runs: list):
+    phases = {}
+    for result in runs:
+        for name, seconds in result["phases"]:
+            phases.setdefault(name, []).append(seconds)
+    cells = "  ".join(f"{name} {statistics.median(times) * 1000:6.1f}" for name, times in phases.items())
+    total = statistics.median(result["total"] for result in runs)
+    print(f"{label:<22} first command after {total * 1000:7.1f} ms   ({cells} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restarts", type=int, default=5)
+    parser.add_argument("--sync-seconds", type=float, default=0.5, help="stand-in for how long a global tree.sync() takes")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--old", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args.old, args.sync_seconds))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        show("first boot", [run(tmp, False, args.sync_seconds)])
+        show("restart, unchanged", [run(tmp, False, args.sync_seconds) for _ in range(args.restarts)])
+        show("restart, old startup", [run(tmp, True, args.sync_seconds) for _ in range(args.restarts)])
+        # A changed command tree has to sync again.
+        with open(os.path.join(tmp, "command_tree.sha256"), "a") as f:
+            f.write("changed")
+        show("restart, tree changed", [run(tmp, False, args.sync_seconds)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Replays synthetic traffic through the real cogs with fake Discord objects.
+
+Run from the rocks_revamp folder, no bot token needed:
+
+    python bench/bench_traffic.py                        # every scenario
+    python bench/bench_traffic.py chat --rate 2000 --duration 10 --users 10000
+
+Each scenario prints throughput, p50/p95/p99 latency and database operations
+(executor reads + writer jobs) per event. --perf adds the slowest operations
+recorded by perf.py, --no-metrics turns recording off to measure its overhead.
+--sql-trace turns on sqltrace.py and prints the most expensive statements.
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+import perf  # noqa: E402
+from storage import BACKENDS  # noqa: E402
+from fakes import FakeUser, FakeGuild, FakeChannel, FakeMessage, FakeInteraction, select_values  # noqa: E402
+from cogs.economy import EconomyCog  # noqa: E402
+from cogs.streaks import StreaksCog  # noqa: E402
+from cogs.shop import ApplicationSelectView, PurchaseView  # noqa: E402
+
+APPLICATIONS = ["After Effects", "Alight Motion", "Node", "Capcut", "Blurr"]
+CATEGORIES = ["CC", "FX", "Overlays", "Project File"]
+
+
+def make_world(args):
+    rng = random.Random(args.seed)
+    guilds = [FakeGuild() for _ in range(args.guilds)]
+    users = [FakeUser() for _ in range(args.users)]
+    channel = FakeChannel()
+    return rng, guilds, users, channel
+
+
+async def seed_items(bot, guild, creator, count=200):
+    await asyncio.gather(*(
+        bot.db.add_item_to_shop(
+            creator.id, guild.id, f"Item {n}", APPLICATIONS[n % len(APPLICATIONS)], CATEGORIES[n % len(CATEGORIES)],
+            10 + n, "https://example.com/download", "https://example.com/shot.png", None, None
+        )
+        for n in range(count)
+    ))
+
+
+async def scenario_chat(bot, args):
+    """Users chatting: every message goes through EconomyCog.on_message."""
+    rng, guilds, users, channel = make_world(args)
+    cog = EconomyCog(bot)
+    total = int(args.rate * args.duration) if args.rate else args.events
+    events = (FakeMessage(rng.choice(users), rng.choice(guilds), channel) for _ in range(total))
+    return await harness.replay(events, cog.on_message, args.rate)
+
+
+async def scenario_daily(bot, args):
+    """/daily, including the repeated-claim spam path."""
+    rng, guilds, users, channel = make_world(args)
+    cog = StreaksCog(bot)
+    total = int(args.rate * args.duration) if args.rate else args.events
+    events = (FakeInteraction(rng.choice(users), rng.choice(guilds), channel) for _ in range(total))
+    return await harness.replay(events, lambda interaction: cog.daily.callback(cog, interaction), args.rate)
+
+
+async def scenario_purchase(bot, args):
+    """Buy Now clicks on a seeded shop, from users who can afford the item."""
+    rng, guilds, users, channel = make_world(args)
+    guild = guilds[0]
+    creator = FakeUser(name="creator")
+    bot.users[creator.id] = creator
+    await seed_items(bot, guild, creator)
+    await asyncio.gather(*(bot.db.add_balance(user.id, guild.id, 10**9) for user in users))
+
+    async def buy(event):
+        user, item_id = event
+        interaction = FakeInteraction(user, guild, channel)
+        view = PurchaseView(bot, item_id, "", "", str(interaction.id))
+        await view.buy_button.callback(interaction)
+
+    total = int(args.rate * args.duration) if args.rate else args.events
+    events = ((rng.choice(users), rng.randint(1, 200)) for _ in range(total))
+    return await harness.replay(events, buy, args.rate)
+
+
+async def scenario_browse(bot, args):
+    """The full /shop walk: application button -> category select -> item select."""
+    rng, guilds, users, channel = make_world(args)
+    guild = guilds[0]
+    creator = FakeUser(name="creator")
+    await seed_items(bot, guild, creator)
+
+    async def browse(user):
+        interaction = FakeInteraction(user, guild, channel)
+        await ApplicationSelectView(bot).node_button.callback(interaction)
+        category_view = interaction.edits[-1]["view"]
+        category_select = category_view.children[0]
+        select_values(category_select, category_select.options[0].value)
+        await category_select.callback(interaction)
+        item_view = interaction.edits[-1]["view"]
+        select_values(item_view.item_select, item_view.item_select.options[0].value)
+        await item_view.item_select.callback(interaction)
+
+    total = int(args.rate * args.duration) if args.rate else args.events
+    events = (rng.choice(users) for _ in range(total))
+    return await harness.replay(events, browse, args.rate)
+
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "daily": scenario_daily,
+    "purchase": scenario_purchase,
+    "browse": scenario_browse,
+}
+
+
+async def run(name, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = harness.make_bot(tmp, args.backend)
+        bot.db.tracer.enabled = args.sql_trace
+        ops = harness.DbOpCounter(bot.db)
+        scenario = SCENARIOS[name]
+        # Setup work (seeding items, balances) is not part of the measurement.
+        original_replay = harness.replay
+
+        async def measured_replay(*replay_args):
+            ops.reset()
+            perf.metrics.reset()
+            bot.db.tracer.reset()
+            return await original_replay(*replay_args)
+
+        harness.replay = measured_replay
+        try:
+            latencies, elapsed = await scenario(bot, args)
+        finally:
+            harness.replay = original_replay
+        harness.report(name, latencies, elapsed, ops)
+        if args.perf:
+            for op, stats in perf.metrics.top(limit=8):
+                print(f"    {op:<36} {stats['count']:>7,}  p50 {stats['p50'] * 1000:7.3f} ms  p95 {stats['p95'] * 1000:7.3f} ms  max {stats['max'] * 1000:7.3f} ms")
+        if args.sql_trace:
+            for row in bot.db.tracer.top(limit=5):
+                print(f"    {row['calls']:>7,} calls {row['total_ms']:9.1f} ms total {row['max_ms']:7.2f} ms max  {row['sql'][:80]}")
+        await bot.outbound.close()
+        await bot.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=None, help="events per second, open-loop (default: as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic when --rate is set")
+    parser.add_argument("--events", type=int, default=20000, help="number of events when --rate is not set")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=None, help="storage backend (default: config.DATABASE_BACKEND)")
+    parser.add_argument("--perf", action="store_true", help="print the slowest operations from perf.py")
+    parser.add_argument("--no-metrics", action="store_true", help="turn perf.py recording off")
+    parser.add_argument("--sql-trace", action="store_true", help="trace every SQL statement and print the most expensive")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+    perf.metrics.enabled = not args.no_metrics
+
+    for name in args.scenarios or list(SCENARIOS):
+        asyncio.run(run(name, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Lightweight stand-ins for the discord.py objects the cogs touch.
+
+They only implement what the cogs actually use, record what was sent, and
+never talk to Discord, so the benchmarks run offline without a bot token.
+"""
+import itertools
+import discord
+
+_ids = itertools.count(10**17)
+
+
+def next_id() -> int:
+    """A snowflake-sized id that is unique within the run."""
+    return next(_ids)
+
+
+class FakeUser:
+    def __init__(self, user_id: int = None, name: str = None, bot: bool = False):
+        self.id = user_id if user_id is not None else next_id()
+        self.name = name or f"user{self.id}"
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+        self.dms = []
+
+    async def send(self, content=None, **kwargs):
+        self.dms.append((content, kwargs))
+
+
+class FakeRole:
+    def __init__(self, name: str):
+        self.id = next_id()
+        self.name = name
+        self.mention = f"<@&{self.id}>"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = None):
+        self.id = guild_id if guild_id is not None else next_id()
+        self.roles = [FakeRole("Members")]
+        self.members = {}
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int = None):
+        self.id = channel_id if channel_id is not None else next_id()
+        self.mention = f"<#{self.id}>"
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+
+class FakeMessage:
+    def __init__(self, author: FakeUser, guild: FakeGuild, channel: FakeChannel, content: str = "hello"):
+        self.id = next_id()
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.content = content
+        self.interaction = None
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.sent.append((content, kwargs))
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+        self._interaction.edits.append(kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.sent.append((content, kwargs))
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, guild: FakeGuild, channel: FakeChannel):
+        self.id = next_id()
+        self.user = user
+        self.guild = guild
+        self.channel = channel
+        self.sent = []
+        self.edits = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeBot:
+    """Enough of commands.Bot for the cogs: a database, channels and users."""
+
+    def __init__(self, db=None):
+        self.db = db
+        self.user = FakeUser(name="bench-bot", bot=True)
+        self.channels = {}
+        self.users = {}
+
+    def get_channel(self, channel_id: int):
+        # Every configured channel exists, so the log paths run too.
+        return self.channels.setdefault(channel_id, FakeChannel(channel_id))
+
+    def get_user(self, user_id: int):
+        return self.users.get(user_id)
+
+    async def fetch_user(self, user_id: int):
+        user = self.users.get(user_id)
+        if user is None:
+            raise discord.NotFound(_FakeHTTPResponse(), "Unknown User")
+        return user
+
+
+class _FakeHTTPResponse:
+    status = 404
+    reason = "Not Found"
+
+
+def select_values(select, *values):
+    """Sets what the user picked in a ui.Select before calling its callback."""
+    select._values = list(values)
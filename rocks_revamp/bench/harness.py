@@ -0,0 +1,99 @@
+"""Shared plumbing for the benchmarks: a temp-dir bot, op counting, pacing and reporting."""
+import io
+import os
+import sys
+import time
+import asyncio
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import database  # noqa: E402
+from outbound import OutboundDispatcher  # noqa: E402
+from profiles import ProfileCache  # noqa: E402
+from fakes import FakeBot  # noqa: E402
+
+
+def make_bot(tmp_dir: str, backend: str = None, partitioning: str = None) -> FakeBot:
+    """A FakeBot with a real DatabaseManager whose files live in tmp_dir."""
+    bot = FakeBot()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot.db = database.DatabaseManager(bot, os.path.join(tmp_dir, "economy.db"), os.path.join(tmp_dir, "shop.db"), backend, partitioning)
+    # Fake channels have no rate limit, so don't pace them.
+    bot.outbound = OutboundDispatcher(bot, period=0)
+    bot.profiles = ProfileCache(bot)
+    return bot
+
+
+class DbOpCounter:
+    """Counts executor reads and writer jobs issued by a DatabaseManager."""
+
+    def __init__(self, db):
+        self.reads = 0
+        self.writes = 0
+        run_read, run_write = db._run_read, db._run_write
+
+        def counted_read(*args, **kwargs):
+            self.reads += 1
+            return run_read(*args, **kwargs)
+
+        def counted_write(*args, **kwargs):
+            self.writes += 1
+            return run_write(*args, **kwargs)
+
+        db._run_read = counted_read
+        db._run_write = counted_write
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def report(label: str, latencies: list, elapsed: float, ops: DbOpCounter = None):
+    events = len(latencies)
+    line = (
+        f"{label:<16} {events:>7,} events  {events / elapsed:>9,.0f} ev/s  "
+        f"p50 {percentile(latencies, 50) * 1000:7.3f} ms  p95 {percentile(latencies, 95) * 1000:7.3f} ms  "
+        f"p99 {percentile(latencies, 99) * 1000:7.3f} ms"
+    )
+    if ops is not None:
+        line += f"  db ops/event {(ops.reads + ops.writes) / events:.3f} ({ops.reads:,} reads, {ops.writes:,} writes)"
+    print(line)
+
+
+async def replay(events, handler, rate: float = None):
+    """Runs handler(event) for every event and returns (latencies, elapsed seconds).
+
+    With a rate the events are fired open-loop at that many per second and the
+    latency is measured from when each one was due, so queueing delay counts.
+    Without a rate they are fired as fast as the loop can go.
+    """
+    latencies = []
+    tasks = []
+
+    async def timed(event, due):
+        await handler(event)
+        latencies.append(time.perf_counter() - due)
+
+    # The cogs print on every reward, keep that out of the terminal and the timings.
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for n, event in enumerate(events):
+            due = start + n / rate if rate else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(timed(event, due)))
+            if not rate and len(tasks) % 1000 == 0:
+                # Let the loop breathe so the run is a stream, not one giant burst.
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
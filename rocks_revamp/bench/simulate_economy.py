@@ -0,0 +1,215 @@
+"""Offline Monte Carlo simulation of the chat and /daily economy in rewards.py.
+
+Run from the rocks_revamp folder (needs numpy):
+
+    python bench/simulate_economy.py                         # 100k users for 30 days
+    python bench/simulate_economy.py --users 200000 --days 180 --spend 0.02
+
+Every simulated user belongs to an activity profile (how many rewarded
+messages a day, how reliably they claim /daily) and all users advance one day
+at a time in NumPy batches, rolling exactly the rewards rewards.py would.
+It reports coin inflation, how long each profile takes to reach a level, and
+the balance distribution at the end. Change the constants in rewards.py (or
+pass --set NAME=VALUE) and re-run to see what a tuning change does.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rewards  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("The simulator needs numpy: pip install numpy")
+
+# name: (share of users, rewarded chat events per day, chance of claiming /daily each day)
+# A chat event is a message that lands outside the XP cooldown, so grinders are capped by it.
+PROFILES = {
+    "lurker": (0.50, 2, 0.10),
+    "casual": (0.30, 15, 0.50),
+    "regular": (0.15, 60, 0.85),
+    "grinder": (0.05, 250, 0.98),
+}
+LEVEL_MILESTONES = (5, 10, 20, 30, 50)
+
+
+# --- VECTORIZED FORMULAS ---
+# The same math as rewards.py, on arrays. check_formulas() keeps them in step.
+
+def luck(streak):
+    return np.minimum(1 + rewards.LUCK_PER_WEEK * (streak / 7), rewards.MAX_LUCK)
+
+
+def roll(rng, maximum, chance):
+    low_tier_cap = (maximum * rewards.LOW_TIER_SHARE).astype(np.int64)
+    high = rng.random(maximum.shape) < chance
+    return np.where(high, rng.integers(low_tier_cap + 1, maximum + 1), rng.integers(1, low_tier_cap + 1))
+
+
+def daily_reward(level):
+    return np.minimum(rewards.BASE_DAILY + (level // rewards.DAILY_LEVEL_STEP) * rewards.DAILY_LEVEL_STEP, rewards.MAX_DAILY)
+
+
+def check_formulas():
+    """Fails loudly if the array versions above drift from rewards.py."""
+    levels = np.arange(0, 300)
+    streaks = np.arange(0, 300)
+    assert all(luck(streaks)[n] == rewards.calculate_luck(int(n)) for n in streaks)
+    assert all(daily_reward(levels)[n] == rewards.daily_reward(int(n)) for n in levels)
+    assert all(rewards.BASE_COINS + levels[n] * rewards.PER_LEVEL == rewards.max_coins(int(n)) for n in levels)
+    assert all(rewards.BASE_XP_NEEDED + levels[n] * rewards.XP_NEEDED_PER_LEVEL == rewards.xp_needed(int(n)) for n in levels)
+    # Both rolls have the same high-tier share and stay inside the same range.
+    table = rewards.drop_table(7, 30)
+    rng = np.random.default_rng(0)
+    values = roll(rng, np.full(200000, table.coin_max), table.coin_high_chance)
+    scalar = np.array([table.roll_coins() for _ in range(200000)])
+    for sample in (values, scalar):
+        assert sample.min() >= 1 and sample.max() <= table.coin_max
+        assert abs((sample > table.coin_low_tier_cap).mean() - table.coin_high_chance) < 0.01
+
+
+# --- SIMULATION ---
+
+def simulate(users: int, days: int, seed: int, spend: float):
+    rng = np.random.default_rng(seed)
+    names = list(PROFILES)
+    shares = np.array([PROFILES[name][0] for name in names])
+    profile = rng.choice(len(names), size=users, p=shares / shares.sum())
+    events_per_day = np.array([PROFILES[name][1] for name in names])[profile]
+    daily_chance = np.array([PROFILES[name][2] for name in names])[profile]
+
+    balance = np.zeros(users, dtype=np.int64)
+    level = np.zeros(users, dtype=np.int64)
+    xp = np.zeros(users, dtype=np.int64)
+    streak = np.zeros(users, dtype=np.int64)
+    claimed_yesterday = np.zeros(users, dtype=bool)
+    reached = {milestone: np.full(users, -1) for milestone in LEVEL_MILESTONES}
+
+    supply, minted_chat, minted_daily, spent = [], [], [], []
+    coin_share = rewards.XP_COOLDOWN / rewards.COIN_COOLDOWN
+
+    for day in range(days):
+        # --- DAILY ---
+        claimed = rng.random(users) < daily_chance
+        streak = np.where(claimed, np.where(claimed_yesterday, streak + 1, 1), streak)
+        daily_coins = np.where(claimed, daily_reward(level), 0)
+        claimed_yesterday = claimed
+        balance += daily_coins
+
+        # --- CHAT ---
+        # Every user gets a Poisson number of rewarded messages, rolled one round at a time.
+        events = rng.poisson(events_per_day)
+        chat_coins = np.zeros(users, dtype=np.int64)
+        active = np.flatnonzero(events)
+        round_number = 0
+        while active.size:
+            lvl = level[active]
+            luck_multiplier = luck(streak[active])
+            gained_xp = roll(rng, rewards.BASE_XP + lvl * rewards.PER_LEVEL, np.minimum(rewards.XP_HIGH_TIER_CHANCE * luck_multiplier, 1.0))
+            # The coin cooldown is longer, so only some of these messages also pay coins.
+            pays = rng.random(active.size) < coin_share
+            coins = np.where(pays, roll(rng, rewards.BASE_COINS + lvl * rewards.PER_LEVEL, np.minimum(rewards.COIN_HIGH_TIER_CHANCE * luck_multiplier, 1.0)), 0)
+            chat_coins[active] += coins
+
+            new_xp = xp[active] + gained_xp
+            needed = rewards.BASE_XP_NEEDED + lvl * rewards.XP_NEEDED_PER_LEVEL
+            levelled = new_xp >= needed
+            xp[active] = np.where(levelled, new_xp - needed, new_xp)
+            level[active] = lvl + levelled
+
+            round_number += 1
+            active = active[events[active] > round_number]
+        balance += chat_coins
+
+        # --- SINKS ---
+        spend_today = (balance * spend).astype(np.int64)
+        balance -= spend_today
+
+        for milestone, day_reached in reached.items():
+            day_reached[(day_reached < 0) & (level >= milestone)] = day + 1
+        supply.append(int(balance.sum()))
+        minted_chat.append(int(chat_coins.sum()))
+        minted_daily.append(int(daily_coins.sum()))
+        spent.append(int(spend_today.sum()))
+
+    return {
+        "names": names, "profile": profile, "balance": balance, "level": level, "reached": reached,
+        "supply": np.array(supply), "minted_chat": np.array(minted_chat), "minted_daily": np.array(minted_daily), "spent": np.array(spent),
+    }
+
+
+# --- REPORT ---
+
+def gini(values):
+    values = np.sort(values.astype(np.float64))
+    if values.sum() == 0:
+        return 0.0
+    n = values.size
+    return float((2 * np.arange(1, n + 1) - n - 1).dot(values) / (n * values.sum()))
+
+
+def report(result, users: int, days: int):
+    supply, chat, daily, spent = result["supply"], result["minted_chat"], result["minted_daily"], result["spent"]
+    print(f"\n--- Coin supply ({users:,} users, {days} days) ---")
+    for day in sorted({0, 6, 29, 89, days - 1}):
+        if day >= days:
+            continue
+        growth = (supply[day] / supply[day - 7] - 1) if day >= 7 and supply[day - 7] else float("nan")
+        print(f"day {day + 1:>4}: supply {supply[day]:>15,}  minted {chat[day] + daily[day]:>13,} "
+              f"(chat {chat[day] / max(chat[day] + daily[day], 1):.0%})  spent {spent[day]:>12,}  7-day growth {growth:7.1%}")
+    print(f"coins minted per user per day: {(chat.sum() + daily.sum()) / users / days:,.1f}")
+
+    print("\n--- Days to reach a level (p10 / p50 / p90, share of users that got there) ---")
+    header = "".join(f"{f'level {m}':>24}" for m in LEVEL_MILESTONES)
+    print(f"{'profile':<9}{header}")
+    for n, name in enumerate(result["names"]):
+        mask = result["profile"] == n
+        cells = []
+        for milestone in LEVEL_MILESTONES:
+            days_needed = result["reached"][milestone][mask]
+            days_needed = days_needed[days_needed > 0]
+            if days_needed.size == 0:
+                cells.append(f"{'-':>24}")
+                continue
+            p10, p50, p90 = np.percentile(days_needed, [10, 50, 90])
+            cells.append(f"{f'{p10:.0f}/{p50:.0f}/{p90:.0f} ({days_needed.size / mask.sum():.0%})':>24}")
+        print(f"{name:<9}{''.join(cells)}")
+
+    print("\n--- Balance at the end (p10 / p50 / p90 / p99 / max, mean level) ---")
+    balance = result["balance"]
+    for n, name in enumerate(result["names"]):
+        mask = result["profile"] == n
+        p10, p50, p90, p99 = np.percentile(balance[mask], [10, 50, 90, 99])
+        print(f"{name:<9} {p10:>10,.0f} {p50:>10,.0f} {p90:>10,.0f} {p99:>12,.0f} {balance[mask].max():>12,}  level {result['level'][mask].mean():6.1f}")
+    print(f"{'all':<9} gini {gini(balance):.3f}, top 1% hold {np.sort(balance)[-max(users // 100, 1):].sum() / max(balance.sum(), 1):.0%} of all coins")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spend", type=float, default=0.0, help="share of their balance every user spends per day")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a constant in rewards.py, e.g. --set COIN_HIGH_TIER_CHANCE=0.03")
+    args = parser.parse_args()
+
+    for override in args.set:
+        name, value = override.split("=", 1)
+        if not hasattr(rewards, name):
+            sys.exit(f"rewards.py has no constant {name}")
+        setattr(rewards, name, type(getattr(rewards, name))(value))
+    rewards.reset_drop_tables()
+
+    check_formulas()
+    start = time.perf_counter()
+    result = simulate(args.users, args.days, args.seed, args.spend)
+    elapsed = time.perf_counter() - start
+    report(result, args.users, args.days)
+    print(f"\nsimulated {args.users * args.days:,} user-days in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
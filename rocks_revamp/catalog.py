@@ -0,0 +1,165 @@
+import sys
+import asyncio
+from bisect import bisect_left, bisect_right
+from pagination import make_page
+
+
+class ShopCatalog:
+    """In-memory copy of the shop, per guild: application -> category -> items.
+
+    A guild is loaded with a single query the first time somebody browses it
+    and then kept up to date by DatabaseManager whenever an item is added,
+    edited or deleted, so the /shop menus never have to hit shop.db again.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._guilds = {}       # guild_id -> {application: {category: {item_id: item}}}
+        self._items = {}        # item_id -> item, for every loaded guild
+        self._loading = {}      # guild_id -> future of an in-flight load
+        self._stale = set()     # guilds that changed while they were loading
+        self.hits = 0
+        self.misses = 0
+
+    # --- LOADING ---
+
+    async def _get_guild(self, guild_id: int):
+        tree = self._guilds.get(guild_id)
+        if tree is not None:
+            self.hits += 1
+            return tree
+        self.misses += 1
+        future = self._loading.get(guild_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(guild_id))
+            self._loading[guild_id] = future
+        return await future
+
+    async def _load(self, guild_id: int):
+        try:
+            rows = await self.db._read_shop(guild_id, self.db._get_guild_items_sync, guild_id)
+        finally:
+            self._loading.pop(guild_id, None)
+        tree = {}
+        for item in rows:
+            tree.setdefault(item['application'], {}).setdefault(item['category'], {})[item['item_id']] = item
+        if guild_id in self._stale:
+            # An item changed while we were reading, so this copy may be out of date. Use it once, don't keep it.
+            self._stale.discard(guild_id)
+            return tree
+        self._guilds[guild_id] = tree
+        for item in rows:
+            self._items[item['item_id']] = item
+        return tree
+
+    # --- READS ---
+
+    def is_loaded(self, guild_id: int) -> bool:
+        return guild_id in self._guilds
+
+    async def get_categories(self, guild_id: int, application: str):
+        tree = await self._get_guild(guild_id)
+        return list(tree.get(application, {}).keys())
+
+    async def get_items(self, guild_id: int, application: str, category: str):
+        tree = await self._get_guild(guild_id)
+        return [dict(item) for item in tree.get(application, {}).get(category, {}).values()]
+
+    async def get_items_page(self, guild_id: int, application: str, category: str, after=None, before=None, limit: int = 25):
+        """One page of a category, in item_id order. See pagination.py for the cursors."""
+        tree = await self._get_guild(guild_id)
+        items = tree.get(application, {}).get(category, {})
+        # Categories are kept sorted by item_id, so the cursor can be found with a binary search.
+        ids = list(items)
+        if before is not None:
+            end = bisect_left(ids, before)
+            page_ids = ids[max(0, end - limit - 1):end][::-1]
+        else:
+            start = bisect_right(ids, after) if after is not None else 0
+            page_ids = ids[start:start + limit + 1]
+        return make_page([dict(items[item_id]) for item_id in page_ids], limit, after, before)
+
+    def get_item(self, item_id: int):
+        """Returns a copy of a cached item, or None if its guild isn't loaded (or it doesn't exist)."""
+        item = self._items.get(item_id)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(item)
+
+    # --- KEEPING IT IN SYNC ---
+
+    def item_added(self, item: dict):
+        guild_id = item['guild_id']
+        if guild_id in self._loading:
+            self._stale.add(guild_id)
+        tree = self._guilds.get(guild_id)
+        if tree is None:
+            return
+        item = dict(item)
+        tree.setdefault(item['application'], {}).setdefault(item['category'], {})[item['item_id']] = item
+        self._items[item['item_id']] = item
+
+    def item_updated(self, item_id: int, data: dict):
+        # We don't know the guild of an item that isn't cached, so any in-flight load might be affected.
+        self._stale.update(self._loading.keys())
+        item = self._items.get(item_id)
+        if item is None:
+            return
+        if 'application' in data or 'category' in data or 'guild_id' in data:
+            # The item moves to another branch of the tree.
+            self.item_deleted(item_id)
+            item.update(data)
+            self.item_added(item)
+            self._sort_category(item)
+        else:
+            item.update(data)
+
+    def item_deleted(self, item_id: int):
+        self._stale.update(self._loading.keys())
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        tree = self._guilds.get(item['guild_id'], {})
+        categories = tree.get(item['application'], {})
+        items = categories.get(item['category'], {})
+        items.pop(item_id, None)
+        # Drop branches that became empty so they don't show up in the menus.
+        if not items:
+            categories.pop(item['category'], None)
+        if not categories:
+            tree.pop(item['application'], None)
+
+    def _sort_category(self, item: dict):
+        tree = self._guilds.get(item['guild_id'])
+        if tree is None:
+            return
+        items = tree[item['application']][item['category']]
+        tree[item['application']][item['category']] = dict(sorted(items.items()))
+
+    # --- STATS ---
+
+    def memory_bytes(self) -> int:
+        """Rough size of the cached tree in bytes."""
+        total = sys.getsizeof(self._guilds) + sys.getsizeof(self._items)
+        for tree in self._guilds.values():
+            total += sys.getsizeof(tree)
+            for categories in tree.values():
+                total += sys.getsizeof(categories)
+                for items in categories.values():
+                    total += sys.getsizeof(items)
+                    for item in items.values():
+                        total += sys.getsizeof(item) + sum(sys.getsizeof(value) for value in item.values())
+        return total
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "guilds": len(self._guilds),
+            "items": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "memory_bytes": self.memory_bytes(),
+        }
@@ -1,121 +1,284 @@
-import discord
-from discord.ext import commands
-from discord import app_commands
-import config # Import the config file
-
-class AdminCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
-        self.bot = bot
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        print(f'{self.__class__.__name__} cog has been loaded.')
-
-    # Custom error handler for this cog
-    async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
-        if isinstance(error, app_commands.MissingRole):
-            # Send a specific message if the user is missing the "Admin" role
-            await interaction.response.send_message("This command is for Admins only.", ephemeral=True)
-        else:
-            print(f"An unhandled error occurred in AdminCog: {error}")
-            if not interaction.response.is_done():
-                await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
-            else:
-                await interaction.followup.send("An unexpected error occurred.", ephemeral=True)
-
-    @app_commands.command(name="givecoins", description="[Admin] Give coins to a user.")
-    @app_commands.checks.has_role("Admin")
-    async def givecoins(self, interaction: discord.Interaction, user: discord.User, amount: int):
-        await interaction.response.defer(ephemeral=True)
-        if amount <= 0:
-            await interaction.followup.send("Amount must be positive.", ephemeral=True)
-            return
-        
-        try:    
-            player = await self.bot.db.get_user_data(user.id, interaction.guild.id)
-            new_balance = player['balance'] + amount
-            await self.bot.db.update_user_data(user.id, interaction.guild.id, {"balance": new_balance})
-            await interaction.followup.send(f"Gave {amount:,} coins to {user.mention}. Their new balance is {new_balance:,}.", ephemeral=True)
-        except Exception as e:
-            print(f"Error in /givecoins: {e}")
-            await interaction.followup.send("An error occurred while giving coins.", ephemeral=True)
-
-    @app_commands.command(name="removecoins", description="[Admin] Remove coins from a user.")
-    @app_commands.checks.has_role("Admin")
-    async def removecoins(self, interaction: discord.Interaction, user: discord.User, amount: int):
-        await interaction.response.defer(ephemeral=True)
-        if amount <= 0:
-            await interaction.followup.send("Amount must be positive.", ephemeral=True)
-            return
-
-        try:
-            player = await self.bot.db.get_user_data(user.id, interaction.guild.id)
-            new_balance = max(0, player['balance'] - amount)
-            await self.bot.db.update_user_data(user.id, interaction.guild.id, {"balance": new_balance})
-            await interaction.followup.send(f"Removed {amount:,} coins from {user.mention}. Their new balance is {new_balance:,}.", ephemeral=True)
-        except Exception as e:
-            print(f"Error in /removecoins: {e}")
-            await interaction.followup.send("An error occurred while removing coins.", ephemeral=True)
-
-    @app_commands.command(name="setprice", description="[Admin] Set a new price for an item.")
-    @app_commands.checks.has_role("Admin")
-    async def setprice(self, interaction: discord.Interaction, item_id: int, new_price: int):
-        await interaction.response.defer(ephemeral=True)
-        if new_price < 0:
-            await interaction.followup.send("Price cannot be negative.", ephemeral=True)
-            return
-        
-        try:    
-            await self.bot.db.update_item_details(item_id, {"price": new_price})
-            await interaction.followup.send(f"Updated price for item ID `{item_id}` to **{new_price:,}** coins.", ephemeral=True)
-        except Exception as e:
-            print(f"Error in /setprice: {e}")
-            await interaction.followup.send("An error occurred while setting the price.", ephemeral=True)
-
-    @app_commands.command(name="removeitem", description="[Admin] Remove an item from the shop.")
-    @app_commands.checks.has_role("Admin")
-    async def removeitem(self, interaction: discord.Interaction, item_id: int):
-        await interaction.response.defer(ephemeral=True)
-        try:
-            await self.bot.db.delete_item(item_id)
-            await interaction.followup.send(f"Successfully removed item ID `{item_id}` from the shop.", ephemeral=True)
-        except Exception as e:
-            print(f"Error in /removeitem: {e}")
-            await interaction.followup.send("An error occurred while removing the item.", ephemeral=True)
-
-    @app_commands.command(name="database", description="[Admin] View the structure of the shop database.")
-    @app_commands.checks.has_role("Admin")
-    async def database(self, interaction: discord.Interaction):
-        # Add the channel check
-        if config.DATABASE_VIEW_CHANNEL_ID != 0 and interaction.channel.id != config.DATABASE_VIEW_CHANNEL_ID:
-            channel = self.bot.get_channel(config.DATABASE_VIEW_CHANNEL_ID)
-            await interaction.response.send_message(f"You can only use this command in the {channel.mention} channel.", ephemeral=True)
-            return
-
-        await interaction.response.defer(ephemeral=True)
-        try:
-            schema = await self.bot.db.get_shop_schema()
-            
-            embed = discord.Embed(
-                title="Shop Database Schema (`items` table)",
-                color=discord.Color.dark_grey()
-            )
-            
-            description = "```\n"
-            for column in schema:
-                description += f"Column: {column['name']}\n"
-                description += f"  Type: {column['type']}\n"
-                description += f"  Not Null: {'Yes' if column['notnull'] else 'No'}\n"
-                description += f"  Primary Key: {'Yes' if column['pk'] else 'No'}\n\n"
-            description += "```"
-            
-            embed.description = description
-            await interaction.followup.send(embed=embed)
-
-        except Exception as e:
-            print(f"Error in /database command: {e}")
-            await interaction.followup.send("An error occurred while fetching the database schema.", ephemeral=True)
-
-
-async def setup(bot: commands.Bot):
-    await bot.add_cog(AdminCog(bot))
+import discord
+from discord.ext import commands
+from discord import app_commands
+import config # Import the config file
+import perf
+import ledger
+import time
+
+async def item_id_choices(bot: commands.Bot, guild_id: int, current) -> list:
+    """Autocomplete for an item_id argument: the best matching items by name, the value is their ID."""
+    try:
+        items = await bot.db.search_items(guild_id, str(current), limit=25)
+    except Exception as e:
+        print(f"Error in item autocomplete: {e}")
+        return []
+    choices = []
+    for item in items:
+        suffix = f" #{item['item_id']}"
+        label = f"{item['item_name']} - {item['application']} / {item['category']} ({item['price']:,} coins)"
+        choices.append(app_commands.Choice(name=label[:100 - len(suffix)] + suffix, value=item['item_id']))
+    return choices
+
+
+class AdminCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        print(f'{self.__class__.__name__} cog has been loaded.')
+
+    # Custom error handler for this cog
+    async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.MissingRole):
+            # Send a specific message if the user is missing the "Admin" role
+            await interaction.response.send_message("This command is for Admins only.", ephemeral=True)
+        else:
+            print(f"An unhandled error occurred in AdminCog: {error}")
+            if not interaction.response.is_done():
+                await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
+            else:
+                await interaction.followup.send("An unexpected error occurred.", ephemeral=True)
+
+    @app_commands.command(name="givecoins", description="[Admin] Give coins to a user.")
+    @app_commands.checks.has_role("Admin")
+    async def givecoins(self, interaction: discord.Interaction, user: discord.User, amount: int):
+        await interaction.response.defer(ephemeral=True)
+        if amount <= 0:
+            await interaction.followup.send("Amount must be positive.", ephemeral=True)
+            return
+        
+        try:    
+            new_balance = await self.bot.db.add_balance(user.id, interaction.guild.id, amount, reason=ledger.ADMIN_GIVE)
+            await interaction.followup.send(f"Gave {amount:,} coins to {user.mention}. Their new balance is {new_balance:,}.", ephemeral=True)
+        except Exception as e:
+            print(f"Error in /givecoins: {e}")
+            await interaction.followup.send("An error occurred while giving coins.", ephemeral=True)
+
+    @app_commands.command(name="removecoins", description="[Admin] Remove coins from a user.")
+    @app_commands.checks.has_role("Admin")
+    async def removecoins(self, interaction: discord.Interaction, user: discord.User, amount: int):
+        await interaction.response.defer(ephemeral=True)
+        if amount <= 0:
+            await interaction.followup.send("Amount must be positive.", ephemeral=True)
+            return
+
+        try:
+            new_balance = await self.bot.db.remove_balance(user.id, interaction.guild.id, amount, reason=ledger.ADMIN_REMOVE)
+            await interaction.followup.send(f"Removed {amount:,} coins from {user.mention}. Their new balance is {new_balance:,}.", ephemeral=True)
+        except Exception as e:
+            print(f"Error in /removecoins: {e}")
+            await interaction.followup.send("An error occurred while removing coins.", ephemeral=True)
+
+    @app_commands.command(name="setprice", description="[Admin] Set a new price for an item.")
+    @app_commands.checks.has_role("Admin")
+    async def setprice(self, interaction: discord.Interaction, item_id: int, new_price: int):
+        await interaction.response.defer(ephemeral=True)
+        if new_price < 0:
+            await interaction.followup.send("Price cannot be negative.", ephemeral=True)
+            return
+        
+        try:    
+            await self.bot.db.update_item_details(item_id, {"price": new_price})
+            await interaction.followup.send(f"Updated price for item ID `{item_id}` to **{new_price:,}** coins.", ephemeral=True)
+        except Exception as e:
+            print(f"Error in /setprice: {e}")
+            await interaction.followup.send("An error occurred while setting the price.", ephemeral=True)
+
+    @app_commands.command(name="removeitem", description="[Admin] Remove an item from the shop.")
+    @app_commands.checks.has_role("Admin")
+    async def removeitem(self, interaction: discord.Interaction, item_id: int):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await self.bot.db.delete_item(item_id)
+            await interaction.followup.send(f"Successfully removed item ID `{item_id}` from the shop.", ephemeral=True)
+        except Exception as e:
+            print(f"Error in /removeitem: {e}")
+            await interaction.followup.send("An error occurred while removing the item.", ephemeral=True)
+
+    @setprice.autocomplete("item_id")
+    @removeitem.autocomplete("item_id")
+    async def item_id_autocomplete(self, interaction: discord.Interaction, current: str):
+        return await item_id_choices(self.bot, interaction.guild.id, current)
+
+    @app_commands.command(name="database", description="[Admin] View the structure of the shop database.")
+    @app_commands.checks.has_role("Admin")
+    async def database(self, interaction: discord.Interaction):
+        # Add the channel check
+        if config.DATABASE_VIEW_CHANNEL_ID != 0 and interaction.channel.id != config.DATABASE_VIEW_CHANNEL_ID:
+            channel = self.bot.get_channel(config.DATABASE_VIEW_CHANNEL_ID)
+            await interaction.response.send_message(f"You can only use this command in the {channel.mention} channel.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            schema = await self.bot.db.get_shop_schema()
+            
+            embed = discord.Embed(
+                title="Shop Database Schema (`items` table)",
+                color=discord.Color.dark_grey()
+            )
+            
+            description = "```\n"
+            for column in schema:
+                description += f"Column: {column['name']}\n"
+                description += f"  Type: {column['type']}\n"
+                description += f"  Not Null: {'Yes' if column['notnull'] else 'No'}\n"
+                description += f"  Primary Key: {'Yes' if column['pk'] else 'No'}\n\n"
+            description += "```"
+            
+            embed.description = description
+            await interaction.followup.send(embed=embed)
+
+        except Exception as e:
+            print(f"Error in /database command: {e}")
+            await interaction.followup.send("An error occurred while fetching the database schema.", ephemeral=True)
+
+    @app_commands.command(name="perf", description="[Admin] Show the slowest commands and database calls.")
+    @app_commands.describe(sort="Which statistic to rank by", export="Also write every metric to a local file")
+    @app_commands.choices(
+        sort=[
+            app_commands.Choice(name="p95", value="p95"),
+            app_commands.Choice(name="p99", value="p99"),
+            app_commands.Choice(name="Max", value="max"),
+            app_commands.Choice(name="Total time", value="total"),
+        ],
+        export=[
+            app_commands.Choice(name="JSON", value="json"),
+            app_commands.Choice(name="Prometheus", value="prometheus"),
+        ]
+    )
+    @app_commands.checks.has_role("Admin")
+    async def perf_report(self, interaction: discord.Interaction, sort: app_commands.Choice[str] = None, export: app_commands.Choice[str] = None):
+        key = sort.value if sort else "p95"
+        top = perf.metrics.top(limit=15, key=key)
+        if not top:
+            await interaction.response.send_message("No metrics recorded yet.", ephemeral=True)
+            return
+
+        lines = [f"{'operation':<34} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8}"]
+        for name, stats in top:
+            lines.append(
+                f"{name[:34]:<34} {stats['count']:>6} {stats['p50'] * 1000:>6.1f}ms "
+                f"{stats['p95'] * 1000:>6.1f}ms {stats['max'] * 1000:>6.1f}ms"
+            )
+        embed = discord.Embed(
+            title=f"Slowest Operations by {key} (last {perf.WINDOW_COUNT * perf.WINDOW_SECONDS // 60} min)",
+            description="```\n" + "\n".join(lines) + "\n```",
+            color=discord.Color.dark_grey()
+        )
+        if export:
+            try:
+                filename = perf.export(config.PERF_EXPORT_PATH, export.value)
+                embed.set_footer(text=f"Exported all metrics to {filename}")
+            except OSError as e:
+                print(f"Error in /perf export: {e}")
+                embed.set_footer(text="Exporting the metrics failed.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="sqltrace", description="[Admin] Turn SQL tracing on or off, or see the slowest statements.")
+    @app_commands.choices(
+        action=[
+            app_commands.Choice(name="Report", value="report"),
+            app_commands.Choice(name="Turn on", value="on"),
+            app_commands.Choice(name="Turn off", value="off"),
+            app_commands.Choice(name="Export to file", value="export"),
+            app_commands.Choice(name="Reset", value="reset"),
+        ]
+    )
+    @app_commands.checks.has_role("Admin")
+    async def sqltrace(self, interaction: discord.Interaction, action: app_commands.Choice[str]):
+        tracer = self.bot.db.tracer
+        if tracer is None:
+            # Running as several processes, the SQL runs in the storage process (see storage_service.py).
+            await interaction.response.send_message("SQL tracing runs in the storage process, turn it on in its config.py.", ephemeral=True)
+            return
+        if action.value == "on":
+            tracer.enabled = True
+            await interaction.response.send_message(f"SQL tracing is on. Statements over {tracer.slow_seconds * 1000:g} ms are logged.", ephemeral=True)
+        elif action.value == "off":
+            tracer.enabled = False
+            await interaction.response.send_message("SQL tracing is off.", ephemeral=True)
+        elif action.value == "reset":
+            tracer.reset()
+            await interaction.response.send_message("SQL trace statistics cleared.", ephemeral=True)
+        elif action.value == "export":
+            try:
+                tracer.export(config.SQL_TRACE_EXPORT_PATH)
+                await interaction.response.send_message(f"Exported SQL trace to `{config.SQL_TRACE_EXPORT_PATH}`.", ephemeral=True)
+            except OSError as e:
+                print(f"Error in /sqltrace export: {e}")
+                await interaction.response.send_message("Exporting the SQL trace failed.", ephemeral=True)
+        else:
+            top = tracer.top(limit=10)
+            if not top:
+                state = "on" if tracer.enabled else "off"
+                await interaction.response.send_message(f"No statements traced yet (tracing is {state}).", ephemeral=True)
+                return
+            embed = discord.Embed(title="Slowest SQL Statements by Total Time", color=discord.Color.dark_grey())
+            for row in top:
+                embed.add_field(
+                    name=f"{row['calls']:,} calls, {row['total_ms']:,.1f} ms total, {row['max_ms']:,.1f} ms max",
+                    value=f"```sql\n{row['sql'][:900]}\n```",
+                    inline=False
+                )
+            slow = tracer.slow_queries()
+            embed.set_footer(text=f"Tracing is {'on' if tracer.enabled else 'off'}. {len(slow)} slow queries logged.")
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="backup", description="[Admin] Back up the databases now and show how long it took.")
+    @app_commands.checks.has_role("Admin")
+    async def backup(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            manifest = await self.bot.db.backup()
+        except Exception as e:
+            # Also when one is already running, the message says so.
+            print(f"Error in /backup: {e}")
+            await interaction.followup.send(f"The backup failed: {e}", ephemeral=True)
+            return
+        files = manifest['files']
+        embed = discord.Embed(title="Backup Complete", description=f"`{manifest['path']}`", color=discord.Color.green())
+        embed.add_field(name="Duration", value=f"{manifest['seconds']:.2f}s", inline=True)
+        embed.add_field(name="Files", value=f"{len(files)}, all passed integrity_check", inline=True)
+        embed.add_field(name="Size", value=f"{manifest['bytes'] / 1e6:,.1f} MB, {manifest['compressed_bytes'] / 1e6:,.1f} MB compressed", inline=True)
+        slowest = max(files, key=lambda f: f['seconds'])
+        embed.set_footer(text=f"Slowest file: {slowest['file']} ({slowest['seconds']:.2f}s). "
+                              f"{len(manifest['removed'])} old snapshot(s) removed, keeping {config.BACKUP_KEEP}.")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="ledger", description="[Admin] Show a user's recent coin history, or where the server's coins came from.")
+    @app_commands.describe(user="Whose history to show. Leave empty for the whole server", days="How many days back the server summary goes")
+    @app_commands.checks.has_role("Admin")
+    async def ledger_report(self, interaction: discord.Interaction, user: discord.User = None, days: app_commands.Range[int, 1, 90] = 7):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            if user:
+                entries = await self.bot.db.get_ledger_entries(user.id, interaction.guild.id, limit=15)
+                if not entries:
+                    await interaction.followup.send(f"{user.mention} has no recorded coin changes.", ephemeral=True)
+                    return
+                lines = [
+                    f"<t:{int(entry['created_at'])}:R> **{entry['amount']:+,}** {entry['reason']}"
+                    + (f" (#{entry['reference']})" if entry['reference'] else "")
+                    for entry in entries
+                ]
+                embed = discord.Embed(title=f"Coin History for {user.display_name}", description="\n".join(lines), color=discord.Color.dark_grey())
+            else:
+                flow = await self.bot.db.get_coin_flow(interaction.guild.id, time.time() - days * 86400)
+                if not flow:
+                    await interaction.followup.send(f"No coin changes in the last {days} days.", ephemeral=True)
+                    return
+                embed = discord.Embed(title=f"Coin Flow (last {days} days)", color=discord.Color.dark_grey())
+                for row in flow:
+                    embed.add_field(name=row['reason'], value=f"{row['total']:+,} coins\n{row['entries']:,} changes", inline=True)
+                embed.set_footer(text=f"Net change: {sum(row['total'] for row in flow):+,} coins")
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        except Exception as e:
+            print(f"Error in /ledger: {e}")
+            await interaction.followup.send("An error occurred while reading the ledger.", ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(AdminCog(bot))
@@ -1,161 +1,197 @@
-import discord
-from discord.ext import commands
-from discord import app_commands
-import time
-import random
-
-def calculate_luck(streak: int) -> float:
-    """Calculates the luck multiplier based on the daily streak."""
-    luck_multiplier = 1 + (0.5 * (streak / 7))
-    return min(luck_multiplier, 10.0)
-
-class EconomyCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
-        self.bot = bot
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        print(f'{self.__class__.__name__} cog has been loaded.')
-
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        # Ignore slash command interactions, bots, and DMs
-        if message.interaction is not None or message.author.bot or not message.guild:
-            return
-
-        user_id = message.author.id
-        guild_id = message.guild.id
-        current_time = time.time()
-        
-        try:
-            player = await self.bot.db.get_user_data(user_id, guild_id)
-            
-            # This dictionary will hold all the data we need to update in a single database call.
-            data_to_update = {}
-            
-            # --- COIN REWARD LOGIC ---
-            if current_time - player['last_coin_claim'] > 25:
-                luck_multiplier = calculate_luck(player['daily_streak'])
-                max_coins = 20 + (player['level'] * 5)
-                low_tier_cap = int(max_coins * 0.80)
-                high_tier_chance = min(0.05 * luck_multiplier, 1.0)
-                
-                coins_earned = random.randint(low_tier_cap + 1, max_coins) if random.random() < high_tier_chance else random.randint(1, low_tier_cap)
-                
-                data_to_update['balance'] = player['balance'] + coins_earned
-                data_to_update['last_coin_claim'] = current_time
-                print(f"{message.author.name} earned {coins_earned} coins.")
-
-            # --- XP REWARD LOGIC ---
-            if current_time - player['last_xp_claim'] > 20:
-                luck_multiplier = calculate_luck(player['daily_streak'])
-                max_xp = 25 + (player['level'] * 5)
-                low_tier_cap = int(max_xp * 0.80)
-                high_tier_chance = min(0.20 * luck_multiplier, 1.0)
-
-                xp_earned = random.randint(low_tier_cap + 1, max_xp) if random.random() < high_tier_chance else random.randint(1, low_tier_cap)
-                
-                new_xp = player['xp'] + xp_earned
-                xp_needed = 100 + (player['level'] * 50)
-                
-                if new_xp >= xp_needed:
-                    new_level = player['level'] + 1
-                    xp_after_levelup = new_xp - xp_needed
-                    data_to_update['xp'] = xp_after_levelup
-                    data_to_update['level'] = new_level
-                    await message.channel.send(f"🎉 Congratulations {message.author.mention}, you have reached **Level {new_level}**!")
-                else:
-                    data_to_update['xp'] = new_xp
-                
-                data_to_update['last_xp_claim'] = current_time
-                print(f"{message.author.name} gained {xp_earned} XP.")
-
-            # --- SINGLE DATABASE UPDATE ---
-            # If there's anything to update, do it all at once.
-            if data_to_update:
-                await self.bot.db.update_user_data(user_id, guild_id, data_to_update)
-
-        except Exception as e:
-            print(f"Error in on_message economy processing for {message.author.name}: {e}")
-
-    @app_commands.command(name="balance", description="Check your current coin balance.")
-    async def balance(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
-        embed = discord.Embed(
-            title="💰 Your Balance",
-            description=f"You currently have **{player['balance']:,}** coins.",
-            color=discord.Color.gold()
-        )
-        await interaction.followup.send(embed=embed)
-
-    @app_commands.command(name="lvl", description="Check your current level and XP.")
-    async def lvl(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
-        level, xp = player['level'], player['xp']
-        xp_needed = 100 + (level * 50)
-        
-        embed = discord.Embed(title="📈 Your Level", color=discord.Color.blue())
-        embed.add_field(name="Level", value=f"**{level}**", inline=True)
-        embed.add_field(name="XP", value=f"**{xp:,} / {xp_needed:,}**", inline=True)
-        
-        progress = min(xp / xp_needed, 1.0)
-        bar = '🟩' * int(20 * progress) + '⬛' * (20 - int(20 * progress))
-        embed.add_field(name="Progress", value=f"`{bar}`", inline=False)
-        await interaction.followup.send(embed=embed)
-
-    @app_commands.command(name="droprates", description="View your current drop rates for coins and XP.")
-    async def droprates(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        
-        try:
-            player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
-            
-            # --- Calculations ---
-            level = player['level']
-            streak = player['daily_streak']
-            
-            luck_multiplier = calculate_luck(streak)
-            
-            # Coin calculations
-            max_coins = 20 + (level * 5)
-            base_high_tier_chance_coin = 0.05 # 5%
-            final_high_tier_chance_coin = min(base_high_tier_chance_coin * luck_multiplier, 1.0)
-
-            # XP calculations
-            max_xp = 25 + (level * 5)
-            base_high_tier_chance_xp = 0.20 # 20%
-            final_high_tier_chance_xp = min(base_high_tier_chance_xp * luck_multiplier, 1.0)
-            
-            # --- Create Embed ---
-            embed = discord.Embed(
-                title="💧 Your Drop Rates",
-                description=f"Your rewards are based on your **Level {level}** and **{luck_multiplier:.2f}x Luck Multiplier**.",
-                color=discord.Color.teal()
-            )
-            
-            embed.add_field(
-                name="💰 Coin Drops",
-                value=f"**Range:** 1 - {max_coins} coins\n"
-                      f"**High-Tier Chance:** {final_high_tier_chance_coin:.1%}",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="📈 XP Gains",
-                value=f"**Range:** 1 - {max_xp} XP\n"
-                      f"**High-Tier Chance:** {final_high_tier_chance_xp:.1%}",
-                inline=True
-            )
-            
-            embed.set_footer(text="Increase your level and daily streak to improve your rewards!")
-            
-            await interaction.followup.send(embed=embed)
-            
-        except Exception as e:
-            print(f"Error in /droprates command: {e}")
-            await interaction.followup.send("An error occurred while fetching your drop rates.", ephemeral=True)
-
-async def setup(bot: commands.Bot):
-    await bot.add_cog(EconomyCog(bot))
+import discord
+from discord.ext import commands
+from discord import app_commands
+import time
+import config
+import rewards
+from rewards import COIN_COOLDOWN, XP_COOLDOWN
+
+class EconomyCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        print(f'{self.__class__.__name__} cog has been loaded.')
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # Ignore slash command interactions, bots, and DMs
+        if message.interaction is not None or message.author.bot or not message.guild:
+            return
+
+        user_id = message.author.id
+        guild_id = message.guild.id
+        current_time = time.time()
+
+        # Most messages land inside both reward windows, skip those without touching the database.
+        if self.bot.db.cooldowns.is_on_cooldown(user_id, guild_id, current_time):
+            return
+        
+        try:
+            player = await self.bot.db.get_user_data(user_id, guild_id)
+            
+            # This dictionary will hold all the data we need to update in a single cache write.
+            data_to_update = {}
+            coins_earned = 0
+            new_level = None
+            
+            # --- COIN REWARD LOGIC ---
+            # Caps and tier chances for this level and streak are precomputed, see rewards.drop_table.
+            drops = rewards.drop_table(player['level'], player['daily_streak'])
+
+            if current_time - player['last_coin_claim'] > COIN_COOLDOWN:
+                coins_earned = drops.roll_coins()
+                data_to_update['last_coin_claim'] = current_time
+                print(f"{message.author.name} earned {coins_earned} coins.")
+
+            # --- XP REWARD LOGIC ---
+            if current_time - player['last_xp_claim'] > XP_COOLDOWN:
+                xp_earned = drops.roll_xp()
+                level, xp = rewards.add_xp(player['level'], player['xp'], xp_earned)
+                if level != player['level']:
+                    new_level = level
+                    data_to_update['level'] = new_level
+                data_to_update['xp'] = xp
+                data_to_update['last_xp_claim'] = current_time
+                print(f"{message.author.name} gained {xp_earned} XP.")
+
+            # --- SINGLE CACHE UPDATE ---
+            # Rewards are applied in memory right away and written to the database in batches.
+            if data_to_update:
+                self.bot.db.accrue_user_rewards(user_id, guild_id, coins_earned, data_to_update)
+
+            # Remember when this user can next earn anything.
+            self.bot.db.cooldowns.record(
+                user_id, guild_id,
+                data_to_update.get('last_coin_claim', player['last_coin_claim']) + COIN_COOLDOWN,
+                data_to_update.get('last_xp_claim', player['last_xp_claim']) + XP_COOLDOWN,
+                current_time
+            )
+
+            if new_level is not None:
+                # Level-ups go to their own channel if one is set, and a burst of them is sent as one message.
+                channel = self.bot.get_channel(config.LEVEL_UP_CHANNEL_ID) if config.LEVEL_UP_CHANNEL_ID != 0 else None
+                self.bot.outbound.post(
+                    channel or message.channel,
+                    f"🎉 Congratulations {message.author.mention}, you have reached **Level {new_level}**!",
+                    merge_key="level_up"
+                )
+
+        except Exception as e:
+            print(f"Error in on_message economy processing for {message.author.name}: {e}")
+
+    @app_commands.command(name="balance", description="Check your current coin balance.")
+    async def balance(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
+        embed = discord.Embed(
+            title="💰 Your Balance",
+            description=f"You currently have **{player['balance']:,}** coins.",
+            color=discord.Color.gold()
+        )
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="lvl", description="Check your current level and XP.")
+    async def lvl(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
+        level, xp = player['level'], player['xp']
+        xp_needed = rewards.xp_needed(level)
+        
+        embed = discord.Embed(title="📈 Your Level", color=discord.Color.blue())
+        embed.add_field(name="Level", value=f"**{level}**", inline=True)
+        embed.add_field(name="XP", value=f"**{xp:,} / {xp_needed:,}**", inline=True)
+        
+        progress = min(xp / xp_needed, 1.0)
+        bar = '🟩' * int(20 * progress) + '⬛' * (20 - int(20 * progress))
+        embed.add_field(name="Progress", value=f"`{bar}`", inline=False)
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(name="droprates", description="View your current drop rates for coins and XP.")
+    async def droprates(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        
+        try:
+            player = await self.bot.db.get_user_data(interaction.user.id, interaction.guild.id)
+            
+            # --- Calculations ---
+            level = player['level']
+            streak = player['daily_streak']
+            
+            # The same table on_message rolls from, so this always shows the real rates.
+            drops = rewards.drop_table(level, streak)
+            luck_multiplier = drops.luck
+            
+            # Coin calculations
+            max_coins = drops.coin_max
+            final_high_tier_chance_coin = drops.coin_high_chance
+
+            # XP calculations
+            max_xp = drops.xp_max
+            final_high_tier_chance_xp = drops.xp_high_chance
+            
+            # --- Create Embed ---
+            embed = discord.Embed(
+                title="💧 Your Drop Rates",
+                description=f"Your rewards are based on your **Level {level}** and **{luck_multiplier:.2f}x Luck Multiplier**.",
+                color=discord.Color.teal()
+            )
+            
+            embed.add_field(
+                name="💰 Coin Drops",
+                value=f"**Range:** 1 - {max_coins} coins\n"
+                      f"**High-Tier Chance:** {final_high_tier_chance_coin:.1%}",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="📈 XP Gains",
+                value=f"**Range:** 1 - {max_xp} XP\n"
+                      f"**High-Tier Chance:** {final_high_tier_chance_xp:.1%}",
+                inline=True
+            )
+            
+            embed.set_footer(text="Increase your level and daily streak to improve your rewards!")
+            
+            await interaction.followup.send(embed=embed)
+            
+        except Exception as e:
+            print(f"Error in /droprates command: {e}")
+            await interaction.followup.send("An error occurred while fetching your drop rates.", ephemeral=True)
+
+    @app_commands.command(name="leaderboard", description="See the top users of this server.")
+    @app_commands.describe(board="What to rank users by")
+    @app_commands.choices(board=[
+        app_commands.Choice(name="Coins", value="balance"),
+        app_commands.Choice(name="Level", value="level"),
+        app_commands.Choice(name="Daily Streak", value="streak"),
+    ])
+    async def leaderboard(self, interaction: discord.Interaction, board: app_commands.Choice[str] = None):
+        await interaction.response.defer()
+        metric = board.value if board else "balance"
+        try:
+            top = await self.bot.db.get_leaderboard(interaction.guild.id, metric, limit=10)
+            rank = await self.bot.db.get_rank(interaction.user.id, interaction.guild.id, metric)
+
+            medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+            lines = []
+            for position, (user_id, score) in enumerate(top, start=1):
+                if metric == "balance":
+                    value = f"{score[0]:,} coins"
+                elif metric == "level":
+                    value = f"Level {score[0]} ({score[1]:,} XP)"
+                else:
+                    value = f"{score[0]} day streak"
+                lines.append(f"{medals.get(position, f'**#{position}**')} <@{user_id}> - {value}")
+
+            title = {"balance": "💰 Richest Users", "level": "📈 Highest Levels", "streak": "🔥 Longest Daily Streaks"}[metric]
+            embed = discord.Embed(title=title, description="\n".join(lines) or "Nobody is on this leaderboard yet.", color=discord.Color.gold())
+            embed.set_footer(text=f"Your rank: #{rank:,}")
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            print(f"Error in /leaderboard command: {e}")
+            await interaction.followup.send("An error occurred while fetching the leaderboard.", ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(EconomyCog(bot))
@@ -1,12 +1,73 @@
-# --- Server Configuration ---
-# Replace these 0s with the actual Channel IDs from your Discord server.
-# To get a Channel ID, right-click the channel in Discord and select "Copy Channel ID".
-# You may need to enable Developer Mode in your Discord settings first (Settings > Advanced).
-
-SHOP_CHANNEL_ID = 1404746674685087796
-PURCHASE_LOG_CHANNEL_ID = 1404746796151865456
-ADMIN_LOG_CHANNEL_ID = 1404760236136333412
-UPLOAD_CHANNEL_ID = 1404772681412382720
-NEW_ITEM_LOG_CHANNEL_ID = 1404776837447680110
-DATABASE_VIEW_CHANNEL_ID = 1404798157669400777
-LEVEL_UP_CHANNEL_ID = 1404875669921333309
\ No newline at end of file
+# --- Server Configuration ---
+# Replace these 0s with the actual Channel IDs from your Discord server.
+# To get a Channel ID, right-click the channel in Discord and select "Copy Channel ID".
+# You may need to enable Developer Mode in your Discord settings first (Settings > Advanced).
+
+SHOP_CHANNEL_ID = 1404746674685087796
+PURCHASE_LOG_CHANNEL_ID = 1404746796151865456
+ADMIN_LOG_CHANNEL_ID = 1404760236136333412
+UPLOAD_CHANNEL_ID = 1404772681412382720
+NEW_ITEM_LOG_CHANNEL_ID = 1404776837447680110
+DATABASE_VIEW_CHANNEL_ID = 1404798157669400777
+LEVEL_UP_CHANNEL_ID = 1404875669921333309
+
+# --- Performance Metrics ---
+# Latency of commands, database calls and Discord requests is kept in memory and shown by /perf.
+PERF_METRICS_ENABLED = True
+# Where /perf export writes to. ".json" or ".prom" is added to the name.
+PERF_EXPORT_PATH = "perf_metrics"
+# Write the metrics out on their own every this many seconds. 0 turns it off.
+PERF_EXPORT_INTERVAL = 0
+# "json" or "prometheus", used by the automatic export.
+PERF_EXPORT_FORMAT = "json"
+
+# --- SQL Tracing ---
+# Record every SQL statement the bot runs. Can also be switched at runtime with /sqltrace.
+SQL_TRACE_ENABLED = False
+# Statements slower than this (in milliseconds) are logged with their query plan while tracing.
+SLOW_QUERY_MS = 50
+# Where /sqltrace export writes the statement statistics.
+SQL_TRACE_EXPORT_PATH = "sql_trace.json"
+
+# --- Database ---
+# How database calls are run, see storage.py. "threaded" (a read pool and one writer thread)
+# or "async" (one connection and thread per database file).
+DATABASE_BACKEND = "threaded"
+
+# --- Database Partitioning ---
+# None keeps every guild in economy.db and shop.db. "guild" gives each guild files of its own,
+# "hash" spreads the guilds over DATABASE_PARTITION_BUCKETS pairs of files. See partitions.py,
+# existing files are split with: python partitions.py split --mode guild
+DATABASE_PARTITIONING = None
+DATABASE_PARTITION_BUCKETS = 16
+# Next to economy.db.
+DATABASE_PARTITION_DIR = "partitions"
+# Partitions idle longer than the others are closed once this many are open.
+DATABASE_MAX_OPEN_PARTITIONS = 64
+
+# --- Coin Ledger ---
+# Every balance change is recorded in the ledger table of economy.db, see ledger.py.
+# How often old entries are compacted, in seconds. 0 turns compaction off.
+LEDGER_COMPACT_INTERVAL = 3600
+# Entries younger than this many days are kept in economy.db.
+LEDGER_RETENTION_DAYS = 30
+# Older entries are copied to this file before they are deleted. Empty to just delete them.
+LEDGER_ARCHIVE_PATH = "ledger_archive.db"
+
+# --- Backups ---
+# Compressed snapshots of economy.db and shop.db (and the partitions, if any), see backups.py.
+BACKUP_DIR = "backups"
+# Seconds between scheduled backups. 0 turns the schedule off, /backup still works.
+BACKUP_INTERVAL = 6 * 3600
+# How many snapshots are kept, older ones are deleted.
+BACKUP_KEEP = 8
+
+# --- Startup ---
+# Hash of the last command tree synced to Discord. Commands are only synced again when it changes.
+# Delete the file to force a sync.
+COMMAND_SYNC_HASH_PATH = "command_tree.sha256"
+
+# --- Sharding ---
+# Used when the bot runs as several processes (see launcher.py). One storage process owns
+# economy.db and shop.db and the bot processes reach it through this Unix socket.
+STORAGE_SOCKET_PATH = "rocks_storage.sock"
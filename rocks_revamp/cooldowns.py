@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+# Upper bound on tracked (user, guild) pairs. Each entry is two floats.
+MAX_COOLDOWN_ENTRIES = 100000
+
+
+class CooldownIndex:
+    """Next-eligible reward timestamps per (user_id, guild_id).
+
+    Lets on_message drop a message that is inside both the coin and the XP
+    window without loading the user at all. Entries are filled lazily after a
+    message has been processed and expire on their own once both windows have
+    passed, the oldest ones are also dropped when the index is full.
+    """
+
+    def __init__(self, max_entries: int = MAX_COOLDOWN_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0       # Messages rejected straight from the index.
+        self.misses = 0     # Messages that had to go on to the database.
+        self.evictions = 0
+
+    def is_on_cooldown(self, user_id: int, guild_id: int, now: float) -> bool:
+        """True if neither a coin nor an XP reward can be earned at `now`."""
+        key = (user_id, guild_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            next_coin, next_xp = entry
+            if now <= next_coin and now <= next_xp:
+                self.hits += 1
+                return True
+            if now > next_coin and now > next_xp:
+                # Both windows are over, the entry has nothing left to say.
+                del self._entries[key]
+        self.misses += 1
+        return False
+
+    def record(self, user_id: int, guild_id: int, next_coin: float, next_xp: float, now: float):
+        """Stores when the user can next earn coins and XP."""
+        key = (user_id, guild_id)
+        self._entries[key] = (next_coin, next_xp)
+        self._entries.move_to_end(key)
+        self._evict(now)
+
+    def forget(self, user_id: int, guild_id: int):
+        """Drops the entry, e.g. after the claim timestamps were written directly."""
+        self._entries.pop((user_id, guild_id), None)
+
+    def _evict(self, now: float):
+        # Entries are kept in the order they were recorded, so expired ones collect at the front.
+        while self._entries:
+            key, (next_coin, next_xp) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and max(next_coin, next_xp) >= now:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
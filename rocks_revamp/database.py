@@ -1,168 +1,623 @@
-import sqlite3
-import functools
-from discord.ext import commands
-
-# This class now manages two separate database files.
-class DatabaseManager:
-    def __init__(self, bot: commands.Bot):
-        self.bot = bot
-        self.economy_db_path = "economy.db"
-        self.shop_db_path = "shop.db"
-        # Initialize both databases on startup.
-        self._init_sync()
-
-    def _run_sync(self, func, *args, **kwargs):
-        """Helper to run a synchronous function in a non-blocking way."""
-        partial_func = functools.partial(func, *args, **kwargs)
-        return self.bot.loop.run_in_executor(None, partial_func)
-
-    def _init_sync(self):
-        """Initializes both databases."""
-        # Initialize economy.db
-        with sqlite3.connect(self.economy_db_path) as con:
-            cur = con.cursor()
-            cur.execute("PRAGMA journal_mode=WAL")
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
-                    balance INTEGER DEFAULT 0, xp INTEGER DEFAULT 0, level INTEGER DEFAULT 0,
-                    last_daily TEXT, daily_streak INTEGER DEFAULT 0,
-                    last_coin_claim REAL DEFAULT 0, last_xp_claim REAL DEFAULT 0,
-                    daily_spam_count INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, guild_id)
-                )
-            """)
-        print("Economy database initialized successfully.")
-
-        # Initialize shop.db
-        with sqlite3.connect(self.shop_db_path) as con:
-            cur = con.cursor()
-            cur.execute("PRAGMA journal_mode=WAL")
-            # Add the new screenshot_link columns
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS items (
-                    item_id INTEGER PRIMARY KEY AUTOINCREMENT, creator_id INTEGER NOT NULL,
-                    guild_id INTEGER NOT NULL, item_name TEXT NOT NULL, application TEXT NOT NULL,
-                    category TEXT NOT NULL, price INTEGER NOT NULL, product_link TEXT NOT NULL,
-                    screenshot_link TEXT,
-                    screenshot_link_2 TEXT,
-                    screenshot_link_3 TEXT
-                )
-            """)
-        print("Shop database initialized successfully.")
-
-    # --- USER ECONOMY FUNCTIONS (economy.db) ---
-
-    def _get_user_data_sync(self, user_id: int, guild_id: int):
-        with sqlite3.connect(self.economy_db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
-            user_data = cur.fetchone()
-            if not user_data:
-                cur.execute("INSERT INTO users (user_id, guild_id) VALUES (?, ?)", (user_id, guild_id))
-                con.commit()
-                cur.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
-                user_data = cur.fetchone()
-            return dict(user_data)
-
-    async def get_user_data(self, user_id: int, guild_id: int):
-        return await self._run_sync(self._get_user_data_sync, user_id, guild_id)
-
-    def _update_user_data_sync(self, user_id: int, guild_id: int, data: dict):
-        with sqlite3.connect(self.economy_db_path) as con:
-            cur = con.cursor()
-            set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
-            values = list(data.values()) + [user_id, guild_id]
-            query = f"UPDATE users SET {set_clause} WHERE user_id = ? AND guild_id = ?"
-            cur.execute(query, tuple(values))
-            con.commit()
-
-    async def update_user_data(self, user_id: int, guild_id: int, data: dict):
-        await self._run_sync(self._update_user_data_sync, user_id, guild_id, data)
-
-    # --- SHOP ITEM FUNCTIONS (shop.db) ---
-
-    def _add_item_to_shop_sync(self, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3):
-        with sqlite3.connect(self.shop_db_path) as con:
-            cur = con.cursor()
-            cur.execute(
-                "INSERT INTO items (creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3)
-            )
-            con.commit()
-
-    async def add_item_to_shop(self, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3):
-        await self._run_sync(self._add_item_to_shop_sync, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3)
-
-    def _get_creator_uploads_sync(self, creator_id, guild_id):
-        with sqlite3.connect(self.shop_db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute("SELECT * FROM items WHERE creator_id = ? AND guild_id = ?", (creator_id, guild_id))
-            return [dict(row) for row in cur.fetchall()]
-
-    async def get_creator_uploads(self, creator_id, guild_id):
-        return await self._run_sync(self._get_creator_uploads_sync, creator_id, guild_id)
-    
-    def _get_categories_for_app_sync(self, guild_id, application):
-        with sqlite3.connect(self.shop_db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute("SELECT DISTINCT category FROM items WHERE guild_id = ? AND application = ?", (guild_id, application))
-            return [row['category'] for row in cur.fetchall()]
-
-    async def get_categories_for_app(self, guild_id, application):
-        return await self._run_sync(self._get_categories_for_app_sync, guild_id, application)
-
-    def _get_items_in_category_sync(self, guild_id, application, category):
-        with sqlite3.connect(self.shop_db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute("SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ?", (guild_id, application, category))
-            return [dict(row) for row in cur.fetchall()]
-
-    async def get_items_in_category(self, guild_id, application, category):
-        return await self._run_sync(self._get_items_in_category_sync, guild_id, application, category)
-
-    def _get_item_details_sync(self, item_id):
-        with sqlite3.connect(self.shop_db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute("SELECT * FROM items WHERE item_id = ?", (item_id,))
-            item = cur.fetchone()
-            return dict(item) if item else None
-
-    async def get_item_details(self, item_id):
-        return await self._run_sync(self._get_item_details_sync, item_id)
-
-    def _update_item_details_sync(self, item_id, data):
-        with sqlite3.connect(self.shop_db_path) as con:
-            cur = con.cursor()
-            set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
-            values = list(data.values()) + [item_id]
-            cur.execute(f"UPDATE items SET {set_clause} WHERE item_id = ?", tuple(values))
-            con.commit()
-
-    async def update_item_details(self, item_id, data):
-        await self._run_sync(self._update_item_details_sync, item_id, data)
-
-    def _delete_item_sync(self, item_id):
-        with sqlite3.connect(self.shop_db_path) as con:
-            cur = con.cursor()
-            cur.execute("DELETE FROM items WHERE item_id = ?", (item_id,))
-            con.commit()
-
-    async def delete_item(self, item_id):
-        await self._run_sync(self._delete_item_sync, item_id)
-
-    # --- NEW: Schema Viewer Function ---
-    def _get_table_schema_sync(self, db_path, table_name):
-        with sqlite3.connect(db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
-            cur.execute(f"PRAGMA table_info({table_name})")
-            return [dict(row) for row in cur.fetchall()]
-
-    async def get_shop_schema(self):
-        return await self._run_sync(self._get_table_schema_sync, self.shop_db_path, "items")
+import os
+import re
+import time
+import asyncio
+from dataclasses import dataclass
+from discord.ext import commands
+from user_cache import UserStateCache, FlushError
+from cooldowns import CooldownIndex
+import migrations
+from catalog import ShopCatalog
+from pagination import make_page
+import config
+from sqltrace import SQLTracer
+from storage import ConnectionPool, make_backend
+import ledger
+from ledger import LedgerCompactor
+from leaderboards import LeaderboardCache
+from partitions import PartitionMap
+from backups import BackupManager
+
+@dataclass
+class PurchaseResult:
+    """What DatabaseManager.purchase_item did, for the shop view to render."""
+    status: str                 # "completed", "duplicate", "not_found" or "insufficient_funds"
+    item: dict = None
+    balance_before: int = 0
+    balance_after: int = 0
+    purchase_id: int = None
+    refunded: bool = False      # Only set for duplicates of a purchase that was refunded.
+
+
+# This class now manages two separate database files.
+class DatabaseManager:
+    def __init__(self, bot: commands.Bot, economy_db_path: str = "economy.db", shop_db_path: str = "shop.db", backend: str = None, partitioning: str = None):
+        self.bot = bot
+        self.economy_db_path = economy_db_path
+        self.shop_db_path = shop_db_path
+        # Connections are opened once and reused for the lifetime of the bot.
+        # The economy writer attaches shop.db so a purchase can check the price in the same transaction.
+        # Off unless turned on in config.py or with /sqltrace, see sqltrace.py.
+        self.tracer = SQLTracer(enabled=config.SQL_TRACE_ENABLED, slow_ms=config.SLOW_QUERY_MS)
+        self.economy_pool = ConnectionPool(self.economy_db_path, attach={"shop": self.shop_db_path}, tracer=self.tracer)
+        self.shop_pool = ConnectionPool(self.shop_db_path, tracer=self.tracer)
+        # Apply any pending schema migrations before anything else touches the files.
+        self._init_sync()
+        # Runs the SQL off the event loop, see storage.py for the options.
+        self.backend = make_backend(backend or config.DATABASE_BACKEND)
+        # Optional per-guild files next to economy.db, see partitions.py. Without it every guild shares the two files above.
+        partitioning = partitioning or config.DATABASE_PARTITIONING
+        self.partitions = None
+        if partitioning:
+            directory = os.path.join(os.path.dirname(os.path.abspath(self.economy_db_path)), config.DATABASE_PARTITION_DIR)
+            self.partitions = PartitionMap(directory, partitioning, config.DATABASE_PARTITION_BUCKETS, config.DATABASE_MAX_OPEN_PARTITIONS, self.backend, self.tracer)
+        # Per-user rows live in a write-behind cache, see user_cache.py.
+        self.users = UserStateCache(self)
+        # Lets on_message skip users that are still inside their reward windows.
+        self.cooldowns = CooldownIndex()
+        # The shop browse menus are served from this in-memory copy of items.
+        self.catalog = ShopCatalog(self)
+        # Top users per guild for /leaderboard, kept up to date by the writes below.
+        self.leaderboards = LeaderboardCache(self)
+        # Every balance change is also appended to the ledger table, this keeps it small. Started by start().
+        self.ledger = LedgerCompactor(self, config.LEDGER_COMPACT_INTERVAL, config.LEDGER_RETENTION_DAYS, config.LEDGER_ARCHIVE_PATH or None)
+        # Scheduled online backups of every database file, also started by start().
+        self.backups = BackupManager(self, config.BACKUP_DIR, config.BACKUP_INTERVAL, config.BACKUP_KEEP)
+
+    def _run_read(self, pool: ConnectionPool, func, *args):
+        """Helper to run a synchronous read function in a non-blocking way. func is called as func(con, *args)."""
+        return self.backend.read(pool, func, *args)
+
+    def _run_write(self, pool: ConnectionPool, func, *args):
+        """Helper to run a write function in a committed transaction. func is called as func(con, *args)."""
+        return self.backend.write(pool, func, *args)
+
+    # --- PARTITION ROUTING ---
+    # Everything that belongs to a guild goes through these, so it reaches the
+    # right files with or without partitioning. A partition is held open
+    # while a job runs on it.
+
+    def _partition_key(self, guild_id: int):
+        return self.partitions.key(guild_id) if self.partitions is not None else None
+
+    def partition_keys(self) -> list:
+        """Every partition that has files, or [None] for the unpartitioned economy.db and shop.db."""
+        return self.partitions.keys() if self.partitions is not None else [None]
+
+    def _run_on(self, key, kind: str, run, func, *args):
+        """Runs func on the "economy" or "shop" pool of partition `key` with run (_run_read or _run_write)."""
+        if key is None:
+            return run(self.economy_pool if kind == "economy" else self.shop_pool, func, *args)
+        return self._run_on_partition(key, kind, run, func, *args)
+
+    async def _run_on_partition(self, key, kind: str, run, func, *args):
+        partition = await self.partitions.acquire(key)
+        try:
+            return await run(getattr(partition, kind), func, *args)
+        finally:
+            self.partitions.release(partition)
+
+    def _read_economy(self, guild_id: int, func, *args):
+        return self._run_on(self._partition_key(guild_id), "economy", self._run_read, func, *args)
+
+    def _write_economy(self, guild_id: int, func, *args):
+        return self._run_on(self._partition_key(guild_id), "economy", self._run_write, func, *args)
+
+    def _read_shop(self, guild_id: int, func, *args):
+        return self._run_on(self._partition_key(guild_id), "shop", self._run_read, func, *args)
+
+    def _write_shop(self, guild_id: int, func, *args):
+        return self._run_on(self._partition_key(guild_id), "shop", self._run_write, func, *args)
+
+    def _get_item_route_sync(self, con, item_id):
+        row = con.execute("SELECT guild_id FROM item_routes WHERE item_id = ?", (item_id,)).fetchone()
+        return row['guild_id'] if row else None
+
+    async def _run_on_item(self, item_id, run, func, *args):
+        """Runs func on the shop pool that holds the item. Returns None without running it if the item doesn't exist."""
+        if self.partitions is None:
+            return await run(self.shop_pool, func, *args)
+        item = self.catalog.get_item(item_id)
+        guild_id = item['guild_id'] if item else await self._run_read(self.partitions.routes, self._get_item_route_sync, item_id)
+        if guild_id is None:
+            return None
+        return await self._run_on(self.partitions.key(guild_id), "shop", run, func, *args)
+
+    async def start(self):
+        """Starts the background jobs. Called from setup_hook, or by storage_service.py when it owns the files."""
+        self.ledger.start()
+        self.backups.start()
+
+    async def backup(self) -> dict:
+        """Takes a backup now, see backups.py. Returns its manifest."""
+        return await self.backups.backup()
+
+    async def close(self):
+        """Flushes pending writes and closes every pooled connection. Called when the bot shuts down."""
+        await self.ledger.close()
+        await self.backups.close()
+        await self.users.close()
+        if self.partitions is not None:
+            await self.partitions.close()
+        self.backend.close()
+        self.ledger.close_archive()
+        self.economy_pool.close()
+        self.shop_pool.close()
+
+    def _init_sync(self):
+        """Brings both databases up to the latest schema, see migrations.py.
+
+        When nothing is pending this is one PRAGMA read per database.
+        """
+        version = migrations.run_migrations(self.economy_pool.writer(), migrations.ECONOMY_MIGRATIONS, "economy.db", migrations.ECONOMY_BASELINE)
+        print(f"Economy database initialized successfully (schema version {version}).")
+        version = migrations.run_migrations(self.shop_pool.writer(), migrations.SHOP_MIGRATIONS, "shop.db", migrations.SHOP_BASELINE)
+        print(f"Shop database initialized successfully (schema version {version}).")
+
+    # --- USER ECONOMY FUNCTIONS (economy.db) ---
+
+    def _get_user_data_sync(self, con, user_id: int, guild_id: int):
+        user_data = con.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        return dict(user_data) if user_data else None
+
+    def _create_user_sync(self, con, user_id: int, guild_id: int):
+        con.execute("INSERT OR IGNORE INTO users (user_id, guild_id) VALUES (?, ?)", (user_id, guild_id))
+        return dict(con.execute("SELECT * FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone())
+
+    async def _load_user_data(self, user_id: int, guild_id: int):
+        user_data = await self._read_economy(guild_id, self._get_user_data_sync, user_id, guild_id)
+        if user_data is None:
+            # First time we see this user, so the writer creates their row.
+            user_data = await self._write_economy(guild_id, self._create_user_sync, user_id, guild_id)
+        return user_data
+
+    async def get_user_data(self, user_id: int, guild_id: int):
+        # Served from the cache, so it includes rewards that are not flushed yet.
+        return await self.users.get(user_id, guild_id)
+
+    def _update_user_data_sync(self, con, user_id: int, guild_id: int, data: dict):
+        if 'balance' in data:
+            # An absolute balance goes in the ledger as the difference it makes.
+            row = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+            if row:
+                ledger.record(con, user_id, guild_id, data['balance'] - row['balance'], ledger.ADJUSTMENT)
+        set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
+        values = list(data.values()) + [user_id, guild_id]
+        query = f"UPDATE users SET {set_clause} WHERE user_id = ? AND guild_id = ?"
+        con.execute(query, tuple(values))
+
+    async def update_user_data(self, user_id: int, guild_id: int, data: dict):
+        applied = self.users.apply(user_id, guild_id, data)
+        if 'last_coin_claim' in data or 'last_xp_claim' in data:
+            self.cooldowns.forget(user_id, guild_id)
+        try:
+            await self._write_economy(guild_id, self._update_user_data_sync, user_id, guild_id, data)
+        except Exception:
+            # Readers must not see values that were never stored.
+            self.users.undo(user_id, guild_id, applied)
+            raise
+        self._leaderboard_changed(user_id, guild_id, data.keys())
+
+    def accrue_user_rewards(self, user_id: int, guild_id: int, coins: int = 0, data: dict = None):
+        """Adds chat rewards in memory. They reach economy.db with the next cache flush."""
+        self.users.accrue(user_id, guild_id, coins, data)
+
+    # --- ATOMIC BALANCE CHANGES ---
+    # Each one is a single statement on the writer thread, so concurrent
+    # changes can't overwrite each other. `pending` holds the user's unflushed
+    # chat coins, which are written in the same job. They all return the
+    # stored balance and whether the change was applied. Every change is
+    # recorded in the ledger (see ledger.py) in the same transaction.
+
+    def _add_pending_coins_sync(self, con, user_id: int, guild_id: int, pending: int):
+        if pending:
+            updated = con.execute("UPDATE users SET balance = balance + ? WHERE user_id = ? AND guild_id = ?", (pending, user_id, guild_id)).rowcount
+            if updated:
+                ledger.record(con, user_id, guild_id, pending, ledger.CHAT)
+
+    def _add_balance_sync(self, con, user_id: int, guild_id: int, pending: int, amount: int, reason: str):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        row = con.execute(
+            "INSERT INTO users (user_id, guild_id, balance) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, guild_id) DO UPDATE SET balance = balance + excluded.balance RETURNING balance",
+            (user_id, guild_id, amount)
+        ).fetchone()
+        ledger.record(con, user_id, guild_id, amount, reason)
+        return row['balance'], True
+
+    def _remove_balance_sync(self, con, user_id: int, guild_id: int, pending: int, amount: int, reason: str):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        # Clamped at zero, so the ledger gets what was actually taken.
+        before = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        row = con.execute(
+            "INSERT INTO users (user_id, guild_id, balance) VALUES (?, ?, 0) "
+            "ON CONFLICT (user_id, guild_id) DO UPDATE SET balance = MAX(0, balance - ?) RETURNING balance",
+            (user_id, guild_id, amount)
+        ).fetchone()
+        ledger.record(con, user_id, guild_id, row['balance'] - (before['balance'] if before else 0), reason)
+        return row['balance'], True
+
+    def _debit_balance_sync(self, con, user_id: int, guild_id: int, pending: int, amount: int, reason: str):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        row = con.execute(
+            "UPDATE users SET balance = balance - ? WHERE user_id = ? AND guild_id = ? AND balance >= ? RETURNING balance",
+            (amount, user_id, guild_id, amount)
+        ).fetchone()
+        if row:
+            ledger.record(con, user_id, guild_id, -amount, reason)
+            return row['balance'], True
+        row = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        return (row['balance'] if row else 0), False
+
+    async def _run_balance_write(self, func, user_id: int, guild_id: int, *args):
+        """Runs a balance job as func(con, user_id, guild_id, pending, *args) -> (stored_balance, result)."""
+        pending = self.users.take_balance_delta(user_id, guild_id)
+        try:
+            balance, result = await self._write_economy(guild_id, func, user_id, guild_id, pending, *args)
+        except Exception:
+            self.users.restore_balance_delta(user_id, guild_id, pending)
+            raise
+        self.users.set_stored_balance(user_id, guild_id, balance)
+        self._leaderboard_changed(user_id, guild_id, ("balance",))
+        return balance, result
+
+    async def add_balance(self, user_id: int, guild_id: int, amount: int, reason: str = ledger.ADJUSTMENT) -> int:
+        """Adds coins and returns the new balance. `reason` is what the ledger records."""
+        balance, _ = await self._run_balance_write(self._add_balance_sync, user_id, guild_id, amount, reason)
+        return balance
+
+    async def remove_balance(self, user_id: int, guild_id: int, amount: int, reason: str = ledger.ADJUSTMENT) -> int:
+        """Removes coins without going below zero and returns the new balance."""
+        balance, _ = await self._run_balance_write(self._remove_balance_sync, user_id, guild_id, amount, reason)
+        return balance
+
+    async def debit_balance(self, user_id: int, guild_id: int, amount: int, reason: str = ledger.ADJUSTMENT):
+        """Removes coins only if the user can afford them. Returns the new balance, or None if they can't."""
+        balance, debited = await self._run_balance_write(self._debit_balance_sync, user_id, guild_id, amount, reason)
+        return balance if debited else None
+
+    # --- DAILY REWARD ---
+
+    def _claim_daily_sync(self, con, user_id: int, guild_id: int, pending: int, amount: int, streak: int, today: str):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        # Guarded by last_daily, so two claims at once still pay out only once.
+        row = con.execute(
+            "UPDATE users SET balance = balance + ?, daily_streak = ?, last_daily = ?, daily_spam_count = 0 "
+            "WHERE user_id = ? AND guild_id = ? AND (last_daily IS NULL OR last_daily != ?) RETURNING balance",
+            (amount, streak, today, user_id, guild_id, today)
+        ).fetchone()
+        if row:
+            ledger.record(con, user_id, guild_id, amount, ledger.DAILY)
+            return row['balance'], True
+        row = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        return (row['balance'] if row else 0), False
+
+    async def claim_daily(self, user_id: int, guild_id: int, amount: int, streak: int, today: str):
+        """Pays the daily reward and saves the streak in one job. Returns the new balance, or None if `today` was already claimed."""
+        balance, claimed = await self._run_balance_write(self._claim_daily_sync, user_id, guild_id, amount, streak, today)
+        if not claimed:
+            return None
+        data = {"daily_streak": streak, "last_daily": today, "daily_spam_count": 0}
+        self.users.apply(user_id, guild_id, data)
+        self._leaderboard_changed(user_id, guild_id, data.keys())
+        return balance
+
+    # --- PURCHASES ---
+
+    def _purchase_item_sync(self, con, user_id: int, guild_id: int, pending: int, item_id: int, idempotency_key: str):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        row = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        balance = row['balance'] if row else 0
+
+        # A second click with the same key gets the first purchase back instead of paying again.
+        previous = con.execute("SELECT * FROM purchases WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        if previous:
+            item = con.execute("SELECT * FROM shop.items WHERE item_id = ?", (previous['item_id'],)).fetchone()
+            return balance, PurchaseResult(
+                "duplicate", dict(item) if item else None, balance, balance,
+                previous['purchase_id'], refunded=previous['status'] == 'refunded'
+            )
+
+        item = con.execute("SELECT * FROM shop.items WHERE item_id = ?", (item_id,)).fetchone()
+        if not item:
+            return balance, PurchaseResult("not_found", None, balance, balance)
+        item = dict(item)
+
+        row = con.execute(
+            "UPDATE users SET balance = balance - ? WHERE user_id = ? AND guild_id = ? AND balance >= ? RETURNING balance",
+            (item['price'], user_id, guild_id, item['price'])
+        ).fetchone()
+        if not row:
+            return balance, PurchaseResult("insufficient_funds", item, balance, balance)
+
+        purchase_id = con.execute(
+            "INSERT INTO purchases (idempotency_key, user_id, guild_id, item_id, price, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (idempotency_key, user_id, guild_id, item_id, item['price'], time.time())
+        ).lastrowid
+        ledger.record(con, user_id, guild_id, -item['price'], ledger.PURCHASE, str(purchase_id))
+        return row['balance'], PurchaseResult("completed", item, balance, row['balance'], purchase_id)
+
+    async def purchase_item(self, user_id: int, guild_id: int, item_id: int, idempotency_key: str) -> PurchaseResult:
+        """Checks the price, charges the buyer and records the purchase in one transaction."""
+        _, result = await self._run_balance_write(self._purchase_item_sync, user_id, guild_id, item_id, idempotency_key)
+        return result
+
+    def _refund_purchase_sync(self, con, user_id: int, guild_id: int, pending: int, purchase_id: int):
+        self._add_pending_coins_sync(con, user_id, guild_id, pending)
+        purchase = con.execute(
+            "UPDATE purchases SET status = 'refunded' WHERE purchase_id = ? AND status = 'completed' RETURNING price",
+            (purchase_id,)
+        ).fetchone()
+        if purchase:
+            row = con.execute(
+                "UPDATE users SET balance = balance + ? WHERE user_id = ? AND guild_id = ? RETURNING balance",
+                (purchase['price'], user_id, guild_id)
+            ).fetchone()
+            ledger.record(con, user_id, guild_id, purchase['price'], ledger.REFUND, str(purchase_id))
+            return row['balance'], True
+        row = con.execute("SELECT balance FROM users WHERE user_id = ? AND guild_id = ?", (user_id, guild_id)).fetchone()
+        return row['balance'], False
+
+    async def refund_purchase(self, user_id: int, guild_id: int, purchase_id: int):
+        """Gives the buyer their coins back. Returns the new balance, or None if it was already refunded."""
+        balance, refunded = await self._run_balance_write(self._refund_purchase_sync, user_id, guild_id, purchase_id)
+        return balance if refunded else None
+
+    def _flush_user_rows_sync(self, con, updates):
+        for (user_id, guild_id), balance_delta, data in updates:
+            set_clause = ", ".join(["balance = balance + ?"] + [f"{key} = ?" for key in data.keys()])
+            values = [balance_delta] + list(data.values()) + [user_id, guild_id]
+            con.execute(f"UPDATE users SET {set_clause} WHERE user_id = ? AND guild_id = ?", tuple(values))
+        # The chat coins of the whole batch go in the ledger with one statement.
+        ledger.record_many(con, [(user_id, guild_id, balance_delta, ledger.CHAT) for (user_id, guild_id), balance_delta, _ in updates])
+
+    async def _flush_user_rows(self, updates):
+        """Writes a batch of cached rows, one job per partition."""
+        groups = {}
+        for update in updates:
+            groups.setdefault(self._partition_key(update[0][1]), []).append(update)
+        results = await asyncio.gather(
+            *(self._run_on(key, "economy", self._run_write, self._flush_user_rows_sync, group) for key, group in groups.items()),
+            return_exceptions=True
+        )
+        unwritten, error = [], None
+        for group, result in zip(groups.values(), results):
+            if isinstance(result, BaseException):
+                unwritten.extend(group)
+                error = result
+                continue
+            for (user_id, guild_id), balance_delta, data in group:
+                self._leaderboard_changed(user_id, guild_id, ("balance", *data.keys()) if balance_delta else data.keys())
+        if error is not None:
+            if len(unwritten) == len(updates):
+                raise error
+            raise FlushError(unwritten) from error
+
+    # --- LEADERBOARDS ---
+
+    def _leaderboard_changed(self, user_id: int, guild_id: int, columns):
+        row = self.users.peek(user_id, guild_id)
+        if row is not None:
+            self.leaderboards.update(user_id, guild_id, row, columns)
+        else:
+            self.leaderboards.invalidate(guild_id, columns)
+
+    def _get_leaderboard_sync(self, con, guild_id: int, columns: tuple, limit: int):
+        # Walks idx_users_balance / idx_users_level / idx_users_streak from the top.
+        order = ", ".join(f"{column} DESC" for column in columns)
+        rows = con.execute(
+            f"SELECT user_id, {', '.join(columns)} FROM users WHERE guild_id = ? ORDER BY {order}, user_id LIMIT ?",
+            (guild_id, limit)
+        ).fetchall()
+        return [(row[0], tuple(row[1:])) for row in rows]
+
+    def _count_ahead_sync(self, con, guild_id: int, columns: tuple, score: tuple, user_id: int):
+        names, marks = ", ".join(columns), ", ".join("?" * len(columns))
+        better = con.execute(f"SELECT COUNT(*) FROM users WHERE guild_id = ? AND ({names}) > ({marks})", (guild_id, *score)).fetchone()[0]
+        tied = con.execute(
+            f"SELECT COUNT(*) FROM users WHERE guild_id = ? AND ({names}) = ({marks}) AND user_id < ?", (guild_id, *score, user_id)
+        ).fetchone()[0]
+        return better + tied
+
+    async def get_leaderboard(self, guild_id: int, metric: str, limit: int = 10):
+        """The top users for "balance", "level" or "streak" as [(user_id, score tuple), ...]."""
+        return await self.leaderboards.top(guild_id, metric, limit)
+
+    async def get_rank(self, user_id: int, guild_id: int, metric: str) -> int:
+        return await self.leaderboards.rank(user_id, guild_id, metric)
+
+    # --- LEDGER ---
+
+    def _get_ledger_page_sync(self, con, user_id: int, guild_id: int, before, limit: int):
+        query = "SELECT * FROM ledger WHERE guild_id = ? AND user_id = ?"
+        params = [guild_id, user_id]
+        if before is not None:
+            query += " AND entry_id < ?"
+            params.append(before)
+        query += " ORDER BY entry_id DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in con.execute(query, params).fetchall()]
+
+    async def get_ledger_entries(self, user_id: int, guild_id: int, before: int = None, limit: int = 10):
+        """A user's most recent ledger entries, newest first. Pass the last entry_id as `before` for the next page."""
+        return await self._read_economy(guild_id, self._get_ledger_page_sync, user_id, guild_id, before, limit)
+
+    def _get_coin_flow_sync(self, con, guild_id: int, since: float):
+        rows = con.execute(
+            "SELECT reason, COUNT(*) AS entries, SUM(amount) AS total FROM ledger "
+            "WHERE guild_id = ? AND created_at >= ? GROUP BY reason ORDER BY total DESC",
+            (guild_id, since)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def get_coin_flow(self, guild_id: int, since: float):
+        """Coins created and destroyed in a guild since a time, per reason. Only covers entries not yet pruned."""
+        return await self._read_economy(guild_id, self._get_coin_flow_sync, guild_id, since)
+
+    # --- SHOP ITEM FUNCTIONS (shop.db) ---
+
+    def _add_item_to_shop_sync(self, con, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3, item_id=None):
+        # item_id is None unless directory.db handed one out, then AUTOINCREMENT picks it.
+        row = con.execute(
+            "INSERT INTO items (item_id, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING *",
+            (item_id, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3)
+        ).fetchone()
+        return dict(row)
+
+    def _add_item_route_sync(self, con, guild_id):
+        return con.execute("INSERT INTO item_routes (guild_id) VALUES (?) RETURNING item_id", (guild_id,)).fetchone()['item_id']
+
+    def _delete_item_route_sync(self, con, item_id):
+        con.execute("DELETE FROM item_routes WHERE item_id = ?", (item_id,))
+
+    async def add_item_to_shop(self, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3):
+        item_id = None
+        if self.partitions is not None:
+            # Partitions share one sequence of item ids, an unused one is just a gap.
+            item_id = await self._run_write(self.partitions.routes, self._add_item_route_sync, guild_id)
+        item = await self._write_shop(guild_id, self._add_item_to_shop_sync, creator_id, guild_id, item_name, application, category, price, product_link, screenshot_link, screenshot_link_2, screenshot_link_3, item_id)
+        self.catalog.item_added(item)
+        return item
+
+    def _get_creator_uploads_sync(self, con, creator_id, guild_id):
+        cur = con.execute("SELECT * FROM items WHERE creator_id = ? AND guild_id = ? ORDER BY item_id", (creator_id, guild_id))
+        return [dict(row) for row in cur.fetchall()]
+
+    async def get_creator_uploads(self, creator_id, guild_id):
+        return await self._read_shop(guild_id, self._get_creator_uploads_sync, creator_id, guild_id)
+    
+    def _get_creator_uploads_page_sync(self, con, creator_id, guild_id, after, before, limit):
+        if before is not None:
+            cur = con.execute(
+                "SELECT * FROM items WHERE guild_id = ? AND creator_id = ? AND item_id < ? ORDER BY item_id DESC LIMIT ?",
+                (guild_id, creator_id, before, limit + 1)
+            )
+        else:
+            cur = con.execute(
+                "SELECT * FROM items WHERE guild_id = ? AND creator_id = ? AND item_id > ? ORDER BY item_id LIMIT ?",
+                (guild_id, creator_id, after or 0, limit + 1)
+            )
+        return make_page([dict(row) for row in cur.fetchall()], limit, after, before)
+
+    async def get_creator_uploads_page(self, creator_id, guild_id, after=None, before=None, limit=10):
+        """One page of a creator's uploads. Pass the last item_id as `after` for the next page, the first as `before` for the previous one."""
+        return await self._read_shop(guild_id, self._get_creator_uploads_page_sync, creator_id, guild_id, after, before, limit)
+
+    def _get_categories_for_app_sync(self, con, guild_id, application):
+        cur = con.execute("SELECT DISTINCT category FROM items WHERE guild_id = ? AND application = ?", (guild_id, application))
+        return [row['category'] for row in cur.fetchall()]
+
+    async def get_categories_for_app(self, guild_id, application):
+        return await self.catalog.get_categories(guild_id, application)
+
+    def _get_items_in_category_sync(self, con, guild_id, application, category):
+        cur = con.execute("SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? ORDER BY item_id", (guild_id, application, category))
+        return [dict(row) for row in cur.fetchall()]
+
+    async def get_items_in_category(self, guild_id, application, category):
+        return await self.catalog.get_items(guild_id, application, category)
+
+    def _get_items_page_sync(self, con, guild_id, application, category, after, before, limit):
+        if before is not None:
+            cur = con.execute(
+                "SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? AND item_id < ? ORDER BY item_id DESC LIMIT ?",
+                (guild_id, application, category, before, limit + 1)
+            )
+        else:
+            cur = con.execute(
+                "SELECT item_id, item_name, price FROM items WHERE guild_id = ? AND application = ? AND category = ? AND item_id > ? ORDER BY item_id LIMIT ?",
+                (guild_id, application, category, after or 0, limit + 1)
+            )
+        return make_page([dict(row) for row in cur.fetchall()], limit, after, before)
+
+    async def get_items_page(self, guild_id, application, category, after=None, before=None, limit=25):
+        """One page of items in a category, same cursors as get_creator_uploads_page."""
+        if self.catalog.is_loaded(guild_id):
+            return await self.catalog.get_items_page(guild_id, application, category, after, before, limit)
+        return await self._read_shop(guild_id, self._get_items_page_sync, guild_id, application, category, after, before, limit)
+
+    def _get_guild_items_sync(self, con, guild_id):
+        cur = con.execute("SELECT * FROM items WHERE guild_id = ? ORDER BY application, category, item_id", (guild_id,))
+        return [dict(row) for row in cur.fetchall()]
+
+    def _get_item_details_sync(self, con, item_id):
+        item = con.execute("SELECT * FROM items WHERE item_id = ?", (item_id,)).fetchone()
+        return dict(item) if item else None
+
+    async def get_item_details(self, item_id):
+        item = self.catalog.get_item(item_id)
+        if item is None:
+            item = await self._run_on_item(item_id, self._run_read, self._get_item_details_sync, item_id)
+        return item
+
+    def _update_item_details_sync(self, con, item_id, data):
+        set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
+        values = list(data.values()) + [item_id]
+        con.execute(f"UPDATE items SET {set_clause} WHERE item_id = ?", tuple(values))
+
+    async def update_item_details(self, item_id, data):
+        await self._run_on_item(item_id, self._run_write, self._update_item_details_sync, item_id, data)
+        self.catalog.item_updated(item_id, data)
+
+    def _delete_item_sync(self, con, item_id):
+        con.execute("DELETE FROM items WHERE item_id = ?", (item_id,))
+
+    async def delete_item(self, item_id):
+        await self._run_on_item(item_id, self._run_write, self._delete_item_sync, item_id)
+        if self.partitions is not None:
+            await self._run_write(self.partitions.routes, self._delete_item_route_sync, item_id)
+        self.catalog.item_deleted(item_id)
+
+    # --- ITEM SEARCH (items_fts in shop.db, see SHOP_MIGRATIONS) ---
+
+    @staticmethod
+    def _fts_query(guild_id, text):
+        """Turns what someone typed into an FTS5 query: every word as a prefix, all of them required, in one guild."""
+        words = re.findall(r"\w+", text.lower())[:8]
+        if not words:
+            return None
+        terms = " ".join(f'"{word}"*' for word in words)
+        return f'guild_key : "g{int(guild_id)}" AND {{item_name application category}} : ({terms})'
+
+    def _search_items_sync(self, con, guild_id, text, limit):
+        results = []
+        if text.strip().isdecimal():
+            # Admins often know the ID already.
+            item = con.execute(
+                "SELECT item_id, item_name, application, category, price FROM items WHERE item_id = ? AND guild_id = ?",
+                (int(text.strip()), guild_id)
+            ).fetchone()
+            if item:
+                results.append(dict(item))
+        query = self._fts_query(guild_id, text)
+        if query is None:
+            rows = con.execute(
+                "SELECT item_id, item_name, application, category, price FROM items WHERE guild_id = ? ORDER BY item_id DESC LIMIT ?",
+                (guild_id, limit)
+            ).fetchall()
+        else:
+            # Name matches count more than application and category matches.
+            rows = con.execute(
+                "SELECT i.item_id, i.item_name, i.application, i.category, i.price FROM items_fts "
+                "JOIN items i ON i.item_id = items_fts.rowid WHERE items_fts MATCH ? "
+                "ORDER BY bm25(items_fts, 10.0, 2.0, 2.0, 0.0), i.item_id LIMIT ?",
+                (query, limit)
+            ).fetchall()
+        seen = {item['item_id'] for item in results}
+        results.extend(dict(row) for row in rows if row['item_id'] not in seen)
+        return results[:limit]
+
+    async def search_items(self, guild_id, text, limit=25):
+        """Items in the guild whose name, application or category start with the typed words, best match first.
+
+        With nothing typed it returns the newest items.
+        """
+        return await self._read_shop(guild_id, self._search_items_sync, guild_id, text, limit)
+
+    # --- NEW: Schema Viewer Function ---
+    def _get_table_schema_sync(self, con, table_name):
+        cur = con.execute(f"PRAGMA table_info({table_name})")
+        return [dict(row) for row in cur.fetchall()]
+
+    async def get_shop_schema(self):
+        return await self._run_read(self.shop_pool, self._get_table_schema_sync, "items")
@@ -0,0 +1,90 @@
+"""Runs the bot as several processes on one machine.
+
+    python launcher.py --processes 2 --shards 4
+
+starts storage_service.py, which owns economy.db and shop.db, and then one
+main.py per process with its share of the shards (here 0,1 and 2,3). Every
+bot process reaches the databases through the storage socket. Ctrl+C or
+SIGTERM stops the bot processes first and the storage process last, so it
+can write out everything they sent it.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import config
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def split_shards(shard_count: int, processes: int) -> list:
+    """Shard ids for each process, in contiguous runs. Discord puts a guild on shard (guild_id >> 22) % shard_count."""
+    per_process, extra = divmod(shard_count, processes)
+    splits, start = [], 0
+    for n in range(processes):
+        size = per_process + (1 if n < extra else 0)
+        splits.append(list(range(start, start + size)))
+        start += size
+    return splits
+
+
+def wait_for_socket(path: str, process, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if process.poll() is not None:
+            sys.exit(f"The storage service exited with code {process.returncode}")
+        if time.monotonic() > deadline:
+            sys.exit(f"The storage service didn't open {path} within {timeout:.0f}s")
+        time.sleep(0.1)
+
+
+def stop(process, timeout: float = 30.0):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            print(f"Process {process.pid} didn't stop, killing it")
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the storage service and several bot processes.")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--shards", type=int, default=None, help="total shard count (default: one per process)")
+    parser.add_argument("--socket", default=config.STORAGE_SOCKET_PATH)
+    args = parser.parse_args()
+    shard_count = args.shards or args.processes
+    if args.processes < 1 or shard_count < args.processes:
+        sys.exit("Every process needs at least one shard.")
+
+    socket_path = os.path.abspath(args.socket)
+    storage = subprocess.Popen([sys.executable, os.path.join(PACKAGE_DIR, "storage_service.py"), "--socket", socket_path])
+    wait_for_socket(socket_path, storage)
+
+    bots = []
+    for shard_ids in split_shards(shard_count, args.processes):
+        env = dict(os.environ, SHARD_COUNT=str(shard_count), SHARD_IDS=",".join(map(str, shard_ids)), STORAGE_SOCKET=socket_path)
+        bots.append(subprocess.Popen([sys.executable, os.path.join(PACKAGE_DIR, "main.py")], env=env))
+        print(f"Started bot process {bots[-1].pid} with shards {shard_ids}")
+
+    # The children get Ctrl+C from the terminal themselves, SIGTERM is passed on below.
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping and storage.poll() is None and any(bot.poll() is None for bot in bots):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for bot in bots:
+            stop(bot)
+        stop(storage)
+        print("All processes stopped.")
+
+
+if __name__ == "__main__":
+    main()
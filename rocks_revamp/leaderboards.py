@@ -0,0 +1,162 @@
+import bisect
+import asyncio
+
+# How many users each board keeps in memory. /leaderboard shows the first 10.
+LEADERBOARD_SIZE = 100
+
+# name: the users columns that make up the score, compared in this order.
+# Ties go to the lower user_id, the same order as the indexes in migrations.py.
+METRICS = {
+    "balance": ("balance",),
+    "level": ("level", "xp"),
+    "streak": ("daily_streak",),
+}
+
+
+def _sort_key(score: tuple, user_id: int) -> tuple:
+    """Ascending sort key for a descending leaderboard."""
+    return tuple(-value for value in score) + (user_id,)
+
+
+class Leaderboard:
+    """The exact top N users of one guild for one metric, with N <= capacity.
+
+    Everyone who is not on the board sorts after its last entry. That is what
+    keeps it exact under incremental updates: a user can only be placed if
+    they land in front of that boundary. A user who falls behind it is dropped
+    and the board gets shorter until it is reloaded. `complete` means the
+    guild has no other users, so anything can be placed.
+    """
+
+    def __init__(self, capacity: int, rows, complete: bool):
+        self.capacity = capacity
+        self.complete = complete
+        self._scores = {user_id: score for user_id, score in rows}
+        self._keys = sorted(_sort_key(score, user_id) for user_id, score in rows)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, user_id: int, score: tuple):
+        old = self._scores.pop(user_id, None)
+        boundary = self._keys[-1] if self._keys else None
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, _sort_key(old, user_id))]
+        key = _sort_key(score, user_id)
+        if not self.complete and (boundary is None or key > boundary):
+            return
+        bisect.insort(self._keys, key)
+        self._scores[user_id] = score
+        if len(self._keys) > self.capacity:
+            dropped = self._keys.pop()
+            del self._scores[dropped[-1]]
+            self.complete = False
+
+    def top(self, limit: int):
+        """[(user_id, score), ...] best first. O(limit)."""
+        return [(key[-1], self._scores[key[-1]]) for key in self._keys[:limit]]
+
+    def rank(self, user_id: int):
+        """1-based rank, or None if the user isn't on the board."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, _sort_key(score, user_id)) + 1
+
+
+class LeaderboardCache:
+    """In-memory top-K boards per (guild, metric), loaded from the indexes on first use.
+
+    DatabaseManager calls `update` with the cached row after every write that
+    changes a balance, level, xp or streak, including the write-behind flush,
+    so the boards are at most one flush behind chat rewards. Reads are O(K);
+    a rank off the board is one indexed COUNT.
+    """
+
+    def __init__(self, db, capacity: int = LEADERBOARD_SIZE):
+        self.db = db
+        self.capacity = capacity
+        self._boards = {}   # (guild_id, metric) -> Leaderboard
+        self._loading = {}  # (guild_id, metric) -> future of an in-flight load
+        self._missed = {}   # (guild_id, metric) -> updates that arrived during that load, None once invalidated
+
+    def update(self, user_id: int, guild_id: int, row: dict, columns=None):
+        """Moves the user on every board whose score uses one of `columns` (all of them by default)."""
+        for metric, score_columns in METRICS.items():
+            if columns is not None and not any(column in columns for column in score_columns):
+                continue
+            key = (guild_id, metric)
+            score = tuple(row[column] for column in score_columns)
+            board = self._boards.get(key)
+            if board is not None:
+                board.update(user_id, score)
+            elif self._missed.get(key) is not None:
+                self._missed[key].append((user_id, score))
+
+    def invalidate(self, guild_id: int, columns=None):
+        """Drops the guild's boards so they are reloaded, for changes to users that aren't cached."""
+        for metric, score_columns in METRICS.items():
+            if columns is None or any(column in columns for column in score_columns):
+                self._boards.pop((guild_id, metric), None)
+                # A load in flight may have read the rows before this change was written.
+                if (guild_id, metric) in self._missed:
+                    self._missed[(guild_id, metric)] = None
+
+    async def _get_board(self, guild_id: int, metric: str, needed: int) -> Leaderboard:
+        key = (guild_id, metric)
+        board = self._boards.get(key)
+        if board is not None and (board.complete or len(board) >= needed):
+            return board
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key))
+            self._loading[key] = future
+        return await asyncio.shield(future)
+
+    async def _load(self, key):
+        guild_id, metric = key
+        self._boards.pop(key, None)
+        try:
+            # Read again once if the guild was invalidated during the read.
+            for _ in range(2):
+                self._missed[key] = []
+                try:
+                    rows = await self.db._read_economy(guild_id, self.db._get_leaderboard_sync, guild_id, METRICS[metric], self.capacity)
+                finally:
+                    missed = self._missed.pop(key)
+                if missed is not None:
+                    break
+        finally:
+            self._loading.pop(key, None)
+        # Chat coins that are not flushed yet are only in the user cache.
+        board_rows = []
+        for user_id, score in rows:
+            cached = self.db.users.peek(user_id, guild_id)
+            board_rows.append((user_id, tuple(cached[column] for column in METRICS[metric]) if cached else score))
+        board = Leaderboard(self.capacity, board_rows, complete=len(rows) < self.capacity)
+        if missed is None:
+            # Invalidated during the second read as well. Good enough for this caller, the next one reloads.
+            return board
+        for user_id, score in missed:
+            board.update(user_id, score)
+        self._boards[key] = board
+        return board
+
+    async def top(self, guild_id: int, metric: str, limit: int = 10):
+        """The best `limit` users as [(user_id, score), ...]. Score is a tuple of METRICS[metric]."""
+        board = await self._get_board(guild_id, metric, min(limit, self.capacity))
+        return board.top(limit)
+
+    async def rank(self, user_id: int, guild_id: int, metric: str) -> int:
+        """The user's 1-based position on the leaderboard."""
+        board = await self._get_board(guild_id, metric, 1)
+        rank = board.rank(user_id)
+        if rank is not None:
+            return rank
+        row = await self.db.get_user_data(user_id, guild_id)
+        score = tuple(row[column] for column in METRICS[metric])
+        ahead = await self.db._read_economy(guild_id, self.db._count_ahead_sync, guild_id, METRICS[metric], score, user_id)
+        return ahead + 1
+
+    def stats(self) -> dict:
+        return {"boards": len(self._boards), "entries": sum(len(board) for board in self._boards.values())}
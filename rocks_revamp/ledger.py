@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import sqlite3
+
+# How often old ledger entries are compacted, in seconds.
+COMPACT_INTERVAL = 3600
+# Entries younger than this are always kept in economy.db.
+RETENTION_DAYS = 30
+# Entries are moved and deleted in chunks of this many, one writer job each,
+# so compaction never holds the writer for long.
+COMPACT_CHUNK = 5000
+
+# Every reason a balance can change for.
+CHAT = "chat"
+DAILY = "daily"
+PURCHASE = "purchase"
+REFUND = "refund"
+ADMIN_GIVE = "admin_give"
+ADMIN_REMOVE = "admin_remove"
+ADJUSTMENT = "adjustment"
+
+
+def record(con, user_id: int, guild_id: int, amount: int, reason: str, reference=None):
+    """Appends one entry. Called inside the same writer job as the balance change it describes."""
+    if amount:
+        con.execute(
+            "INSERT INTO ledger (user_id, guild_id, amount, reason, reference, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, guild_id, amount, reason, reference, time.time())
+        )
+
+
+def record_many(con, entries):
+    """Appends (user_id, guild_id, amount, reason) entries in one statement, for cache flushes."""
+    now = time.time()
+    con.executemany(
+        "INSERT INTO ledger (user_id, guild_id, amount, reason, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(user_id, guild_id, amount, reason, now) for user_id, guild_id, amount, reason in entries if amount]
+    )
+
+
+class LedgerCompactor:
+    """Keeps the `ledger` table in economy.db from growing without bound.
+
+    Every run first snapshots the stored balance of each user with new
+    entries into `balance_snapshots`, together with the last entry it covers,
+    then deletes entries older than the retention window. With an archive path
+    set they are copied to that file first. A user's balance is always their
+    snapshot plus the entries after it.
+    """
+
+    def __init__(self, db, interval: float = COMPACT_INTERVAL, retention_days: float = RETENTION_DAYS, archive_path: str = None):
+        self.db = db
+        self.interval = interval
+        self.retention_days = retention_days
+        self.archive_path = archive_path
+        self._archives = {}  # path -> connection, only ever used from the economy writers.
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._compact_loop())
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Error compacting the ledger: {e}")
+
+    async def compact(self) -> dict:
+        """Snapshots balances and prunes old entries. Returns what it did."""
+        started = time.perf_counter()
+        cutoff = time.time() - self.retention_days * 86400
+        snapshots = pruned = 0
+        # Every partition has a ledger of its own, see partitions.py. Unpartitioned it is just economy.db.
+        for key in self.db.partition_keys():
+            archive_path = self._archive_path(key)
+            snapshots += await self.db._run_on(key, "economy", self.db._run_write, self._snapshot_sync)
+            while True:
+                count = await self.db._run_on(key, "economy", self.db._run_write, self._prune_chunk_sync, cutoff, archive_path)
+                pruned += count
+                if count < COMPACT_CHUNK:
+                    break
+            if key is not None and archive_path in self._archives:
+                # There can be thousands of partitions, don't keep all their archives open.
+                self._archives.pop(archive_path).close()
+        result = {"snapshots": snapshots, "pruned": pruned, "archived": pruned if self.archive_path else 0,
+                  "seconds": time.perf_counter() - started}
+        if snapshots or pruned:
+            print(f"Ledger compacted: {snapshots} balance snapshots, {pruned} entries pruned in {result['seconds']:.2f}s")
+        return result
+
+    def _snapshot_sync(self, con):
+        last = con.execute("SELECT COALESCE(MAX(as_of_entry_id), 0) FROM balance_snapshots").fetchone()[0]
+        top = con.execute("SELECT COALESCE(MAX(entry_id), 0) FROM ledger").fetchone()[0]
+        if top <= last:
+            return 0
+        # Only users with entries since the last run can have a different balance.
+        # "WHERE true" keeps SQLite from reading the ON CONFLICT as part of the join.
+        return con.execute(
+            """INSERT INTO balance_snapshots (user_id, guild_id, balance, as_of_entry_id, taken_at)
+               SELECT u.user_id, u.guild_id, u.balance, ?, ? FROM users u
+               JOIN (SELECT DISTINCT guild_id, user_id FROM ledger WHERE entry_id > ?) l
+                 ON l.user_id = u.user_id AND l.guild_id = u.guild_id
+               WHERE true
+               ON CONFLICT (user_id, guild_id) DO UPDATE SET
+                 balance = excluded.balance, as_of_entry_id = excluded.as_of_entry_id, taken_at = excluded.taken_at""",
+            (top, time.time(), last)
+        ).rowcount
+
+    def _archive_path(self, key):
+        """Entry ids repeat between partitions, so each one archives to a file of its own."""
+        if not self.archive_path or key is None:
+            return self.archive_path
+        root, ext = os.path.splitext(self.archive_path)
+        return f"{root}_{key}{ext}"
+
+    def _prune_chunk_sync(self, con, cutoff: float, archive_path: str) -> int:
+        # Entries are only pruned once a snapshot covers them.
+        covered = con.execute("SELECT COALESCE(MAX(as_of_entry_id), 0) FROM balance_snapshots").fetchone()[0]
+        # entry_id and created_at grow together, so the oldest entries are a prefix of the rowid order.
+        rows = con.execute(
+            "SELECT * FROM ledger WHERE entry_id <= ? AND created_at < ? ORDER BY entry_id LIMIT ?",
+            (covered, cutoff, COMPACT_CHUNK)
+        ).fetchall()
+        if not rows:
+            return 0
+        if archive_path:
+            self._archive_rows(archive_path, rows)
+        con.execute("DELETE FROM ledger WHERE entry_id <= ? AND created_at < ?", (rows[-1]['entry_id'], cutoff))
+        return len(rows)
+
+    def _archive_rows(self, path: str, rows):
+        # A separate file, committed before the delete. If the delete is rolled
+        # back the next run copies the same entries again and they are ignored.
+        archive = self._archives.get(path)
+        if archive is None:
+            archive = self._archives[path] = sqlite3.connect(path, check_same_thread=False)
+            archive.execute("""
+                CREATE TABLE IF NOT EXISTS ledger (
+                    entry_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+                    amount INTEGER NOT NULL, reason TEXT NOT NULL, reference TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+        with archive:
+            archive.executemany("INSERT OR IGNORE INTO ledger VALUES (?, ?, ?, ?, ?, ?, ?)", [tuple(row) for row in rows])
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def close_archive(self):
+        for archive in self._archives.values():
+            archive.close()
+        self._archives.clear()
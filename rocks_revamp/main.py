@@ -1,58 +1,113 @@
-import discord
-from discord.ext import commands
-import os
-from dotenv import load_dotenv
-import asyncio
-import database # Import the database file
-
-# --- SETUP ---
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-
-# --- BOT INITIALIZATION ---
-# We create a custom bot class to attach our database manager to it.
-class MyBot(commands.Bot):
-    def __init__(self):
-        intents = discord.Intents.default()
-        intents.members = True
-        intents.message_content = True
-        super().__init__(command_prefix="/", intents=intents)
-        # Attach the database manager to the bot instance
-        # This makes it accessible in all cogs via `self.bot.db`
-        self.db = database.DatabaseManager(self)
-
-    async def on_ready(self):
-        """Event that runs when the bot is online and all cogs are loaded."""
-        print(f'Logged in as {self.user.name}')
-        print(f'Discord.py Version: {discord.__version__}')
-        try:
-            # Sync commands after all cogs are loaded
-            synced = await self.tree.sync()
-            print(f"Synced {len(synced)} command(s)")
-        except Exception as e:
-            print(f"Failed to sync commands: {e}")
-
-bot = MyBot()
-
-# --- MAIN FUNCTION ---
-async def main():
-    """The main function to run the bot."""
-    cog_folder = "cogs"
-    
-    async with bot:
-        # Load all .py files from the cogs folder
-        for filename in os.listdir(cog_folder):
-            if filename.endswith(".py"):
-                await bot.load_extension(f"{cog_folder}.{filename[:-3]}")
-                print(f"Loaded cog: {filename}")
-        
-        # Start the bot
-        await bot.start(BOT_TOKEN)
-
-# --- RUN THE BOT ---
-if __name__ == "__main__":
-    if BOT_TOKEN is None:
-        print("Error: BOT_TOKEN environment variable not found.")
-        print("Please create a .env file and add your bot token.")
-    else:
-        asyncio.run(main())
+import time
+STARTED_AT = time.perf_counter()  # Before the other imports, so they count towards startup time.
+import discord
+from discord.ext import commands
+import os
+from dotenv import load_dotenv
+import asyncio
+import database # Import the database file
+import config
+import perf
+from outbound import OutboundDispatcher
+from profiles import ProfileCache
+import startup
+
+startup_timer = startup.StartupTimer(STARTED_AT)
+startup_timer.mark("imports")
+
+# --- SETUP ---
+load_dotenv()
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Set by launcher.py when the bot runs as several processes. Unset, it is one process with every shard.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+# When set, economy and shop data come from the storage process on this socket instead of local files.
+STORAGE_SOCKET = os.getenv("STORAGE_SOCKET")
+
+# --- BOT INITIALIZATION ---
+# We create a custom bot class to attach our database manager to it.
+class MyBot(commands.AutoShardedBot):
+    def __init__(self):
+        intents = discord.Intents.default()
+        intents.members = True
+        intents.message_content = True
+        # The timed tree records every app command into perf.metrics.
+        super().__init__(command_prefix="/", intents=intents, tree_cls=perf.TimedCommandTree, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+        # Attach the database manager to the bot instance
+        # This makes it accessible in all cogs via `self.bot.db`
+        if STORAGE_SOCKET:
+            # Same methods, served by the storage process that all bot processes share.
+            from storage_service import RemoteDatabase
+            self.db = RemoteDatabase(self, STORAGE_SOCKET)
+        else:
+            self.db = database.DatabaseManager(self)
+        # Announcements and logs are sent in the background through this, see outbound.py.
+        self.outbound = OutboundDispatcher(self)
+        # User lookups for logs, checked against the gateway cache before asking the API.
+        self.profiles = ProfileCache(self)
+        self.startup_reported = False
+        self.first_command_done = False
+
+    async def setup_hook(self):
+        """Hooks the latency metrics into Discord requests, syncs commands and starts background jobs before connecting."""
+        startup_timer.mark("login")
+        perf.metrics.enabled = config.PERF_METRICS_ENABLED
+        if config.PERF_METRICS_ENABLED:
+            perf.instrument_http(self.http)
+        if config.PERF_EXPORT_INTERVAL > 0:
+            self.perf_export_task = asyncio.create_task(perf.export_loop(config.PERF_EXPORT_PATH, config.PERF_EXPORT_FORMAT, config.PERF_EXPORT_INTERVAL))
+        await self.db.start()
+        # Runs once per process here rather than in on_ready, which fires again on every reconnect.
+        # The cogs are already loaded, and nothing is sent if the commands didn't change.
+        # Commands are global, so with several processes only the one running shard 0 syncs them.
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            try:
+                await startup.sync_commands(self, config.COMMAND_SYNC_HASH_PATH)
+            except Exception as e:
+                print(f"Failed to sync commands: {e}")
+        startup_timer.mark("command sync")
+
+    async def on_ready(self):
+        """Event that runs when the bot is online and all cogs are loaded."""
+        print(f'Logged in as {self.user.name}')
+        print(f'Discord.py Version: {discord.__version__}')
+        if self.shard_ids is not None:
+            print(f'Running shards {self.shard_ids} of {self.shard_count}')
+        if not self.startup_reported:
+            self.startup_reported = True
+            startup_timer.mark("gateway")
+            print(startup_timer.report())
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        perf.record_command(interaction, command)
+        if not self.first_command_done:
+            self.first_command_done = True
+            print(f"First command (/{command.qualified_name}) handled {startup_timer.elapsed():.2f}s after start")
+
+    async def close(self):
+        """Sends queued messages, shuts the bot down, then flushes and closes the database."""
+        await self.outbound.close()
+        await super().close()
+        await self.db.close()
+
+bot = MyBot()
+startup_timer.mark("database")
+
+# --- MAIN FUNCTION ---
+async def main():
+    """The main function to run the bot."""
+    async with bot:
+        # Load all .py files from the cogs folder next to this file
+        await startup.load_cogs(bot, startup.find_cogs())
+        startup_timer.mark("cogs")
+
+        # Start the bot
+        await bot.start(BOT_TOKEN)
+
+# --- RUN THE BOT ---
+if __name__ == "__main__":
+    if BOT_TOKEN is None:
+        print("Error: BOT_TOKEN environment variable not found.")
+        print("Please create a .env file and add your bot token.")
+    else:
+        asyncio.run(main())
@@ -0,0 +1,232 @@
+"""Versioned schema changes for economy.db, shop.db and the partition directory.
+
+Each database stores the last migration it has applied in PRAGMA user_version.
+Migrations are (version, description, steps) and run in order, each one in
+its own transaction together with the user_version bump. Never edit a
+migration that has shipped, add a new one with the next version instead.
+
+A step is a SQL string, an AddColumns, or a Chunked data change that runs in
+many short transactions of its own so it never holds the write lock for long.
+
+A database at version 0 is new or older than this file, so it gets the
+baseline schema first. Everything in a baseline is safe to run on tables that
+already exist. Once a database is up to date, startup is a single PRAGMA read.
+"""
+import time
+
+
+class AddColumns:
+    """Adds the columns a table doesn't have yet. ALTER TABLE has no IF NOT EXISTS for columns."""
+
+    def __init__(self, table: str, columns: dict):
+        self.table = table
+        self.columns = columns  # name -> type
+
+    def run(self, con):
+        existing = {row[1] for row in con.execute(f"PRAGMA table_info({self.table})")}
+        for name, column_type in self.columns.items():
+            if name not in existing:
+                con.execute(f"ALTER TABLE {self.table} ADD COLUMN {name} {column_type}")
+
+
+class Chunked:
+    """A data change run over a table in rowid ranges, each range in its own transaction.
+
+    `sql` is run with :start and :end bound to each range (start inclusive,
+    end exclusive) and has to be safe to run twice on the same rows: if the
+    bot stops half way, the migration starts over from the first range.
+    """
+
+    def __init__(self, table: str, sql: str, chunk_size: int = 5000, pause: float = 0.0):
+        self.table = table
+        self.sql = sql
+        self.chunk_size = chunk_size
+        self.pause = pause  # Seconds to leave the database to others between chunks.
+
+    def run(self, con):
+        low, high = con.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {self.table}").fetchone()
+        if low is None:
+            return
+        for start in range(low, high + 1, self.chunk_size):
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                con.execute(self.sql, {"start": start, "end": start + self.chunk_size})
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            if self.pause:
+                time.sleep(self.pause)
+
+
+# --- economy.db ---
+
+ECONOMY_BASELINE = [
+    """CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+        balance INTEGER DEFAULT 0, xp INTEGER DEFAULT 0, level INTEGER DEFAULT 0,
+        last_daily TEXT, daily_streak INTEGER DEFAULT 0,
+        last_coin_claim REAL DEFAULT 0, last_xp_claim REAL DEFAULT 0,
+        daily_spam_count INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, guild_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL, price INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'completed',
+        created_at REAL NOT NULL
+    )""",
+]
+
+ECONOMY_MIGRATIONS = [
+    (1, "Append-only coin ledger and balance snapshots", [
+        # One row per balance change. amount is signed, reference links to e.g. a purchase_id.
+        """CREATE TABLE IF NOT EXISTS ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL, reason TEXT NOT NULL, reference TEXT,
+            created_at REAL NOT NULL
+        )""",
+        # A user's history, newest first.
+        "CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger (guild_id, user_id, entry_id)",
+        # Where a guild's coins came from in a time window. Covers the whole query.
+        "CREATE INDEX IF NOT EXISTS idx_ledger_flow ON ledger (guild_id, created_at, reason, amount)",
+        # A user's balance as of a ledger entry, written by compaction before old entries are pruned.
+        """CREATE TABLE IF NOT EXISTS balance_snapshots (
+            user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+            balance INTEGER NOT NULL, as_of_entry_id INTEGER NOT NULL, taken_at REAL NOT NULL,
+            PRIMARY KEY (user_id, guild_id)
+        )""",
+    ]),
+    (2, "Leaderboard indexes", [
+        # The top of a guild and how many users are ahead of someone, for each leaderboard in leaderboards.py.
+        "CREATE INDEX IF NOT EXISTS idx_users_balance ON users (guild_id, balance DESC, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_level ON users (guild_id, level DESC, xp DESC, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_streak ON users (guild_id, daily_streak DESC, user_id)",
+    ]),
+]
+
+# --- shop.db ---
+
+SHOP_BASELINE = [
+    """CREATE TABLE IF NOT EXISTS items (
+        item_id INTEGER PRIMARY KEY AUTOINCREMENT, creator_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL, item_name TEXT NOT NULL, application TEXT NOT NULL,
+        category TEXT NOT NULL, price INTEGER NOT NULL, product_link TEXT NOT NULL,
+        screenshot_link TEXT,
+        screenshot_link_2 TEXT,
+        screenshot_link_3 TEXT
+    )""",
+    # shop.db files from before the extra screenshots have an items table without them.
+    AddColumns("items", {"screenshot_link": "TEXT", "screenshot_link_2": "TEXT", "screenshot_link_3": "TEXT"}),
+]
+
+SHOP_MIGRATIONS = [
+    (1, "Covering indexes for the shop browse path", [
+        # Categories for an app and the items in a category, in item_id order. Covers both queries.
+        "CREATE INDEX IF NOT EXISTS idx_items_browse ON items (guild_id, application, category, item_id, item_name, price)",
+        # A creator's uploads in one guild.
+        "CREATE INDEX IF NOT EXISTS idx_items_creator ON items (guild_id, creator_id)",
+    ]),
+    (2, "Full-text search over item names", [
+        # guild_key holds "g<guild_id>" so a search only walks its own guild's postings.
+        # The prefix indexes make "word*" queries for autocomplete a direct lookup.
+        """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            item_name, application, category, guild_key,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+        )""",
+        "INSERT INTO items_fts (rowid, item_name, application, category, guild_key) "
+        "SELECT item_id, item_name, application, category, 'g' || guild_id FROM items",
+        # Kept in step with items by triggers, so every writer of items stays unchanged.
+        """CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, item_name, application, category, guild_key)
+            VALUES (new.item_id, new.item_name, new.application, new.category, 'g' || new.guild_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = old.item_id;
+        END""",
+        # Price changes don't touch the index.
+        """CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF item_name, application, category, guild_id ON items BEGIN
+            UPDATE items_fts SET item_name = new.item_name, application = new.application,
+                category = new.category, guild_key = 'g' || new.guild_id
+            WHERE rowid = old.item_id;
+        END""",
+    ]),
+]
+
+# --- directory.db, only used with partitioned databases (see partitions.py) ---
+
+DIRECTORY_MIGRATIONS = [
+    (1, "Item routes and partition layout", [
+        # Item ids stay unique over every partition: they are handed out here and the
+        # guild tells which shop file holds the item.
+        """CREATE TABLE IF NOT EXISTS item_routes (
+            item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL
+        )""",
+        # How guilds were split, so the files are never opened with a different layout.
+        """CREATE TABLE IF NOT EXISTS layout (
+            mode TEXT NOT NULL,
+            buckets INTEGER NOT NULL
+        )""",
+    ]),
+]
+
+
+def get_version(con) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _run_step(con, step):
+    if isinstance(step, Chunked):
+        # Chunks commit on their own, so the migration's transaction is split around them.
+        con.execute("COMMIT")
+        step.run(con)
+        con.execute("BEGIN IMMEDIATE")
+    elif isinstance(step, AddColumns):
+        step.run(con)
+    else:
+        con.execute(step)
+
+
+def _apply(con, version: int, steps):
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        for step in steps:
+            _run_step(con, step)
+        # PRAGMA does not take parameters, the version is always one of our own ints.
+        con.execute(f"PRAGMA user_version = {int(version)}")
+        con.execute("COMMIT")
+    except Exception:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+
+
+def run_migrations(con, migrations, db_name: str, baseline=(), verbose: bool = True) -> int:
+    """Brings the database up to the last migration and returns its version.
+
+    `con` must be in autocommit mode (isolation_level=None), like the writer connections.
+    """
+    current = get_version(con)
+    latest = migrations[-1][0] if migrations else 0
+    if current and current >= latest:
+        return current
+
+    if current == 0:
+        started = time.perf_counter()
+        # Stays at version 0 until the first migration, so an interrupted baseline simply runs again.
+        _apply(con, 0, baseline)
+        if verbose:
+            print(f"Applied {db_name} baseline schema in {time.perf_counter() - started:.2f}s")
+    for version, description, steps in migrations:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        _apply(con, version, steps)
+        current = version
+        if verbose:
+            print(f"Applied {db_name} migration {version}: {description} ({time.perf_counter() - started:.2f}s)")
+    return current
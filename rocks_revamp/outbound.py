@@ -0,0 +1,124 @@
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import discord
+import perf
+
+# Discord allows about 5 messages per 5 seconds in one channel.
+CHANNEL_BURST = 5
+CHANNEL_PERIOD = 5.0
+# Messages waiting for one channel beyond this are dropped, oldest first.
+MAX_QUEUED_PER_CHANNEL = 200
+# Discord's limits for a single message.
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+# How long close() waits for the queues to drain, in seconds.
+CLOSE_TIMEOUT = 10.0
+
+
+@dataclass
+class OutboundMessage:
+    content: str = None
+    embeds: list = field(default_factory=list)
+    merge_key: str = None
+    queued_at: float = 0.0
+
+
+class OutboundDispatcher:
+    """Sends announcements and logs in the background, one queue per channel.
+
+    Handlers call post() and return straight away. Each channel has its own
+    worker task that paces sends to the channel's rate limit, so a slow or
+    rate-limited channel only holds up its own messages. While a channel is
+    waiting, queued messages with the same merge_key are combined into one
+    (several level-ups become one message with one line each).
+    """
+
+    def __init__(self, bot, burst: int = CHANNEL_BURST, period: float = CHANNEL_PERIOD):
+        self.bot = bot
+        self.burst = burst
+        self.period = period
+        self._queues = {}   # channel id -> deque of OutboundMessage
+        self._workers = {}  # channel id -> worker task
+        self._sent = {}     # channel id -> times of recent sends
+        self.dropped = 0
+
+    def post(self, channel, content: str = None, embed: discord.Embed = None, merge_key: str = None):
+        """Queues a message for `channel`. Does nothing if the channel is None."""
+        if channel is None:
+            return
+        queue = self._queues.setdefault(channel.id, deque())
+        if len(queue) >= MAX_QUEUED_PER_CHANNEL:
+            queue.popleft()
+            self.dropped += 1
+            print(f"Outbound queue for channel {channel.id} is full, dropped the oldest message.")
+        queue.append(OutboundMessage(content, [embed] if embed else [], merge_key, time.perf_counter()))
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._run_channel(channel))
+
+    async def _run_channel(self, channel):
+        queue = self._queues[channel.id]
+        try:
+            while queue:
+                await self._wait_for_slot(channel.id)
+                message = self._take_merged(queue)
+                perf.metrics.record("outbound.wait", time.perf_counter() - message.queued_at)
+                await self._send(channel, message)
+        finally:
+            del self._workers[channel.id]
+            if not queue:
+                del self._queues[channel.id]
+
+    async def _wait_for_slot(self, channel_id: int):
+        sent = self._sent.setdefault(channel_id, deque())
+        while len(sent) >= self.burst:
+            wait = sent[0] + self.period - time.monotonic()
+            if wait <= 0:
+                sent.popleft()
+            else:
+                await asyncio.sleep(wait)
+        sent.append(time.monotonic())
+
+    def _take_merged(self, queue) -> OutboundMessage:
+        """Pops the next message, folding in the ones right behind it with the same merge_key."""
+        message = queue.popleft()
+        if message.merge_key is None:
+            return message
+        while queue and queue[0].merge_key == message.merge_key:
+            following = queue[0]
+            content = "\n".join(part for part in (message.content, following.content) if part)
+            if len(content) > MAX_CONTENT_LENGTH or len(message.embeds) + len(following.embeds) > MAX_EMBEDS:
+                break
+            queue.popleft()
+            message.content = content or None
+            message.embeds.extend(following.embeds)
+        return message
+
+    async def _send(self, channel, message: OutboundMessage):
+        try:
+            kwargs = {"embeds": message.embeds} if message.embeds else {}
+            with perf.metrics.timer("outbound.send"):
+                await channel.send(content=message.content, **kwargs)
+        except discord.HTTPException as e:
+            # discord.py already retries rate limits and server errors, so this message is lost.
+            print(f"Failed to send to channel {channel.id}: {e}")
+            if e.status == 429:
+                # Back off the whole channel for a period before trying the rest.
+                self._sent[channel.id] = deque([time.monotonic()] * self.burst)
+        except Exception as e:
+            print(f"Failed to send to channel {channel.id}: {e}")
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def close(self):
+        """Waits for the queued messages to go out. Called before the bot disconnects."""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, still_running = await asyncio.wait(workers, timeout=CLOSE_TIMEOUT)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            print(f"Dropped {self.pending()} outbound messages on shutdown.")
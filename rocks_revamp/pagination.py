@@ -0,0 +1,24 @@
+"""Keyset (cursor) pagination helpers.
+
+A page is asked for with `after` (the last item_id of the current page, to
+go forward) or `before` (the first item_id of the current page, to go back).
+The query fetches one row more than the page size, in the direction it is
+walking, so we know whether there is another page without counting rows.
+"""
+
+# Discord allows at most 25 options in a select menu.
+SELECT_PAGE_SIZE = 25
+
+
+def make_page(rows: list, limit: int, after=None, before=None) -> dict:
+    """Builds a page from rows fetched in walking order (newest first when going back)."""
+    if before is not None:
+        has_prev = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        has_next = True
+    else:
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = after is not None
+    return {"items": rows, "has_prev": has_prev, "has_next": has_next}
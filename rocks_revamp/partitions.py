@@ -0,0 +1,299 @@
+"""Optional per-guild partitioning of economy.db and shop.db.
+
+With config.DATABASE_PARTITIONING set, every guild's users, purchases, ledger
+and shop items live in their own pair of files in the partition folder, so a
+busy guild only ever holds the write lock of its own files:
+
+- "guild": one pair per guild, economy_g<guild_id>.db and shop_g<guild_id>.db.
+- "hash": guilds are spread over DATABASE_PARTITION_BUCKETS pairs,
+  economy_b<n>.db and shop_b<n>.db, with n = (guild_id >> 22) % buckets.
+  That is how Discord assigns guilds to shards, so with as many buckets as
+  shards every bot process of a sharded setup writes to its own files.
+
+Partitions are opened on first use and the least recently used idle ones are
+closed once more than DATABASE_MAX_OPEN_PARTITIONS are open. Item ids stay
+unique over all partitions, they are handed out by directory.db, which also
+records which guild (and so which shop file) an item belongs to.
+
+Existing databases are split with
+
+    python partitions.py split --mode guild
+    python partitions.py split --mode hash --buckets 16
+
+while the bot is stopped. economy.db and shop.db are left as they were, set
+DATABASE_PARTITIONING in config.py to match afterwards.
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import argparse
+from collections import OrderedDict
+import config
+import migrations
+from storage import ConnectionPool
+
+MODES = ("guild", "hash")
+DIRECTORY_NAME = "directory.db"
+_ECONOMY_FILE = re.compile(r"^economy_(\w+)\.db$")
+
+
+def partition_key(mode: str, buckets: int, guild_id: int) -> str:
+    if mode == "guild":
+        return f"g{guild_id}"
+    return f"b{(guild_id >> 22) % buckets}"
+
+
+def open_directory(directory: str, mode: str, buckets: int, tracer=None) -> ConnectionPool:
+    """The directory.db pool, checked against the layout the folder was created with."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown partitioning {mode!r}, expected one of {', '.join(MODES)}")
+    os.makedirs(directory, exist_ok=True)
+    pool = ConnectionPool(os.path.join(directory, DIRECTORY_NAME), tracer=tracer)
+    con = pool.writer()
+    migrations.run_migrations(con, migrations.DIRECTORY_MIGRATIONS, DIRECTORY_NAME)
+    layout = (mode, buckets if mode == "hash" else 0)
+    row = con.execute("SELECT mode, buckets FROM layout").fetchone()
+    if row is None:
+        con.execute("INSERT INTO layout (mode, buckets) VALUES (?, ?)", layout)
+    elif tuple(row) != layout:
+        pool.close()
+        raise ValueError(f"{directory} holds a {row['mode']!r} layout with {row['buckets']} buckets, "
+                         f"but config.py asks for {mode!r} with {layout[1]}")
+    return pool
+
+
+def partition_paths(directory: str, key: str) -> tuple:
+    return os.path.join(directory, f"economy_{key}.db"), os.path.join(directory, f"shop_{key}.db")
+
+
+def open_partition(directory: str, key: str, tracer=None) -> tuple:
+    """(economy pool, shop pool) of a partition, created and migrated if needed.
+
+    New partitions are created all the time, so their migrations aren't printed.
+    """
+    economy_path, shop_path = partition_paths(directory, key)
+    # The shop file exists and is migrated before the economy writer attaches it for purchases.
+    shop = ConnectionPool(shop_path, tracer=tracer, own_writer=True)
+    migrations.run_migrations(shop.writer(), migrations.SHOP_MIGRATIONS, os.path.basename(shop_path), migrations.SHOP_BASELINE, verbose=False)
+    economy = ConnectionPool(economy_path, attach={"shop": shop_path}, tracer=tracer, own_writer=True)
+    migrations.run_migrations(economy.writer(), migrations.ECONOMY_MIGRATIONS, os.path.basename(economy_path), migrations.ECONOMY_BASELINE, verbose=False)
+    return economy, shop
+
+
+class Partition:
+    """The economy and shop files of one partition.
+
+    `users` counts the jobs running on it and the callers waiting for it to
+    open. Only a partition nobody uses can be closed.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.economy = None
+        self.shop = None
+        self.ready = None  # future of the open
+        self.users = 0
+
+
+class PartitionMap:
+    """Routes guilds to their partition and keeps an LRU of open ones."""
+
+    def __init__(self, directory: str, mode: str, buckets: int, max_open: int, backend, tracer=None):
+        self.directory = directory
+        self.mode = mode
+        self.buckets = buckets
+        self.max_open = max_open
+        self.backend = backend
+        self.tracer = tracer
+        self.routes = open_directory(directory, mode, buckets, tracer)
+        self._partitions = OrderedDict()  # key -> Partition, least recently used first
+        self._closing = set()
+        self.opened = 0
+        self.closed = 0
+
+    def key(self, guild_id: int) -> str:
+        return partition_key(self.mode, self.buckets, guild_id)
+
+    def keys(self) -> list:
+        """Every partition that has files, open or not."""
+        return sorted(match.group(1) for match in map(_ECONOMY_FILE.match, os.listdir(self.directory)) if match)
+
+    async def acquire(self, key: str) -> Partition:
+        """The open partition. Every acquire has to be paired with a release."""
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = Partition(key)
+            partition.ready = asyncio.ensure_future(self._open(partition))
+        self._partitions.move_to_end(key)
+        partition.users += 1
+        if not partition.ready.done():
+            try:
+                await asyncio.shield(partition.ready)
+            except BaseException:
+                self.release(partition)
+                raise
+        return partition
+
+    def release(self, partition: Partition):
+        partition.users -= 1
+        if partition.users == 0:
+            self._evict()
+
+    async def _open(self, partition: Partition):
+        try:
+            # Creating a new partition runs its whole schema, keep that off the event loop.
+            pools = await asyncio.get_running_loop().run_in_executor(None, open_partition, self.directory, partition.key, self.tracer)
+        except Exception:
+            self._partitions.pop(partition.key, None)
+            raise
+        partition.economy, partition.shop = pools
+        self.opened += 1
+        self._evict()
+
+    def _evict(self):
+        loop = asyncio.get_running_loop()
+        while len(self._partitions) > self.max_open:
+            idle = next((p for p in self._partitions.values() if p.users == 0 and p.ready.done()), None)
+            if idle is None:
+                # Everything open is busy, the extra ones are closed once they are released.
+                return
+            del self._partitions[idle.key]
+            future = loop.run_in_executor(None, self._close_sync, idle)
+            self._closing.add(future)
+            future.add_done_callback(self._closing.discard)
+
+    def _close_sync(self, partition: Partition):
+        for pool in (partition.economy, partition.shop):
+            if pool is not None:
+                self.backend.release(pool)
+                pool.close()
+        self.closed += 1
+
+    def stats(self) -> dict:
+        return {"open": len(self._partitions), "opened": self.opened, "closed": self.closed}
+
+    async def close(self):
+        """Closes every partition. Nothing may be running on them any more."""
+        if self._closing:
+            await asyncio.gather(*self._closing)
+        loop = asyncio.get_running_loop()
+        partitions = [p for p in self._partitions.values() if p.ready.done() and not p.ready.exception()]
+        self._partitions.clear()
+        await asyncio.gather(*(loop.run_in_executor(None, self._close_sync, p) for p in partitions))
+        self.routes.close()
+
+
+# --- SPLITTING EXISTING DATABASES ---
+
+# (file, table, order) for everything that is copied. Every one of them has a guild_id column.
+SPLIT_TABLES = (
+    ("economy", "users", "guild_id, user_id"),
+    ("economy", "purchases", "purchase_id"),
+    ("economy", "ledger", "entry_id"),
+    ("economy", "balance_snapshots", "guild_id, user_id"),
+    ("shop", "items", "item_id"),
+)
+
+
+def _columns(con, schema: str, table: str) -> str:
+    return ", ".join(row[1] for row in con.execute(f"PRAGMA {schema}.table_info({table})"))
+
+
+def split_databases(economy_path: str, shop_path: str, mode: str, buckets: int, directory: str = None) -> dict:
+    """Copies every guild's rows from economy.db and shop.db into its partition. Returns rows copied per table.
+
+    The bot has to be stopped. The source files are only migrated to the
+    current schema, never changed otherwise. Ids are kept, so purchases,
+    ledger references and snapshots still line up.
+    """
+    directory = directory or os.path.join(os.path.dirname(os.path.abspath(economy_path)), config.DATABASE_PARTITION_DIR)
+    if os.path.isdir(directory) and any(map(_ECONOMY_FILE.match, os.listdir(directory))):
+        raise ValueError(f"{directory} already has partitions, move it away to split again")
+
+    sources = {}
+    for name, path, steps, baseline in (
+        ("economy", economy_path, migrations.ECONOMY_MIGRATIONS, migrations.ECONOMY_BASELINE),
+        ("shop", shop_path, migrations.SHOP_MIGRATIONS, migrations.SHOP_BASELINE),
+    ):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        con = sqlite3.connect(path, isolation_level=None)
+        migrations.run_migrations(con, steps, os.path.basename(path), baseline)
+        sources[name] = con
+
+    routes = open_directory(directory, mode, buckets)
+    guilds = {}
+    for name, table, _ in SPLIT_TABLES:
+        for (guild_id,) in sources[name].execute(f"SELECT DISTINCT guild_id FROM {table}"):
+            guilds.setdefault(partition_key(mode, buckets, guild_id), set()).add(guild_id)
+
+    copied = {table: 0 for _, table, _ in SPLIT_TABLES}
+    started = time.perf_counter()
+    for n, (key, guild_ids) in enumerate(sorted(guilds.items()), start=1):
+        economy, shop = open_partition(directory, key)
+        for name, pool in (("economy", economy), ("shop", shop)):
+            con = pool.writer()
+            con.execute("ATTACH DATABASE ? AS source", (economy_path if name == "economy" else shop_path,))
+            con.execute("BEGIN IMMEDIATE")
+            for source, table, order in SPLIT_TABLES:
+                if source != name:
+                    continue
+                # By name, a migrated old file can have its columns in a different order.
+                columns = _columns(con, "main", table)
+                copied[table] += con.execute(
+                    f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} "
+                    f"WHERE guild_id IN (SELECT value FROM json_each(?)) ORDER BY {order}",
+                    (json.dumps(sorted(guild_ids)),)
+                ).rowcount
+            con.execute("COMMIT")
+            con.execute("DETACH DATABASE source")
+            pool.close()
+        if n % 100 == 0:
+            print(f"  {n}/{len(guilds)} partitions written")
+
+    # Item ids carry on after the highest one ever handed out, deleted items included.
+    con = routes.writer()
+    con.execute("ATTACH DATABASE ? AS source", (shop_path,))
+    con.execute("BEGIN IMMEDIATE")
+    con.execute("INSERT INTO item_routes (item_id, guild_id) SELECT item_id, guild_id FROM source.items")
+    last = con.execute("SELECT seq FROM source.sqlite_sequence WHERE name = 'items'").fetchone()
+    if last and last[0] > (con.execute("SELECT COALESCE(MAX(item_id), 0) FROM item_routes").fetchone()[0]):
+        con.execute("DELETE FROM sqlite_sequence WHERE name = 'item_routes'")
+        con.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('item_routes', ?)", (last[0],))
+    con.execute("COMMIT")
+    con.execute("DETACH DATABASE source")
+    routes.close()
+
+    for name, table, _ in SPLIT_TABLES:
+        expected = sources[name].execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if copied[table] != expected:
+            raise RuntimeError(f"Copied {copied[table]} rows of {table} but {expected} exist")
+    for con in sources.values():
+        con.close()
+    print(f"Split {sum(map(len, guilds.values()))} guild(s) into {len(guilds)} partition(s) in {time.perf_counter() - started:.2f}s: "
+          + ", ".join(f"{count} {table}" for table, count in copied.items()))
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Splits economy.db and shop.db into per-guild partitions.")
+    parser.add_argument("command", choices=["split"])
+    parser.add_argument("--mode", choices=MODES, default=config.DATABASE_PARTITIONING or "guild")
+    parser.add_argument("--buckets", type=int, default=config.DATABASE_PARTITION_BUCKETS, help="only for --mode hash")
+    parser.add_argument("--economy-db", default="economy.db")
+    parser.add_argument("--shop-db", default="shop.db")
+    parser.add_argument("--dir", default=None, help=f"partition folder (default: {config.DATABASE_PARTITION_DIR} next to economy.db)")
+    args = parser.parse_args()
+    try:
+        split_databases(args.economy_db, args.shop_db, args.mode, args.buckets, args.dir)
+    except (ValueError, RuntimeError, FileNotFoundError) as e:
+        sys.exit(f"Split failed: {e}")
+    print(f'Done. Set DATABASE_PARTITIONING = "{args.mode}" in config.py to use the partitions.')
+
+
+if __name__ == "__main__":
+    main()
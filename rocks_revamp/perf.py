@@ -0,0 +1,226 @@
+"""Lightweight latency metrics: rolling histograms kept in memory.
+
+Everything that wants to be timed records into the module-level `metrics`
+object, for example:
+
+    with perf.metrics.timer("command.balance"):
+        ...
+
+Each metric is a fixed set of log-spaced buckets per one-minute window, and
+only the last WINDOW_COUNT windows are kept, so recording is a binary search
+and an increment, and memory does not grow with traffic.
+"""
+import json
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from discord import app_commands
+
+# Bucket upper bounds in seconds, from 10 µs up to ~84 s, each 1.5x the previous.
+BUCKET_BOUNDS = [0.00001 * (1.5 ** n) for n in range(40)]
+WINDOW_SECONDS = 60
+WINDOW_COUNT = 15
+
+
+class _Window:
+    __slots__ = ("start", "counts", "count", "total", "max")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class RollingHistogram:
+    """Latency histogram over the last WINDOW_COUNT * WINDOW_SECONDS seconds."""
+
+    def __init__(self):
+        self._windows = []
+
+    def record(self, seconds: float, now: float):
+        window_start = now - (now % WINDOW_SECONDS)
+        if not self._windows or self._windows[-1].start != window_start:
+            self._windows.append(_Window(window_start))
+            if len(self._windows) > WINDOW_COUNT:
+                del self._windows[0]
+        window = self._windows[-1]
+        window.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        window.count += 1
+        window.total += seconds
+        if seconds > window.max:
+            window.max = seconds
+
+    def snapshot(self, now: float) -> dict:
+        oldest = now - WINDOW_COUNT * WINDOW_SECONDS
+        counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        count, total, maximum = 0, 0.0, 0.0
+        for window in self._windows:
+            if window.start < oldest:
+                continue
+            for n, c in enumerate(window.counts):
+                counts[n] += c
+            count += window.count
+            total += window.total
+            maximum = max(maximum, window.max)
+        return {
+            "count": count,
+            "total": total,
+            "mean": total / count if count else 0.0,
+            "p50": _quantile(counts, count, 0.50, maximum),
+            "p95": _quantile(counts, count, 0.95, maximum),
+            "p99": _quantile(counts, count, 0.99, maximum),
+            "max": maximum,
+        }
+
+
+def _quantile(counts, count, q, maximum):
+    """Upper bound of the bucket holding the q-th sample (capped at the real max)."""
+    if not count:
+        return 0.0
+    target = q * count
+    seen = 0
+    for n, c in enumerate(counts):
+        seen += c
+        if seen >= target:
+            return min(BUCKET_BOUNDS[n], maximum) if n < len(BUCKET_BOUNDS) else maximum
+    return maximum
+
+
+class Metrics:
+    """All histograms by name. Safe to record from the database threads."""
+
+    def __init__(self):
+        self.enabled = True
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram()
+            histogram.record(seconds, now)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            snapshots = {name: histogram.snapshot(now) for name, histogram in self._histograms.items()}
+        return {name: data for name, data in snapshots.items() if data["count"]}
+
+    def top(self, limit: int = 10, key: str = "p95") -> list:
+        """The slowest metrics as (name, stats) pairs, sorted by `key`."""
+        return sorted(self.snapshot().items(), key=lambda pair: pair[1][key], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    # --- EXPORT ---
+
+    def dump_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"generated_at": time.time(), "window_seconds": WINDOW_SECONDS * WINDOW_COUNT, "metrics": self.snapshot()}, f, indent=2)
+
+    def dump_prometheus(self, path: str):
+        """Writes the metrics in the Prometheus text format, as summaries."""
+        lines = [
+            "# HELP rocks_latency_seconds Latency of bot operations over the rolling window.",
+            "# TYPE rocks_latency_seconds summary",
+        ]
+        for name, data in sorted(self.snapshot().items()):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for quantile in ("p50", "p95", "p99"):
+                lines.append(f'rocks_latency_seconds{{operation="{label}",quantile="0.{quantile[1:]}"}} {data[quantile]:.6f}')
+            lines.append(f'rocks_latency_seconds_sum{{operation="{label}"}} {data["total"]:.6f}')
+            lines.append(f'rocks_latency_seconds_count{{operation="{label}"}} {data["count"]}')
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+# The one registry the whole bot records into.
+metrics = Metrics()
+
+
+def export(path: str, fmt: str = "json") -> str:
+    """Writes the current metrics to `path` plus .json or .prom and returns the file name."""
+    if fmt == "prometheus":
+        filename = f"{path}.prom"
+        metrics.dump_prometheus(filename)
+    else:
+        filename = f"{path}.json"
+        metrics.dump_json(filename)
+    return filename
+
+
+async def export_loop(path: str, fmt: str, interval: float):
+    """Re-exports the metrics every `interval` seconds, for scraping or tailing."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            export(path, fmt)
+        except OSError as e:
+            print(f"Error exporting performance metrics: {e}")
+
+
+# --- DISCORD HOOKS ---
+
+class TimedCommandTree(app_commands.CommandTree):
+    """Command tree that records how long every app command takes, responses included.
+
+    Only uses discord.py's public hooks: the start time is kept in
+    interaction.extras by interaction_check, and the bot's
+    on_app_command_completion or this tree's on_error records it.
+    Autocomplete also passes interaction_check but never completes, so it
+    isn't recorded.
+    """
+
+    async def interaction_check(self, interaction) -> bool:
+        interaction.extras["perf_started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction, error):
+        record_command(interaction, interaction.command)
+        await super().on_error(interaction, error)
+
+
+def record_command(interaction, command):
+    """Records an app command that finished, once. Call it from on_app_command_completion."""
+    started = interaction.extras.pop("perf_started", None)
+    if started is None:
+        return
+    name = command.qualified_name if command is not None else "unknown"
+    metrics.record(f"command.{name}", time.perf_counter() - started)
+
+
+def instrument_http(client):
+    """Times every REST request made through `client`, named by its route template.
+
+    Works for the bot's HTTPClient: channel messages, DMs and user lookups.
+    Interaction responses and followups aren't covered, they are part of the
+    command times instead.
+    """
+    request = client.request
+
+    async def timed_request(route, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await request(route, *args, **kwargs)
+        finally:
+            metrics.record(f"discord.{route.method} {route.path}", time.perf_counter() - started)
+
+    client.request = timed_request
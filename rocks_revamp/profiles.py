@@ -0,0 +1,77 @@
+import time
+import asyncio
+from collections import OrderedDict
+import discord
+
+# How long a fetched user is trusted before asking Discord again, in seconds.
+PROFILE_TTL = 3600
+# How long to remember that a user does not exist.
+NOT_FOUND_TTL = 300
+# Least recently used profiles beyond this are dropped.
+MAX_PROFILES = 5000
+
+
+class ProfileCache:
+    """Looks up Discord users for logs without a REST call every time.
+
+    The gateway cache (guild members, then the client's user cache) is checked
+    first. Anything else is fetched once and kept for PROFILE_TTL, and users
+    that don't exist are remembered for NOT_FOUND_TTL. Concurrent lookups for
+    the same user share a single fetch.
+    """
+
+    def __init__(self, bot, ttl: float = PROFILE_TTL, not_found_ttl: float = NOT_FOUND_TTL, max_entries: int = MAX_PROFILES):
+        self.bot = bot
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()  # user id -> (expires at, user or None)
+        self._fetching = {}             # user id -> future of an in-flight fetch
+        self.gateway_hits = 0
+        self.hits = 0
+        self.fetches = 0
+
+    async def get_user(self, user_id: int, guild: discord.Guild = None):
+        """Returns the user, or None if Discord says they don't exist."""
+        user = guild.get_member(user_id) if guild is not None else None
+        if user is None:
+            user = self.bot.get_user(user_id)
+        if user is not None:
+            self.gateway_hits += 1
+            return user
+
+        cached = self._profiles.get(user_id)
+        if cached is not None:
+            expires_at, user = cached
+            if expires_at > time.monotonic():
+                self._profiles.move_to_end(user_id)
+                self.hits += 1
+                return user
+            del self._profiles[user_id]
+
+        future = self._fetching.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(user_id))
+            self._fetching[user_id] = future
+        return await asyncio.shield(future)
+
+    async def _fetch(self, user_id: int):
+        self.fetches += 1
+        try:
+            user = await self.bot.fetch_user(user_id)
+            ttl = self.ttl
+        except discord.NotFound:
+            user = None
+            ttl = self.not_found_ttl
+        finally:
+            self._fetching.pop(user_id, None)
+        self._profiles[user_id] = (time.monotonic() + ttl, user)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+        return user
+
+    def forget(self, user_id: int):
+        self._profiles.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"cached": len(self._profiles), "gateway_hits": self.gateway_hits, "hits": self.hits, "fetches": self.fetches}
@@ -0,0 +1,165 @@
+import math
+import random
+import functools
+from dataclasses import dataclass
+
+# --- CHAT REWARDS ---
+# Seconds a user has to wait between two coin rewards and two XP rewards.
+COIN_COOLDOWN = 25
+XP_COOLDOWN = 20
+
+# A reward is rolled between 1 and a max that grows with the user's level.
+BASE_COINS = 20
+BASE_XP = 25
+PER_LEVEL = 5
+# The top 20% of the range is the high tier, everything below it the low tier.
+LOW_TIER_SHARE = 0.80
+# Chance of a high-tier roll before the luck multiplier.
+COIN_HIGH_TIER_CHANCE = 0.05
+XP_HIGH_TIER_CHANCE = 0.20
+
+# --- LUCK ---
+# +0.5x luck per week of daily streak, capped at 10x.
+LUCK_PER_WEEK = 0.5
+MAX_LUCK = 10.0
+
+# --- LEVELS ---
+BASE_XP_NEEDED = 100
+XP_NEEDED_PER_LEVEL = 50
+
+# --- DAILY ---
+BASE_DAILY = 50
+# Every 50 levels add 50 coins to the daily reward, up to 500.
+DAILY_LEVEL_STEP = 50
+MAX_DAILY = 500
+
+
+def calculate_luck(streak: int) -> float:
+    """Calculates the luck multiplier based on the daily streak."""
+    luck_multiplier = 1 + (LUCK_PER_WEEK * (streak / 7))
+    return min(luck_multiplier, MAX_LUCK)
+
+
+def max_coins(level: int) -> int:
+    return BASE_COINS + (level * PER_LEVEL)
+
+
+def max_xp(level: int) -> int:
+    return BASE_XP + (level * PER_LEVEL)
+
+
+def high_tier_chance(base_chance: float, streak: int) -> float:
+    return min(base_chance * calculate_luck(streak), 1.0)
+
+
+def xp_needed(level: int) -> int:
+    """XP needed to go from `level` to the next one."""
+    return BASE_XP_NEEDED + (level * XP_NEEDED_PER_LEVEL)
+
+
+def daily_reward(level: int) -> int:
+    level_bonus = (level // DAILY_LEVEL_STEP) * DAILY_LEVEL_STEP
+    return min(BASE_DAILY + level_bonus, MAX_DAILY)
+
+
+# --- DROP TABLES ---
+# Every streak from here on has the maximum luck, so they all share one table.
+MAX_LUCK_STREAK = math.ceil((MAX_LUCK - 1) * 7 / LUCK_PER_WEEK)
+# How many (level, streak) tables are kept around, least recently used are rebuilt.
+DROP_TABLE_CACHE_SIZE = 16384
+
+# One random stream for the whole process. Each roll uses a single draw from it.
+_rng = random.Random()
+_random = _rng.random
+
+
+def _roll(u: float, maximum: int, low_tier_cap: int, chance: float) -> int:
+    """Turns one uniform draw into a reward: below `chance` it lands in the high tier, above it in the low tier."""
+    if u < chance:
+        span = maximum - low_tier_cap
+        return low_tier_cap + 1 + min(int(u / chance * span), span - 1)
+    return 1 + min(int((u - chance) / (1 - chance) * low_tier_cap), low_tier_cap - 1)
+
+
+@dataclass(frozen=True)
+class DropTable:
+    """Everything needed to roll chat rewards for one level and streak bucket."""
+    level: int
+    luck: float
+    coin_max: int
+    coin_low_tier_cap: int
+    coin_high_chance: float
+    xp_max: int
+    xp_low_tier_cap: int
+    xp_high_chance: float
+
+    def roll_coins(self) -> int:
+        return _roll(_random(), self.coin_max, self.coin_low_tier_cap, self.coin_high_chance)
+
+    def roll_xp(self) -> int:
+        return _roll(_random(), self.xp_max, self.xp_low_tier_cap, self.xp_high_chance)
+
+
+@functools.lru_cache(maxsize=DROP_TABLE_CACHE_SIZE)
+def _build_drop_table(level: int, streak_bucket: int) -> DropTable:
+    coins, xp = max_coins(level), max_xp(level)
+    return DropTable(
+        level=level,
+        luck=calculate_luck(streak_bucket),
+        coin_max=coins,
+        coin_low_tier_cap=int(coins * LOW_TIER_SHARE),
+        coin_high_chance=high_tier_chance(COIN_HIGH_TIER_CHANCE, streak_bucket),
+        xp_max=xp,
+        xp_low_tier_cap=int(xp * LOW_TIER_SHARE),
+        xp_high_chance=high_tier_chance(XP_HIGH_TIER_CHANCE, streak_bucket),
+    )
+
+
+def drop_table(level: int, streak: int) -> DropTable:
+    """The drop rates for a user. /droprates shows exactly what on_message rolls with."""
+    return _build_drop_table(level, min(streak, MAX_LUCK_STREAK))
+
+
+def reset_drop_tables():
+    """Call after changing the constants above at runtime (the simulator does)."""
+    global MAX_LUCK_STREAK
+    MAX_LUCK_STREAK = math.ceil((MAX_LUCK - 1) * 7 / LUCK_PER_WEEK)
+    _build_drop_table.cache_clear()
+
+
+def roll_coins(level: int, streak: int) -> int:
+    return drop_table(level, streak).roll_coins()
+
+
+def roll_xp(level: int, streak: int) -> int:
+    return drop_table(level, streak).roll_xp()
+
+
+def roll_many(players) -> list:
+    """Rolls (coins, xp) for many (level, streak) pairs in one go.
+
+    Looks every table up once per batch and draws straight from the stream,
+    for code that hands out rewards to a lot of users at the same time.
+    """
+    tables = {}
+    random_ = _random
+    results = []
+    for level, streak in players:
+        key = (level, min(streak, MAX_LUCK_STREAK))
+        table = tables.get(key)
+        if table is None:
+            table = tables[key] = _build_drop_table(*key)
+        results.append((
+            _roll(random_(), table.coin_max, table.coin_low_tier_cap, table.coin_high_chance),
+            _roll(random_(), table.xp_max, table.xp_low_tier_cap, table.xp_high_chance),
+        ))
+    return results
+
+
+def add_xp(level: int, xp: int, gained: int):
+    """Returns (level, xp) after gaining XP. At most one level is gained at a time."""
+    new_xp = xp + gained
+    needed = xp_needed(level)
+    if new_xp >= needed:
+        return level + 1, new_xp - needed
+    return level, new_xp
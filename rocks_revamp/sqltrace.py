@@ -0,0 +1,162 @@
+"""Opt-in SQL tracing for the pooled connections in database.py.
+
+When enabled, every connection gets a sqlite3 trace callback (called as each
+statement starts) and a progress handler (called every PROGRESS_INTERVAL
+virtual machine instructions). A statement runs until the next one starts on
+the same thread or the database job that ran it returns, so its time includes
+fetching the rows. Statements are normalized by replacing literals with ?, and
+counted per shape. Anything slower than the threshold is logged together with
+its query plan.
+
+Turned off, no callbacks are registered and nothing is recorded.
+"""
+import re
+import json
+import time
+import threading
+from collections import deque
+
+# How many SQLite VM instructions run between progress handler calls.
+PROGRESS_INTERVAL = 1000
+# How many slow statements are kept for /sqltrace and the export.
+SLOW_LOG_SIZE = 100
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_BLOB_LITERAL = re.compile(r"\b[xX]\?")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+# Only these can be given to EXPLAIN QUERY PLAN.
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def normalize(sql: str) -> str:
+    """Turns a statement with its values filled in back into its shape, e.g. `WHERE user_id = ?`."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _BLOB_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?, ...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class SQLTracer:
+    """Collects per-statement call counts and timings from the traced connections."""
+
+    def __init__(self, enabled: bool = False, slow_ms: float = 50):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self._stats = {}  # normalized sql -> [calls, total seconds, max seconds, progress ticks]
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started_at = time.time()
+
+    # --- CONNECTION HOOKS ---
+
+    def attach(self, con):
+        con.set_trace_callback(lambda sql: self._on_statement(con, sql))
+        con.set_progress_handler(self._on_progress, PROGRESS_INTERVAL)
+
+    def detach(self, con):
+        self._finish()
+        con.set_trace_callback(None)
+        con.set_progress_handler(None, PROGRESS_INTERVAL)
+
+    def _on_statement(self, con, sql):
+        local = self._local
+        if getattr(local, "explaining", False):
+            return
+        current = getattr(local, "current", None)
+        # Trigger programs report their parent statement again, don't count it twice.
+        if current is not None and current[0] is con and current[1] == sql:
+            return
+        self._finish()
+        local.current = (con, sql, time.perf_counter())
+        local.ticks = 0
+
+    def _on_progress(self):
+        self._local.ticks = getattr(self._local, "ticks", 0) + 1
+        return 0
+
+    def _finish(self):
+        """Closes the statement running on this thread, if any."""
+        local = self._local
+        current = getattr(local, "current", None)
+        if current is None:
+            return
+        local.current = None
+        con, sql, started = current
+        duration = time.perf_counter() - started
+        shape = normalize(sql)
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None:
+                stats = self._stats[shape] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            stats[3] += local.ticks
+        if duration >= self.slow_seconds:
+            # The plan is looked up in end_job, SQLite can't run a query from inside its own callback.
+            pending = getattr(local, "pending_slow", None)
+            if pending is None:
+                pending = local.pending_slow = []
+            pending.append((con, sql, shape, duration))
+
+    def end_job(self):
+        """Called by the database threads after every job, to close its last statement."""
+        local = self._local
+        if getattr(local, "current", None) is None and not getattr(local, "pending_slow", None):
+            return
+        self._finish()
+        pending, local.pending_slow = getattr(local, "pending_slow", None) or [], []
+        for con, sql, shape, duration in pending:
+            plan = self._explain(con, sql)
+            entry = {"at": time.time(), "ms": round(duration * 1000, 3), "sql": shape, "plan": plan}
+            with self._lock:
+                self._slow.append(entry)
+            print(f"Slow query ({entry['ms']:.1f} ms): {shape}" + "".join(f"\n    {line}" for line in plan))
+
+    def _explain(self, con, sql):
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        self._local.explaining = True
+        try:
+            return [row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql)]
+        except Exception as e:
+            return [f"(no plan: {e})"]
+        finally:
+            self._local.explaining = False
+
+    # --- RESULTS ---
+
+    def top(self, limit: int = 10, key: str = "total") -> list:
+        """Statement shapes as dicts, sorted by total time, max time or calls."""
+        with self._lock:
+            rows = [
+                {"sql": sql, "calls": calls, "total_ms": total * 1000, "max_ms": maximum * 1000,
+                 "mean_ms": total * 1000 / calls, "vm_steps": ticks * PROGRESS_INTERVAL}
+                for sql, (calls, total, maximum, ticks) in self._stats.items()
+            ]
+        sort_key = {"total": "total_ms", "max": "max_ms", "calls": "calls"}[key]
+        return sorted(rows, key=lambda row: row[sort_key], reverse=True)[:limit]
+
+    def slow_queries(self) -> list:
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+        self.started_at = time.time()
+
+    def export(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "started_at": self.started_at,
+                "generated_at": time.time(),
+                "slow_ms": self.slow_seconds * 1000,
+                "statements": self.top(limit=None),
+                "slow_queries": self.slow_queries(),
+            }, f, indent=2)
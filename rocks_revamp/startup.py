@@ -0,0 +1,103 @@
+"""Startup pipeline: cog discovery and loading, skipping unneeded command syncs, timing.
+
+A global tree.sync() is rate limited and takes a while, and Discord keeps
+the commands between restarts anyway. The serialized command tree is hashed
+and the hash is kept in a local file, so the sync only runs when a command
+was added, removed or changed. Delete the file to force a sync.
+"""
+import os
+import time
+import json
+import asyncio
+import hashlib
+import perf
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Found next to this file, not in the current directory, so the bot can be started from anywhere.
+COGS_DIR = os.path.join(PACKAGE_DIR, "cogs")
+
+
+class StartupTimer:
+    """Splits startup into consecutive phases. Each mark ends the phase that started at the previous one."""
+
+    def __init__(self, started_at: float = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self._last = self.started_at
+        self.phases = []  # (name, seconds)
+
+    def mark(self, name: str) -> float:
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        self.phases.append((name, seconds))
+        perf.metrics.record(f"startup.{name}", seconds)
+        return seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        total = self._last - self.started_at
+        lines = [f"Startup took {total:.2f}s:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<14} {seconds:7.3f}s  {seconds / total if total else 0:4.0%}")
+        return "\n".join(lines)
+
+
+def find_cogs(folder: str = COGS_DIR) -> list:
+    """Extension names for every cog module in the folder, e.g. "cogs.shop"."""
+    package = os.path.basename(folder)
+    return [f"{package}.{filename[:-3]}" for filename in sorted(os.listdir(folder)) if filename.endswith(".py") and not filename.startswith("_")]
+
+
+async def load_cogs(bot, names: list) -> dict:
+    """Loads the extensions together and returns how long each one took.
+
+    Importing a cog runs on the event loop either way, but any setup() that
+    awaits something overlaps with the others instead of waiting in line.
+    A cog that fails to load is reported and the rest still start.
+    """
+    async def load(name):
+        started = time.perf_counter()
+        await bot.load_extension(name)
+        return time.perf_counter() - started
+
+    results = await asyncio.gather(*(load(name) for name in names), return_exceptions=True)
+    timings = {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            print(f"Failed to load cog {name}: {result}")
+        else:
+            timings[name] = result
+            print(f"Loaded cog: {name} ({result * 1000:.0f} ms)")
+    return timings
+
+
+def command_tree_hash(tree) -> str:
+    """A hash of the global commands exactly as they would be sent to Discord."""
+    payload = [command.to_dict(tree) for command in tree.get_commands()]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _read_hash(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+async def sync_commands(bot, path: str) -> bool:
+    """Syncs the global commands if they changed since the last sync. Returns whether it synced."""
+    # The application is part of the key, a different bot token has its own commands.
+    digest = f"{bot.application_id}:{command_tree_hash(bot.tree)}"
+    if _read_hash(path) == digest:
+        print("Command tree unchanged, skipping sync.")
+        return False
+    synced = await bot.tree.sync()
+    print(f"Synced {len(synced)} command(s)")
+    # Only written once the sync went through, so a failed one is retried on the next start.
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(digest)
+    return True
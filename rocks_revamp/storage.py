@@ -0,0 +1,400 @@
+"""Connections and threads behind DatabaseManager.
+
+DatabaseManager never runs SQL on the event loop. It hands functions shaped
+like func(con, *args) to a storage backend, which runs them on its own
+threads and returns an asyncio future:
+
+- "threaded": reads on a small thread pool with a connection per thread,
+  all writes batched on one DatabaseWriter thread.
+- "async": aiosqlite-style, one connection per database owned by its own
+  thread, reads and writes both queued to it.
+
+The backend is picked with config.DATABASE_BACKEND.
+"""
+import os
+import time
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import perf
+from sqltrace import SQLTracer
+
+# PRAGMAs applied once to every pooled connection when it is opened.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # Safe with WAL, avoids an fsync on every commit.
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache per connection.
+    "PRAGMA mmap_size=268435456",    # Map up to 256 MB of the file into memory.
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# How many prepared statements each connection keeps around.
+STATEMENT_CACHE_SIZE = 256
+
+# Reads run on a small dedicated thread pool instead of the loop's default executor.
+READ_WORKERS = 4
+
+# The most queued writes the writer thread will commit in one transaction.
+MAX_WRITE_BATCH = 500
+
+
+class ConnectionPool:
+    """Long-lived connections to one database file.
+
+    Every read thread gets its own read connection. The single writer
+    connection is only ever used by one thread, the DatabaseWriter (or the
+    ConnectionWorker of the async backend, which also reads from it).
+    """
+
+    def __init__(self, db_path: str, attach: dict = None, tracer: SQLTracer = None, own_writer: bool = False):
+        self.db_path = db_path
+        # Other database files the writer connection can see, as {schema_name: path}.
+        self.attach = attach or {}
+        self.tracer = tracer
+        # Partitions get a writer thread of their own, so a busy one doesn't hold up the others.
+        self.own_writer = own_writer
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._writer_traced = False
+
+    def _connect(self, isolation_level=""):
+        con = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE, isolation_level=isolation_level)
+        con.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            con.execute(pragma)
+        return con
+
+    def reader(self):
+        """Returns the read connection owned by the calling thread."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._connect()
+            self._local.con = con
+            with self._readers_lock:
+                self._readers.append(con)
+        self._local.traced = self._apply_tracing(con, getattr(self._local, "traced", False))
+        return con
+
+    def writer(self):
+        """Returns the writer connection. It runs in autocommit mode, the writer thread manages transactions itself."""
+        if self._writer is None:
+            self._writer = self._connect(isolation_level=None)
+            for name, path in self.attach.items():
+                self._writer.execute("ATTACH DATABASE ? AS " + name, (path,))
+        self._writer_traced = self._apply_tracing(self._writer, self._writer_traced)
+        return self._writer
+
+    def _apply_tracing(self, con, traced: bool) -> bool:
+        """Attaches or detaches the SQL tracer if it was switched since this connection was last handed out.
+
+        Done here, by the thread that owns the connection, so a callback is never swapped while it runs.
+        """
+        wanted = self.tracer is not None and self.tracer.enabled
+        if wanted != traced:
+            if wanted:
+                self.tracer.attach(con)
+            else:
+                self.tracer.detach(con)
+        return wanted
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_traced = False
+        with self._readers_lock:
+            for con in self._readers:
+                con.close()
+            self._readers.clear()
+        self._local = threading.local()
+
+
+class DatabaseWriter(threading.Thread):
+    """The one thread allowed to write to the databases.
+
+    Callers queue write functions and get an asyncio future back. The thread
+    drains everything that is waiting, runs it in a single transaction per
+    database and resolves each future once that transaction has committed.
+    Each write runs inside its own savepoint, so one failing write does not
+    take the rest of the group down with it.
+    """
+
+    def __init__(self, name: str = "db-writer"):
+        super().__init__(name=name, daemon=True)
+        self._queue = queue.SimpleQueue()
+
+    def submit(self, pool: ConnectionPool, func, *args, write: bool = True):
+        """Queues func(con, *args) on this thread and returns a future for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((pool, func, args, loop, future, time.perf_counter(), write))
+        return future
+
+    def stop(self):
+        """Commits whatever is still queued, then stops the thread."""
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [job for job in batch if job is not None]
+            if not batch:
+                continue
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                # Never let one bad batch stop the thread, every later write would wait forever.
+                print(f"Error in {self.name}: {e}")
+                for job in batch:
+                    _call_soon(job[3], _resolve_future, job[4], False, e)
+
+    def _commit_batch(self, batch):
+        # Group the jobs by database, keeping their original order.
+        groups = {}
+        for job in batch:
+            groups.setdefault(job[0], []).append(job)
+
+        for pool, jobs in groups.items():
+            results = _run_write_jobs(pool, jobs)
+            for job, (ok, value) in zip(jobs, results):
+                _call_soon(job[3], _resolve_future, job[4], ok, value)
+
+
+class ConnectionWorker(DatabaseWriter):
+    """One connection to one database and the thread that owns it, for the async backend.
+
+    Works like DatabaseWriter, but reads are queued to the same thread. Nothing
+    in one drained batch waited for anything else in it, so the writes are
+    committed first and the reads run after them. All the futures of a batch
+    are resolved with a single wakeup of the event loop.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        super().__init__(name=f"db-{os.path.basename(pool.db_path)}")
+        self.pool = pool
+
+    def _commit_batch(self, batch):
+        writes = [job for job in batch if job[6]]
+        reads = [job for job in batch if not job[6]]
+        resolved = []
+        if writes:
+            resolved.extend((job[3], job[4], ok, value) for job, (ok, value) in zip(writes, _run_write_jobs(self.pool, writes)))
+        if reads:
+            try:
+                con = self.pool.writer()
+            except Exception as e:
+                resolved.extend((job[3], job[4], False, e) for job in reads)
+            else:
+                for job in reads:
+                    ok, value = _run_read_job(self.pool, con, job[1], job[2], job[5])
+                    resolved.append((job[3], job[4], ok, value))
+
+        by_loop = {}
+        for loop, future, ok, value in resolved:
+            by_loop.setdefault(loop, []).append((future, ok, value))
+        for loop, results in by_loop.items():
+            _call_soon(loop, _resolve_futures, results)
+
+
+def _run_write_jobs(pool: ConnectionPool, jobs) -> list:
+    """Runs write jobs in one transaction, each in its own savepoint. Returns (ok, value) per job."""
+    con = None
+    results = []
+    try:
+        # Opening the connection can fail too (missing folder, bad ATTACH), that fails just these jobs.
+        con = pool.writer()
+        con.execute("BEGIN IMMEDIATE")
+        for _, func, args, _, _, submitted, _ in jobs:
+            started = time.perf_counter()
+            con.execute("SAVEPOINT write_job")
+            try:
+                results.append((True, func(con, *args)))
+                con.execute("RELEASE write_job")
+            except Exception as e:
+                con.execute("ROLLBACK TO write_job")
+                con.execute("RELEASE write_job")
+                results.append((False, e))
+            if pool.tracer is not None:
+                pool.tracer.end_job()
+            name = _op_name(func)
+            perf.metrics.record(f"{name}.queue", started - submitted)
+            perf.metrics.record(f"{name}.exec", time.perf_counter() - started)
+        with perf.metrics.timer("db.commit"):
+            con.execute("COMMIT")
+        if pool.tracer is not None:
+            pool.tracer.end_job()
+    except Exception as e:
+        # The whole transaction failed, so none of the writes happened.
+        if con is not None and con.in_transaction:
+            con.execute("ROLLBACK")
+        results = [(False, e)] * len(jobs)
+    return results
+
+
+def _run_read_job(pool: ConnectionPool, con, func, args, submitted: float):
+    """Runs func(con, *args), recording the wait for a thread apart from the query itself."""
+    started = time.perf_counter()
+    name = _op_name(func)
+    perf.metrics.record(f"{name}.queue", started - submitted)
+    try:
+        return True, func(con, *args)
+    except Exception as e:
+        return False, e
+    finally:
+        if pool.tracer is not None:
+            pool.tracer.end_job()
+        perf.metrics.record(f"{name}.exec", time.perf_counter() - started)
+
+
+def _op_name(func) -> str:
+    """Metric name for a database function, e.g. _get_user_data_sync -> db.get_user_data."""
+    name = getattr(func, "__name__", "unknown").strip("_")
+    if name.endswith("_sync"):
+        name = name[:-len("_sync")]
+    return f"db.{name}"
+
+
+def _call_soon(loop, callback, *args):
+    """Hands results back to a loop. One that was closed meanwhile has nobody waiting any more."""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+def _resolve_future(future, ok, value):
+    if future.done():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+def _resolve_futures(results):
+    for future, ok, value in results:
+        _resolve_future(future, ok, value)
+
+
+# --- BACKENDS ---
+
+class StorageBackend:
+    """What DatabaseManager needs from a backend. func is always called as func(con, *args)."""
+
+    name = None
+
+    def read(self, pool: ConnectionPool, func, *args) -> asyncio.Future:
+        raise NotImplementedError
+
+    def write(self, pool: ConnectionPool, func, *args) -> asyncio.Future:
+        """Runs func inside a transaction that has committed by the time the future resolves."""
+        raise NotImplementedError
+
+    def release(self, pool: ConnectionPool):
+        """Stops whatever the backend keeps for one pool, before the pool is closed. Nothing may be queued for it."""
+
+    def close(self):
+        """Finishes every queued write and stops the backend's threads."""
+        raise NotImplementedError
+
+
+class ThreadedBackend(StorageBackend):
+    """Reads go to a bounded thread pool, all writes go through one writer thread.
+
+    Pools with own_writer set (the partitions) each get a writer thread of their own.
+    """
+
+    name = "threaded"
+
+    def __init__(self):
+        self.read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+        self.writer = DatabaseWriter()
+        self.writer.start()
+        self._writers = {}  # pool -> DatabaseWriter, for pools with own_writer
+
+    def read(self, pool: ConnectionPool, func, *args):
+        submitted = time.perf_counter()
+
+        def job():
+            ok, value = _run_read_job(pool, pool.reader(), func, args, submitted)
+            if not ok:
+                raise value
+            return value
+
+        return asyncio.get_running_loop().run_in_executor(self.read_executor, job)
+
+    def write(self, pool: ConnectionPool, func, *args):
+        if not pool.own_writer:
+            return self.writer.submit(pool, func, *args)
+        writer = self._writers.get(pool)
+        if writer is None:
+            writer = self._writers[pool] = DatabaseWriter(name=f"db-writer-{os.path.basename(pool.db_path)}")
+            writer.start()
+        return writer.submit(pool, func, *args)
+
+    def release(self, pool: ConnectionPool):
+        writer = self._writers.pop(pool, None)
+        if writer is not None:
+            writer.stop()
+
+    def close(self):
+        for writer in list(self._writers.values()):
+            writer.stop()
+        self._writers.clear()
+        self.writer.stop()
+        self.read_executor.shutdown(wait=True)
+
+
+class AsyncBackend(StorageBackend):
+    """One connection and one thread per database, see ConnectionWorker."""
+
+    name = "async"
+
+    def __init__(self):
+        self._workers = {}
+
+    def _worker(self, pool: ConnectionPool) -> ConnectionWorker:
+        worker = self._workers.get(pool)
+        if worker is None:
+            worker = self._workers[pool] = ConnectionWorker(pool)
+            worker.start()
+        return worker
+
+    def read(self, pool: ConnectionPool, func, *args):
+        return self._worker(pool).submit(pool, func, *args, write=False)
+
+    def write(self, pool: ConnectionPool, func, *args):
+        return self._worker(pool).submit(pool, func, *args)
+
+    def release(self, pool: ConnectionPool):
+        worker = self._workers.pop(pool, None)
+        if worker is not None:
+            worker.stop()
+
+    def close(self):
+        for worker in list(self._workers.values()):
+            worker.stop()
+        self._workers.clear()
+
+
+BACKENDS = {backend.name: backend for backend in (ThreadedBackend, AsyncBackend)}
+
+
+def make_backend(name: str) -> StorageBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown database backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
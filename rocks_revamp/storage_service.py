@@ -0,0 +1,353 @@
+"""Shared storage for running the bot as several processes.
+
+One storage process owns economy.db and shop.db with a normal
+DatabaseManager, so the write-behind cache, the writer thread, the shop
+catalog and the leaderboards still exist exactly once. Bot processes talk to
+it over a Unix socket through RemoteDatabase, which has the same async API
+as DatabaseManager.
+
+Every call made by a bot process in the same event loop tick goes out as one
+batch and comes back as one reply. On the wire a message is a 4-byte length
+followed by JSON:
+
+    request  {"id": 7, "calls": [["get_user_data", [1, 2], {}, true], ...]}
+    reply    {"id": 7, "results": [{"ok": {...}}, {"error": "...", "type": "ValueError"}, ...]}
+
+The last field of a call says whether a reply is wanted, accrue_user_rewards
+doesn't wait for one.
+
+Start it with  python storage_service.py [--socket PATH], or let launcher.py
+start it together with the bot processes.
+"""
+import os
+import sys
+import json
+import struct
+import signal
+import asyncio
+import argparse
+import itertools
+import dataclasses
+import config
+from cooldowns import CooldownIndex
+
+# DatabaseManager methods a bot process can call. Everything else stays private to the storage process.
+REMOTE_METHODS = (
+    "get_user_data", "update_user_data", "add_balance", "remove_balance", "debit_balance",
+    "claim_daily", "purchase_item", "refund_purchase",
+    "get_ledger_entries", "get_coin_flow", "get_leaderboard", "get_rank",
+    "add_item_to_shop", "get_creator_uploads", "get_creator_uploads_page", "get_categories_for_app",
+    "get_items_in_category", "get_items_page", "get_item_details", "update_item_details", "delete_item",
+    "search_items", "get_shop_schema", "backup",
+)
+# Called without waiting for the result.
+NOTIFY_METHODS = ("accrue_user_rewards",)
+
+# Longest a bot process waits for the storage process to come up.
+CONNECT_TIMEOUT = 30.0
+# Longest the storage process waits on shutdown for calls the bot processes already sent.
+DRAIN_TIMEOUT = 30.0
+_HEADER = struct.Struct(">I")
+
+
+# --- WIRE FORMAT ---
+
+def _encode_value(value):
+    if dataclasses.is_dataclass(value):
+        return {"__dataclass__": type(value).__name__, "fields": dataclasses.asdict(value)}
+    raise TypeError(f"Can't send {type(value).__name__} to another process")
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "__dataclass__" in value:
+        import database
+        return getattr(database, value["__dataclass__"])(**value["fields"])
+    return value
+
+
+def encode_frame(message: dict) -> bytes:
+    body = json.dumps(message, separators=(",", ":"), default=_encode_value).encode()
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """The next message, or None once the other side has closed the connection."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        return json.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+    except (asyncio.IncompleteReadError, OSError):
+        # Closed cleanly, or reset by a process that died.
+        return None
+
+
+# --- SERVER ---
+
+class StorageServer:
+    """Serves one DatabaseManager to any number of bot processes."""
+
+    def __init__(self, db, socket_path: str):
+        self.db = db
+        self.socket_path = socket_path
+        self._server = None
+        self._clients = set()
+        self.batches = 0
+        self.calls = 0
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            # Left over from a storage process that didn't shut down cleanly.
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        print(f"Storage service listening on {self.socket_path}")
+
+    async def _handle_client(self, reader, writer):
+        self._clients.add(asyncio.current_task())
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                batch = await read_frame(reader)
+                if batch is None:
+                    break
+                # Batches run concurrently, so one slow purchase doesn't hold up the next batch.
+                task = asyncio.ensure_future(self._run_batch(batch, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            self._clients.discard(asyncio.current_task())
+
+    async def _run_batch(self, batch, writer, write_lock):
+        self.batches += 1
+        self.calls += len(batch["calls"])
+        # Started in order, so the calls reach the cache and the writer in the order they were made.
+        results = await asyncio.gather(*(self._run_call(*call) for call in batch["calls"]))
+        if any(call[3] for call in batch["calls"]):
+            async with write_lock:
+                writer.write(encode_frame({"id": batch["id"], "results": results}))
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+    async def _run_call(self, method, args, kwargs, wants_reply):
+        try:
+            if method in NOTIFY_METHODS:
+                getattr(self.db, method)(*args, **kwargs)
+                return None
+            if method == "flush":
+                return {"ok": await self.db.users.flush()}
+            if method not in REMOTE_METHODS:
+                raise AttributeError(f"{method} is not available over the storage socket")
+            return {"ok": await getattr(self.db, method)(*args, **kwargs)}
+        except Exception as e:
+            if not wants_reply:
+                print(f"Error in {method} from a bot process: {e}")
+            return {"error": str(e), "type": type(e).__name__}
+
+    async def close(self):
+        """Stops accepting connections and finishes what the connected bot processes already sent.
+
+        Has to run before the DatabaseManager is closed, or rewards still
+        waiting in the socket would miss its last flush.
+        """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._clients:
+            _, pending = await asyncio.wait(self._clients, timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"Dropped {len(pending)} bot process connection(s) that were still open")
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class RemoteError(Exception):
+    """An exception raised by a call in the storage process."""
+
+    def __init__(self, message: str, type_name: str):
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+
+
+# --- CLIENT ---
+
+class RemoteDatabase:
+    """DatabaseManager's async API, served by the storage process.
+
+    The reward cooldown index stays in each bot process: a guild always
+    belongs to one shard, so a user's messages in it always reach the same
+    process. SQL tracing runs in the storage process, so `tracer` is None.
+    """
+
+    tracer = None
+
+    def __init__(self, bot, socket_path: str):
+        self.bot = bot
+        self.socket_path = socket_path
+        self.cooldowns = CooldownIndex()
+        self._reader = None
+        self._writer = None
+        self._connect_lock = asyncio.Lock()
+        self._read_task = None
+        self._queued = []     # (method, args, kwargs, future or None) waiting for the next batch
+        self._flush_task = None
+        self._waiting = {}    # batch id -> futures in call order, None for notifications
+        self._batch_ids = itertools.count()
+        self.batches = 0
+        self.calls = 0
+
+    async def start(self):
+        await self._connect()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + CONNECT_TIMEOUT
+            while True:
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if loop.time() > deadline:
+                        raise
+                    await asyncio.sleep(0.1)
+            self._read_task = asyncio.ensure_future(self._read_loop(self._reader))
+
+    async def _read_loop(self, reader):
+        while True:
+            reply = await read_frame(reader)
+            if reply is None:
+                break
+            for future, result in zip(self._waiting.pop(reply["id"], ()), reply["results"]):
+                if future is None or future.done():
+                    continue
+                if "error" in result:
+                    future.set_exception(RemoteError(result["error"], result["type"]))
+                else:
+                    future.set_result(_decode_value(result["ok"]))
+        # The storage process went away. Fail everything in flight, the next call reconnects.
+        self._writer = None
+        waiting, self._waiting = self._waiting, {}
+        for futures in waiting.values():
+            for future in futures:
+                if future is not None and not future.done():
+                    future.set_exception(ConnectionError("Lost the connection to the storage process"))
+
+    def _queue(self, method: str, args, kwargs, wants_reply: bool):
+        future = asyncio.get_running_loop().create_future() if wants_reply else None
+        self._queued.append((method, args, kwargs, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush())
+        return future
+
+    async def _flush(self):
+        calls = []
+        try:
+            # Everything queued until this task runs goes out as one batch.
+            while self._queued:
+                # Taken first, so a failed connect fails these calls and not an earlier batch.
+                calls, self._queued = self._queued, []
+                await self._connect()
+                batch_id = next(self._batch_ids)
+                if any(future is not None for *_, future in calls):
+                    self._waiting[batch_id] = [future for *_, future in calls]
+                self._writer.write(encode_frame({
+                    "id": batch_id,
+                    "calls": [[method, args, kwargs, future is not None] for method, args, kwargs, future in calls],
+                }))
+                self.batches += 1
+                self.calls += len(calls)
+                await self._writer.drain()
+        except Exception as e:
+            for *_, future in calls:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        finally:
+            self._flush_task = None
+            if self._queued:
+                self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def call(self, method: str, *args, **kwargs):
+        return await self._queue(method, args, kwargs, True)
+
+    def accrue_user_rewards(self, user_id: int, guild_id: int, coins: int = 0, data: dict = None):
+        self._queue("accrue_user_rewards", (user_id, guild_id, coins, data), {}, False)
+
+    async def update_user_data(self, user_id: int, guild_id: int, data: dict):
+        if 'last_coin_claim' in data or 'last_xp_claim' in data:
+            self.cooldowns.forget(user_id, guild_id)
+        await self.call("update_user_data", user_id, guild_id, data)
+
+    async def flush(self):
+        """Asks the storage process to write its cached rewards to disk now."""
+        await self.call("flush")
+
+    async def close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._writer is not None:
+            # drain() only waits for the buffer to get small, wait_closed() until all of it was sent.
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+
+
+def _remote_method(name: str):
+    async def method(self, *args, **kwargs):
+        return await self.call(name, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in REMOTE_METHODS:
+    if not hasattr(RemoteDatabase, _name):
+        setattr(RemoteDatabase, _name, _remote_method(_name))
+
+
+# --- STORAGE PROCESS ---
+
+async def serve(socket_path: str, economy_db_path: str = "economy.db", shop_db_path: str = "shop.db", backend: str = None):
+    import database
+    db = database.DatabaseManager(None, economy_db_path, shop_db_path, backend)
+    await db.start()
+    server = StorageServer(db, socket_path)
+    await server.start()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    print(f"Storage service stopping after {server.batches:,} batches, {server.calls:,} calls")
+    await server.close()
+    await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the storage process for a multi-process bot.")
+    parser.add_argument("--socket", default=config.STORAGE_SOCKET_PATH)
+    parser.add_argument("--economy-db", default="economy.db")
+    parser.add_argument("--shop-db", default="shop.db")
+    parser.add_argument("--backend", default=None, help="storage backend, see storage.py")
+    args = parser.parse_args()
+    if sys.platform == "win32":
+        sys.exit("The storage service needs Unix sockets.")
+    asyncio.run(serve(args.socket, args.economy_db, args.shop_db, args.backend))
+
+
+if __name__ == "__main__":
+    main()
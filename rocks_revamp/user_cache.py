@@ -0,0 +1,215 @@
+import asyncio
+from collections import OrderedDict
+
+# How often dirty rows are written back to economy.db, in seconds.
+FLUSH_INTERVAL = 1.0
+# Flush straight away once this many users have unsaved changes.
+MAX_DIRTY_USERS = 500
+# Clean rows beyond this are dropped, least recently used first.
+MAX_CACHED_USERS = 50000
+
+
+class FlushError(Exception):
+    """A flush that was only partly written, see DatabaseManager._flush_user_rows. `unwritten` still have to be."""
+
+    def __init__(self, unwritten):
+        super().__init__(f"{len(unwritten)} cached rows could not be written")
+        self.unwritten = unwritten
+
+
+class UserStateCache:
+    """Write-behind cache of `users` rows keyed by (user_id, guild_id).
+
+    Chat rewards are applied in memory and written back in batches by a
+    background task, so a busy channel only touches the disk a few times a
+    second. Coins are kept as a pending delta and flushed with
+    `balance = balance + ?`, so they never overwrite a balance that was
+    changed directly in the database in the meantime.
+    """
+
+    def __init__(self, db, flush_interval: float = FLUSH_INTERVAL, max_dirty: int = MAX_DIRTY_USERS, max_cached: int = MAX_CACHED_USERS):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_cached = max_cached
+        self._rows = OrderedDict()
+        self._dirty = {}           # key -> set of column names changed in memory
+        self._balance_deltas = {}  # key -> coins earned but not yet written
+        self._loading = {}         # key -> future of an in-flight load
+        self._flush_task = None
+        self._flush_now = None
+        self._closing = False
+
+    # --- READS ---
+
+    async def get(self, user_id: int, guild_id: int):
+        """Returns a copy of the user's row, loading it on a miss."""
+        key = (user_id, guild_id)
+        row = self._rows.get(key)
+        if row is not None:
+            self._rows.move_to_end(key)
+            return dict(row)
+
+        # Share one load between everyone asking for the same user at once.
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key))
+            self._loading[key] = future
+        return dict(await future)
+
+    def peek(self, user_id: int, guild_id: int):
+        """The cached row itself without loading it, or None. Don't modify it."""
+        return self._rows.get((user_id, guild_id))
+
+    async def _load(self, key):
+        try:
+            loaded = await self.db._load_user_data(*key)
+        finally:
+            self._loading.pop(key, None)
+        # Something may have been cached while we were waiting, keep that copy.
+        row = self._rows.setdefault(key, loaded)
+        self._evict()
+        return row
+
+    # --- WRITES ---
+
+    def accrue(self, user_id: int, guild_id: int, coins: int = 0, data: dict = None):
+        """Applies a chat reward in memory. It is written to disk by the next flush."""
+        key = (user_id, guild_id)
+        row = self._rows.get(key)
+        if row is None:
+            # Rewards are only ever computed from a row we just read, so this
+            # only happens if it was evicted in between. Nothing to apply to.
+            return
+        dirty = self._dirty.setdefault(key, set())
+        if coins:
+            row['balance'] += coins
+            self._balance_deltas[key] = self._balance_deltas.get(key, 0) + coins
+        for column, value in (data or {}).items():
+            row[column] = value
+            dirty.add(column)
+        self._rows.move_to_end(key)
+        self._start_flusher()
+        if len(self._dirty) >= self.max_dirty:
+            self._flush_now.set()
+
+    def apply(self, user_id: int, guild_id: int, data: dict):
+        """Mirrors a write that goes straight to the database.
+
+        The written columns no longer need flushing. An absolute balance was
+        computed from the cached value, so it already includes any pending coins.
+        Returns what undo() needs if the write fails.
+        """
+        key = (user_id, guild_id)
+        row = self._rows.get(key)
+        previous = {column: row[column] for column in data if column in row} if row is not None else {}
+        if row is not None:
+            row.update(data)
+        dirty = self._dirty.get(key)
+        was_dirty = dirty & data.keys() if dirty is not None else set()
+        if dirty is not None:
+            dirty.difference_update(data.keys())
+        delta = self._balance_deltas.pop(key, 0) if 'balance' in data else 0
+        if dirty is not None and not dirty and key not in self._balance_deltas:
+            del self._dirty[key]
+        return previous, was_dirty, delta
+
+    def undo(self, user_id: int, guild_id: int, applied):
+        """Puts back what apply() changed, for a write that didn't reach the database."""
+        previous, was_dirty, delta = applied
+        key = (user_id, guild_id)
+        row = self._rows.get(key)
+        if row is not None:
+            row.update(previous)
+        if was_dirty and row is not None:
+            # Still unflushed, so the next flush writes them again.
+            self._dirty.setdefault(key, set()).update(was_dirty)
+        self.restore_balance_delta(user_id, guild_id, delta)
+
+    def take_balance_delta(self, user_id: int, guild_id: int) -> int:
+        """Removes and returns the coins that have not been flushed yet.
+
+        Atomic balance updates write these together with their own change, so
+        a guarded debit also counts coins earned since the last flush.
+        """
+        key = (user_id, guild_id)
+        delta = self._balance_deltas.pop(key, 0)
+        if key in self._dirty and not self._dirty[key]:
+            del self._dirty[key]
+        return delta
+
+    def restore_balance_delta(self, user_id: int, guild_id: int, delta: int):
+        """Gives back coins taken with take_balance_delta when their write failed."""
+        if delta:
+            key = (user_id, guild_id)
+            self._balance_deltas[key] = self._balance_deltas.get(key, 0) + delta
+            self._dirty.setdefault(key, set())
+
+    def set_stored_balance(self, user_id: int, guild_id: int, balance: int):
+        """Updates the cached balance after the database returned the stored value."""
+        row = self._rows.get((user_id, guild_id))
+        if row is not None:
+            # Coins earned while the write was running are still pending on top of it.
+            row['balance'] = balance + self._balance_deltas.get((user_id, guild_id), 0)
+
+    # --- FLUSHING ---
+
+    def _start_flusher(self):
+        if self._flush_task is None:
+            self._flush_now = asyncio.Event()
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing cached user data: {e}")
+
+    async def flush(self):
+        """Writes every dirty row to economy.db in one batch."""
+        if not self._dirty:
+            return
+        updates = []
+        for key, columns in self._dirty.items():
+            row = self._rows[key]
+            updates.append((key, self._balance_deltas.pop(key, 0), {column: row[column] for column in columns}))
+        self._dirty = {}
+
+        try:
+            # Shielded so a cancelled caller can't drop rows that were already taken out of the dirty set.
+            await asyncio.shield(self.db._flush_user_rows(updates))
+        except Exception as e:
+            # Put the changes back so the next flush tries again. With partitions some of them may have been written.
+            for key, delta, data in (e.unwritten if isinstance(e, FlushError) else updates):
+                if delta:
+                    self._balance_deltas[key] = self._balance_deltas.get(key, 0) + delta
+                columns = self._dirty.setdefault(key, set())
+                columns.update(data.keys())
+            raise
+        self._evict()
+
+    async def close(self):
+        """Stops the background task and writes out everything still pending."""
+        if self._flush_task is not None:
+            # Asking the loop to stop instead of cancelling it, so a flush in progress always finishes.
+            self._closing = True
+            self._flush_now.set()
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+
+    def _evict(self):
+        if len(self._rows) <= self.max_cached:
+            return
+        # Only clean rows can be dropped, dirty ones still have to be written.
+        for key in list(self._rows.keys()):
+            if len(self._rows) <= self.max_cached:
+                break
+            if key not in self._dirty:
+                del self._rows[key]